@@ -5,7 +5,8 @@ import json
 
 parser = argparse.ArgumentParser()
 parser.add_argument('file_id', nargs = '*', help = "The file_ids to fetch")
-parser.add_argument('--output', '-o', default=None, help="A path to a file to dump the results.")
+parser.add_argument('--output', '-o', default=None, help="A path to a file to dump the results. A path ending in `.ndjson` or `.jsonl` (optionally followed by `.gz` or `.zst`) streams one docket per line as each file is retrieved.")
+parser.add_argument('--flush-every', default=100, type=int, help="For line-delimited json output, the number of records to buffer before writing to disk (default 100).")
 parser.add_argument('--tracking-id', '--tracking', '-t', default=None, help="A tracking id to retrieve. By default, will retrieve all files with the tracking id, but it can be combined with --docket to narrow it down further")
 parser.add_argument('--docket', '-d', default=None, help="A docketn umber to retrieve. By default, will retrieve all files with the docket number, but it can be combined with --tracking to narrow it down further")
 parser.add_argument('--all', '-a', action = 'store_true', help = "If provided, retrieves all pending requests. Running `python retrieve_requested_file.py -all` will clear out the entire pending queue.")
@@ -40,21 +41,32 @@ def runprogram():
     )
 
     if args.all or args.tracking_id or args.docket:
-        filedata = jnetclient.retrieve_requests(
+        filedata = jnetclient.iter_retrieve_requests(
             tracking_id = args.tracking_id,
             docket_number = args.docket,
             ignore_not_found = args.ignore_missing,
             ignore_queued = not args.queued,
         )
     else:
-        filedata = []
-        for file_id in args.file_id:
-            print(f"Making request for file_id {file_id}")
-
-            # request docket
-            data = jnetclient.retrieve_file_data(file_id)
-            filedata.append(data)
-
+        def fetch_files():
+            for file_id in args.file_id:
+                print(f"Making request for file_id {file_id}")
+
+                # request docket
+                yield(jnetclient.retrieve_file_data(file_id))
+        filedata = fetch_files()
+
+    if args.output and jnet.output.is_ndjson_path(args.output):
+        # stream each file to disk as it is retrieved
+        with jnet.output.NDJSONWriter(args.output, flush_every = args.flush_every) as writer:
+            writer.write_all(filedata)
+        print(f" Wrote {writer.count} retrieved files to {args.output}")
+        if args.review or args.debug:
+            print("** Develoment Review:\n\tAccess `jnetclient` for the client")
+            pdb.set_trace()
+        return
+
+    filedata = list(filedata)
 
     # output
     if args.output:
@@ -0,0 +1,69 @@
+""" Measure the start-up cost of the jnet package and the `jnet` command line.
+
+Each scenario runs in a fresh interpreter, so the timings include interpreter start-up; the `python -c pass`
+baseline is reported alongside so the jnet share is clear.
+
+Run from the root of the github checkout:
+
+```sh
+python jnet-package/benchmarks/bench_import_time.py
+python jnet-package/benchmarks/bench_import_time.py --runs 20 --importtime
+```
+"""
+
+import os
+import sys
+import argparse
+import statistics
+import subprocess
+import time
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCENARIOS = {
+    'baseline: python -c pass': ['-c', 'pass'],
+    'import jnet': ['-c', 'import jnet'],
+    'import jnet.exceptions': ['-c', 'import jnet.exceptions'],
+    'jnet --help': ['-m', 'jnet', '--help'],
+    'jnet status --help': ['-m', 'jnet', 'status', '--help'],
+    'import jnet; jnet.CCE': ['-c', 'import jnet; jnet.CCE'],
+}
+
+def run(arguments, env):
+    started = time.perf_counter()
+    subprocess.run([sys.executable] + arguments, env = env, check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    return(time.perf_counter() - started)
+
+def importtime(statement, env, top = 15):
+    """ Return the `top` slowest modules (cumulative microseconds) imported by `statement`. """
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env = env, check = True, capture_output = True, text = True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative), name.rstrip()))
+    return(sorted(rows, reverse = True)[:top])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', '-n', default = 10, type = int, help = "The number of times to run each scenario (default 10)")
+    parser.add_argument('--importtime', action = 'store_true', help = "Also show the slowest modules imported by `import jnet` and `jnet.CCE`")
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    env['PYTHONPATH'] = PACKAGE_DIR + os.pathsep + env.get('PYTHONPATH', '')
+
+    print(f"{'scenario':<30} {'min (ms)':>10} {'median (ms)':>12}")
+    for name, arguments in SCENARIOS.items():
+        timings = [run(arguments, env) for _ in range(args.runs)]
+        print(f"{name:<30} {min(timings) * 1000:>10.1f} {statistics.median(timings) * 1000:>12.1f}")
+
+    if args.importtime:
+        for statement in ('import jnet', 'import jnet; jnet.CCE'):
+            print(f"\n-- slowest imports for `{statement}` (cumulative us) --")
+            for cumulative, name in importtime(statement, env):
+                print(f"{cumulative:>10} {name}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+""" Measure batch docket fetch throughput against the local mock JNET server.
+
+This exercises the full request - poll - retrieve cycle of `CCE.fetch_dockets` with no network, so the
+numbers reflect the client itself plus the simulated AOPC turnaround and per-request latency.
+
+Run from the root of the github checkout:
+
+```sh
+python jnet-package/benchmarks/bench_mock_fetch.py
+python jnet-package/benchmarks/bench_mock_fetch.py --dockets 200 --latency 0.05 --concurrency 1 8 32
+python jnet-package/benchmarks/bench_mock_fetch.py --adaptive 32 --fault-rate 0.02
+```
+
+With `--adaptive MAX`, an extra run uses an `AIMDLimiter` that adapts the number of concurrent SOAP calls up to MAX.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jnet.testing
+import jnet.concurrency
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dockets', '-d', default = 50, type = int, help = "The number of dockets to fetch per run (default 50)")
+    parser.add_argument('--concurrency', '-c', default = [1, 4, 16], type = int, nargs = '+', help = "The concurrency levels to compare (default 1 4 16)")
+    parser.add_argument('--turnaround', default = 0.5, type = float, help = "Seconds for the mock AOPC turnaround (default 0.5)")
+    parser.add_argument('--latency', default = 0.02, type = float, help = "Seconds of server latency per SOAP call (default 0.02)")
+    parser.add_argument('--fault-rate', default = 0, type = float, help = "The probability of a SOAP fault per call (default 0)")
+    parser.add_argument('--adaptive', default = None, type = int, metavar = 'MAX', help = "Add a run with an adaptive concurrency limit of up to MAX SOAP calls")
+    args = parser.parse_args()
+
+    runs = [(str(concurrency), concurrency, None) for concurrency in args.concurrency]
+    if args.adaptive:
+        runs.append((f"aimd<={args.adaptive}", 1, jnet.concurrency.AIMDLimiter(initial = 1, maximum = args.adaptive)))
+
+    print(f"{'concurrency':>11} {'seconds':>9} {'dockets/s':>10} {'SOAP calls':>11} {'peak in flight':>15}")
+    with jnet.testing.MockJNET(turnaround = args.turnaround, latency = args.latency, fault_rate = args.fault_rate) as server:
+        for label, concurrency, limiter in runs:
+            client = server.client(limiter = limiter)
+            server.reset()
+            dockets = [f"CP-51-CR-{n:07d}-2022" for n in range(args.dockets)]
+            started = time.perf_counter()
+            failures = sum(1 for docket, data, error in client.fetch_dockets(dockets, concurrency = concurrency) if error)
+            elapsed = time.perf_counter() - started
+            calls = sum(server.counts.values())
+            print(f"{label:>11} {elapsed:>9.2f} {args.dockets / elapsed:>10.1f} {calls:>11} {server.peak_in_flight:>15}" + (f"  ({failures} failed)" if failures else ''))
+            if limiter:
+                print(f"{'':>11} final limit {int(limiter.limit)}, changes {limiter.decisions}")
+
+if __name__ == '__main__':
+    main()
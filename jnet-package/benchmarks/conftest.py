@@ -0,0 +1,81 @@
+""" Shared fixtures for the pytest-benchmark suite in this folder.
+
+Everything here is synthetic - a throwaway client certificate and replies from `jnet.synthetic` - so the benchmarks
+never contact JNET. Results are saved under `benchmarks/.benchmarks/`, regardless of the directory pytest is
+run from, so runs on different versions can be compared with `--benchmark-compare`.
+"""
+
+import os
+import sys
+import copy
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import jnet.testing
+import jnet.synthetic
+
+BENCHMARK_STORAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.benchmarks')
+
+@pytest.hookimpl(tryfirst = True)
+def pytest_configure(config):
+    # pytest-benchmark defaults to ./.benchmarks in the current directory, which would scatter
+    # results depending on where the suite is started from
+    if hasattr(config.option, 'benchmark_storage') and config.option.benchmark_storage == 'file://./.benchmarks':
+        config.option.benchmark_storage = 'file://' + BENCHMARK_STORAGE
+
+@pytest.fixture(scope = 'session')
+def mock_server():
+    """ A `MockJNET` that is never started - it is only used for its certificate and its reply builders. """
+    server = jnet.testing.MockJNET()
+    yield(server)
+    server.stop()
+
+@pytest.fixture(scope = 'session')
+def jnetclient(mock_server):
+    """ A CCE client with a throwaway certificate, with the zeep client and certificate already loaded. """
+    client = mock_server.client()
+    client.zeep
+    return(client)
+
+@pytest.fixture(scope = 'session')
+def unsigned_envelope(jnetclient):
+    """ A RequestCourtCaseEvent envelope built without the WS-Security signature. """
+    wsse = jnetclient.zeep.wsse
+    jnetclient.zeep.wsse = None
+    try:
+        node = jnetclient.request_docket('CP-51-CR-0000100-2021', tracking_id = 'bench', send_request = False)
+    finally:
+        jnetclient.zeep.wsse = wsse
+    return(node)
+
+@pytest.fixture(scope = 'session')
+def small_reply(mock_server):
+    """ The xml for a short RequestCourtCaseEventResponse. """
+    return(mock_server.envelope(
+        "<m:RequestCourtCaseEventResponse>"
+        "<m:ResponseStatusCode>SUCCESS</m:ResponseStatusCode>"
+        "<m:ResponseStatusDescriptionText>CCE request queued to AOPC.</m:ResponseStatusDescriptionText>"
+        "</m:RequestCourtCaseEventResponse>"
+    ))
+
+@pytest.fixture(scope = 'session')
+def synthetic():
+    """ A seeded synthetic data generator, so every run parses the same data. """
+    return(jnet.synthetic.SyntheticCCE(seed = 32))
+
+@pytest.fixture(scope = 'session')
+def large_reply(synthetic):
+    """ The xml for a ReceiveCourtCaseEventReply with a docket of 4 participants, 100 charges and 400 events (about 300KB). """
+    return(synthetic.court_case_event_reply(0, participants = 4, charges = 100, events = 400))
+
+@pytest.fixture(scope = 'session')
+def info_listing(synthetic):
+    """ The xml for a RequestCourtCaseEventInfoResponse listing 500 requests, mixing docket, participant, queued, not found and invalid requests. """
+    return(synthetic.status_listing(500))
+
+@pytest.fixture
+def fresh_envelope(unsigned_envelope):
+    """ A factory for copies of the unsigned envelope, as signing modifies the envelope in place. """
+    return(lambda: ((copy.deepcopy(unsigned_envelope), {}), {}))
@@ -0,0 +1,121 @@
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import jnet
+from jnet.response import SOAPResponse
+from jnet.exceptions import JNETTransportError, NotFound, AuthenticationError
+from jnet.transport import RecordedResponse
+
+""" Micro-benchmarks for the request -> sign -> parse path of the CCE client, using synthetic data only.
+
+Run from the commandline in the root of the github checkout like so:
+
+```sh
+python -m pytest jnet-package/benchmarks --benchmark-autosave
+```
+
+Each run is saved in `jnet-package/benchmarks/.benchmarks/`. To check a change for regressions, compare against
+the last saved run (or any earlier run by its number):
+
+```sh
+python -m pytest jnet-package/benchmarks --benchmark-compare --benchmark-compare-fail=mean:10%
+```
+"""
+
+#----------------------
+# Envelope building (includes signing, which happens inside zeep.create_message)
+#----------------------
+
+def test_build_request_docket(benchmark, jnetclient):
+    node = benchmark(jnetclient.request_docket, 'CP-51-CR-0000100-2021', tracking_id = 'bench', send_request = False)
+    assert node.find('.//{*}CaseDocketID').text == 'CP-51-CR-0000100-2021'
+
+def test_build_check_requests(benchmark, jnetclient):
+    node = benchmark(jnetclient.check_requests, tracking_id = 'bench', send_request = False)
+    assert node.find('.//{*}UserDefinedTrackingID').text == 'bench'
+
+def test_build_retrieve_file_data(benchmark, jnetclient):
+    node = benchmark(jnetclient.retrieve_file_data, '12345', send_request = False)
+    assert node.find('.//{*}FileTrackingID').text == '12345'
+
+#----------------------
+# Signing
+#----------------------
+
+def test_signature_apply(benchmark, jnetclient, fresh_envelope):
+    signer = jnetclient.zeep.wsse
+    envelope, headers = benchmark.pedantic(signer.apply, setup = fresh_envelope, rounds = 50)
+    assert envelope.find('.//{*}Signature') is not None
+
+#----------------------
+# Response parsing
+#----------------------
+
+def parse(xml):
+    # data is computed lazily, so build a new response each time
+    return(SOAPResponse(xml = xml).data)
+
+def test_response_data_small(benchmark, small_reply):
+    data = benchmark(parse, small_reply)
+    assert data['RequestCourtCaseEventResponse']['ResponseStatusCode'] == 'SUCCESS'
+
+def test_response_data_large(benchmark, large_reply):
+    data = benchmark(parse, large_reply)
+    assert len(data['ReceiveCourtCaseEventReply']['CourtCaseEvent']['Charge']) == 100
+
+def test_response_data_large_http(benchmark, large_reply):
+    """ A reply as it arrives from the transport, which is parsed from the bytes without decoding them first. """
+    http_response = RecordedResponse(200, 'OK', {'Content-Type': 'text/xml'}, large_reply.encode('utf-8'))
+    data = benchmark(lambda: SOAPResponse(http_response).data)
+    assert len(data['ReceiveCourtCaseEventReply']['CourtCaseEvent']['Charge']) == 100
+
+def test_clean_info_response_data(benchmark, info_listing):
+    data = SOAPResponse(xml = info_listing).data
+    results = benchmark(jnet.CCE.clean_info_response_data, data)
+    assert len(results) == 500
+    assert {r['type'] for r in results} == {'docket_number', 'participant'}
+
+#----------------------
+# Exceptions
+#----------------------
+
+@pytest.fixture(scope = 'module')
+def fault_response(mock_server):
+    status, xml = mock_server.fault(500, 'Server', 'Authentication_Error', 'Certificate not recognized')
+    return(RecordedResponse(status, 'Internal Server Error', {'Content-Type': 'text/xml'}, xml.encode('utf-8')))
+
+def test_exception_not_found(benchmark, info_listing):
+    data = SOAPResponse(xml = info_listing).data['RequestCourtCaseEventInfoResponse']['RequestCourtCaseEventInfoMetadata'][:5]
+    err = benchmark(NotFound, "Docket not found", data = data)
+    assert err.data == data
+
+def test_exception_transport_error(benchmark, fault_response):
+    err = benchmark(JNETTransportError, fault_response)
+    assert 'Authentication_Error' in err.message
+
+def test_exception_error_factory(benchmark, fault_response):
+    def raise_factory():
+        try:
+            jnet.exceptions.error_factory(fault_response)
+        except AuthenticationError as err:
+            return(err)
+    err = benchmark(raise_factory)
+    assert 'Certificate not recognized' in err.message
+
+#----------------------
+# Validation
+#----------------------
+
+def test_validate_docket_numbers(benchmark):
+    # a typical input file: mostly canonical, some typed by hand, a few invalid
+    docket_numbers = [f"CP-51-CR-{n:07d}-2022" for n in range(9000)] + [f"cp 51 cr {n} 2021" for n in range(900)] + [f"CP-51-XX-{n:07d}-2022" for n in range(100)]
+    valid, invalid = benchmark(jnet.validation.validate_docket_numbers, docket_numbers)
+    assert len(valid) == 9900 and len(invalid) == 100
+
+def test_negative_cache_miss(benchmark, tmp_path):
+    # the common case: a docket that is not in the cache is answered by the Bloom filter, without reading the table
+    cache = jnet.negative_cache.NotFoundCache((tmp_path / 'not-found.sqlite3').as_posix())
+    for n in range(10000):
+        cache.add('docket', f"CP-51-CR-{n:07d}-2021", checked = 0)
+    assert benchmark(cache.checked, 'docket', 'CP-51-CR-0000100-2022') is None
@@ -0,0 +1,66 @@
+""" Benchmarks for the cost of opening a TLS connection to the mock server.
+
+These compare what happens on every new connection with requests' defaults - a fresh context that loads the CA
+bundle, then a full handshake - with the prebuilt `ResumingSSLContext` that the pooled transport uses, with and
+without a session to resume.
+
+```
+PYTHONPATH=jnet-package/ pytest jnet-package/benchmarks/test_tls_handshake.py
+```
+"""
+
+import ssl
+import socket
+
+import pytest
+
+pytest.importorskip('pytest_benchmark')
+
+import jnet.testing
+import jnet.transport
+
+@pytest.fixture(scope = 'module')
+def tls_server():
+    with jnet.testing.MockJNET(tls = True) as server:
+        yield(server)
+
+def connect(server, context):
+    """ Open a connection, complete the handshake, and close it again. Returns whether the session was resumed. """
+    with socket.create_connection((server.host, server.port)) as sock:
+        with context.wrap_socket(sock, server_hostname = server.host) as tls:
+            return(tls.session_reused)
+
+def request(server, context):
+    """ Send a request and read the reply, so that TLS 1.3 session tickets are received. """
+    with socket.create_connection((server.host, server.port)) as sock:
+        with context.wrap_socket(sock, server_hostname = server.host) as tls:
+            tls.sendall(f"GET / HTTP/1.1\r\nHost: {server.host}\r\nConnection: close\r\n\r\n".encode('ascii'))
+            while tls.recv(65536):
+                pass
+
+def test_handshake_new_context(benchmark, tls_server):
+    """ The requests default: the CA bundle is loaded for each new connection. """
+    def new_context():
+        return(connect(tls_server, ssl.create_default_context(cafile = tls_server.server_certificate)))
+    assert benchmark(new_context) is False
+
+def test_handshake_shared_context(benchmark, tls_server):
+    """ A context built once, but without session resumption. """
+    context = ssl.create_default_context(cafile = tls_server.server_certificate)
+    assert benchmark(connect, tls_server, context) is False
+
+def test_handshake_resumed(benchmark, tls_server):
+    """ The transport's context, which resumes the previous session. """
+    context = jnet.transport.create_ssl_context(tls_server.server_certificate)
+    request(tls_server, context)
+    assert benchmark(connect, tls_server, context) is True
+
+def test_request_new_connection(benchmark, tls_server):
+    """ A full SOAP request through the client that opens a new (resumed) connection every time. """
+    jnetclient = tls_server.client().warm_up()
+
+    def new_connection():
+        jnetclient.transport.close()
+        return(jnetclient.request_docket('CP-51-CR-0000100-2021', tracking_id = 'benchmark'))
+
+    assert benchmark(new_connection).tracking_id == 'benchmark'
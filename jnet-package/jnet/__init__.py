@@ -1,7 +1,28 @@
+import importlib
 from .exceptions import *
-from .response import SOAPResponse
-from .signature import JNetSignature
-from .cce_client import CCE
+
+# The client classes pull in zeep, xmlsec, lxml and cryptography, which take
+# noticeably long to import, so they are only loaded on first access (PEP 562).
+# This keeps the `jnet` command line fast for `--help` and argument errors.
+_lazy_attributes = {
+    'SOAPResponse': '.response',
+    'JNetSignature': '.signature',
+    'CCE': '.cce_client',
+}
+_lazy_submodules = ('cce_client', 'certificates', 'circuit', 'cli', 'client', 'concurrency', 'forksafe', 'hedging', 'instrumentation', 'metrics', 'negative_cache', 'output', 'response', 'signature', 'synthetic', 'testing', 'tracing', 'tracking', 'transport', 'validation')
+
+def __getattr__(name):
+    if name in _lazy_attributes:
+        value = getattr(importlib.import_module(_lazy_attributes[name], __name__), name)
+    elif name in _lazy_submodules:
+        value = importlib.import_module('.' + name, __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return(value)
+
+def __dir__():
+    return(sorted(set(globals()) | set(_lazy_attributes) | set(_lazy_submodules)))
 
 # Please contact the JNET Team directly for their reference package(s) 
 # to be utilized: JNET On-Boarding Team (OA-JNETAOPCOnBoard@pa.gov)
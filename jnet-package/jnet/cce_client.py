@@ -18,26 +18,27 @@
 # along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
 
 import zeep
-import lxml
+import lxml.etree
 import datetime
-import random
-import inflection
 import re
 import time
+import concurrent.futures
 from .client import Client
+from . import instrumentation
+from . import validation
 from .exceptions import *
 import warnings
 
-
-# for debugging
-import pdb
-
 class CCE(Client):
     """ Subclass to handle Court Case Event request-reply actions (which are sent to /AOPC/CCERequest endpoint)."""
 
     wsdl_path = "wsdl/CCERequestReply.wsdl"
     url_path = "AOPC/CCERequest"
 
+    # seconds that `fetch_docket_data` waits before the first status check, and between checks
+    poll_delay = 5
+    poll_interval = 10
+
     def configure_client(self, client):
         """ Sets the namespace prefixes for the CCERequestReply protocol. """
         client.set_ns_prefix("aopc-cce", "http://www.jnet.state.pa.us/niem/aopc/CourtCaseRequest/1")
@@ -99,55 +100,154 @@ class CCE(Client):
             jnet.exceptions.NotFound if the docket_number is not found.
             jnet.exceptions.QueuedError if the request is queued and won't be available until after 5pm.
             TimeoutError if the data is not returned beofre the timeout expires.
+            jnet.exceptions.InvalidIdentifier if the client validates identifiers and the docket number cannot be valid.
+            jnet.exceptions.NotFound is also raised without a request if the client has a `negative_cache` and AOPC did not find the docket number recently.
         """
         if not timeout:
             timeout = 80
-        request = self.request_docket(docket_number)
+        if self.validate_identifiers:
+            # normalized here so that the status checks match the docket number that was requested
+            docket_number = validation.normalize_docket_number(docket_number)
+
+        event = {
+            'event': 'docket',
+            'timestamp': instrumentation.utcnow(),
+            'docket_number': docket_number,
+            'tracking_id': None,
+            'polls': 0,
+            'turnaround_seconds': None,
+            'retrieve_seconds': None,
+            'total_seconds': None,
+            'records': None,
+            'error': None,
+        }
+        with self.tracer.span('jnet.fetch_docket_data', {'jnet.docket_number': docket_number}) as span:
+            started = time.perf_counter()
+            try:
+                request = self.request_docket(docket_number)
+                event['tracking_id'] = request.tracking_id
+
+                timer = time.time()
+                time.sleep(self.poll_delay)
+                # first, check with check = False to avoid exceptions
+                data = self.check_requests(
+                    tracking_id = request.tracking_id,
+                    docket_number = docket_number,
+                    check = False,
+                )
+                event['polls'] += 1
+                if not quiet:
+                    print(f"Waiting and polling for {docket_number} to be ready")
+                while not len(data):
+                    elapsed_time = time.time() - timer
+                    if elapsed_time > timeout:
+                        raise TimeoutError(f"Request to fetch JNET data for docket {docket_number} could not be completed within {timeout} seconds")
+                    if not quiet:
+                        print(f"    ... data not yet available after {format(elapsed_time, '.1f')} s. Waiting more.")
+                    time.sleep(self.poll_interval)
+                    data = self.check_requests(
+                        tracking_id = request.tracking_id,
+                        docket_number = docket_number,
+                        check = False,
+                    )
+                    event['polls'] += 1
 
-        timer = time.time()
-        time.sleep(5)
-        # first, check with check = False to avoid exceptions
-        data = self.check_requests(
-            tracking_id = request.tracking_id,
-            docket_number = docket_number,
-            check = False,
-        )
-        print(f"Waiting and polling for {docket_number} to be ready")
-        while not len(data):
-            elapsed_time = time.time() - timer
-            if elapsed_time > timeout:
-                raise TimeoutError(f"Request to fetch JNET data for docket {docket_number} could not be completed within {timeout} seconds")
-            print(f"    ... data not yet available after {format(elapsed_time, '.1f')} s. Waiting more.")
-            time.sleep(10)
-            data = self.check_requests(
-                tracking_id = request.tracking_id,
-                docket_number = docket_number,
-                check = False,
-            )
-        data = self.retrieve_requests(
-            tracking_id = request.tracking_id,
-            docket_number = docket_number,
-        )
+                event['turnaround_seconds'] = time.perf_counter() - started
+                data = self.retrieve_requests(
+                    tracking_id = request.tracking_id,
+                    docket_number = docket_number,
+                )
+                event['retrieve_seconds'] = time.perf_counter() - started - event['turnaround_seconds']
+                event['records'] = len(data)
+            except Exception as e:
+                event['error'] = type(e).__name__
+                raise
+            finally:
+                # a fetch that failed early has no tracking id or records, and OpenTelemetry rejects None values
+                for key in ('tracking_id', 'polls', 'records'):
+                    if event[key] is not None:
+                        span.set_attribute(f"jnet.{key}", event[key])
+                if self.observers:
+                    event['total_seconds'] = time.perf_counter() - started
+                    self.notify(event)
         return(data)
 
+    def fetch_dockets(self, docket_numbers, timeout:int = 100, concurrency:int = 4):
+        """ Fetch data for many dockets, running up to `concurrency` `fetch_docket_data` calls at once.
+
+        Results are yielded as each docket completes (not in the order provided), and a failure for
+        one docket does not stop the others - the exception is yielded in place of the data so the
+        caller can decide what to retry.
+
+        Dockets are taken from `docket_numbers` only as a worker frees up, so if the caller stops
+        iterating (i.e. on Ctrl-C), only the dockets already in progress are finished, and the rest are
+        never requested. Finishing a docket retrieves it from the JNET queue, so results the caller
+        never sees would be lost.
 
+        Args:
+            docket_numbers: An iterable of docket numbers to fetch.
+            timeout: How long to wait for each docket before giving up on it. Default is 100.
+            concurrency: The number of dockets to request and poll for at the same time. Default is 4. With a client `limiter`, up to `limiter.maximum` dockets are in progress at once, and the limiter decides how many of their SOAP calls run at the same time.
+        Yields:
+            tuple of (docket_number, data, error), where `data` is the list returned by `fetch_docket_data` and `error` is None on success, or `data` is None and `error` is the exception raised.
+        """
+        # initialize the shared zeep client and certificate data up front rather
+        # than in several threads at once
+        self.zeep
+
+        if self.limiter is not None:
+            concurrency = max(concurrency, int(self.limiter.maximum))
+
+        docket_numbers = iter(docket_numbers)
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers = concurrency)
+        futures = {}
+
+        def submit_next():
+            for docket_number in docket_numbers:
+                futures[executor.submit(self.fetch_docket_data, docket_number, timeout = timeout, quiet = True)] = docket_number
+                return
+
+        try:
+            for _ in range(concurrency):
+                submit_next()
+            while futures:
+                done, _ = concurrent.futures.wait(futures, return_when = concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    docket_number = futures.pop(future)
+                    try:
+                        data = future.result()
+                    except Exception as e:
+                        yield((docket_number, None, e))
+                    else:
+                        yield((docket_number, data, None))
+                    # only once the caller has taken the result, so that nothing is started that it will not see
+                    submit_next()
+        finally:
+            executor.shutdown(wait = True, cancel_futures = True)
 
     def request_docket(self, docket_number:str, send_request = True, tracking_id = None):
         """ Make an initial request for a new court case dataset based on the docket number.
 
         Args:
             docket_number: The docket number to request
-            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a semi-random ID will be generated. The tracking_id will be added as a property of the response object.
+            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a unique ID is generated with the client's `tracking_ids`. The tracking_id will be added as a property of the response object.
             send_request: If True, sends the request to JNET and returns to the SOAPResponse. If False, returns the generated lxml.etree for the request only.
         Returns:
             The SOAPResponse for the request if `send_request` is `True`. Otherwise the lxml.etree for the request.
         Errors:
             An exception along with the error details if the request failed
+            jnet.exceptions.InvalidIdentifier if the client validates identifiers and the docket number cannot be valid.
+            jnet.exceptions.NotFound if the client has a `negative_cache` and AOPC did not find the docket number recently.
         """
 
-        # here we generate a new, random tracking id
+        if self.validate_identifiers:
+            docket_number = validation.normalize_docket_number(docket_number)
+        if self.negative_cache is not None and send_request:
+            self.negative_cache.check('docket', docket_number)
+
+        # here we generate a new, unique tracking id
         if not tracking_id:
-            tracking_id = datetime.date.today().isoformat() + f"-{random.randrange(100000, 999999)}"
+            tracking_id = self.tracking_ids()
 
         request_metadata = self._metadata_block({
             'UserDefinedTrackingID': tracking_id,
@@ -184,8 +284,7 @@ class CCE(Client):
         )
         # - End custom build of docket xml
 
-        node = self.zeep.create_message(
-            self.zeep.service,
+        node = self.create_message(
             'RequestCourtCaseEvent',
             RequestMetadata = request_metadata,
             _value_1 = docket_any,
@@ -217,7 +316,7 @@ class CCE(Client):
             first_name: The first/given name of the participant.
             last_name: The last name (surname) of the participant.
             birthdate: The birthdate of the participant.
-            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a semi-random ID will be generated. The tracking_id will be added as a property of the response object.
+            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a unique ID is generated with the client's `tracking_ids`. The tracking_id will be added as a property of the response object.
             send_request: If True, sends the request to JNET and returns to the SOAPResponse. If False, returns the generated lxml.etree for the request only.
         Returns:
             The SOAPResponse for the request if `send_request` is `True`. Otherwise the lxml.etree for the request.
@@ -226,9 +325,9 @@ class CCE(Client):
 
         """
 
-        # here we generate a new, random tracking id
+        # here we generate a new, unique tracking id
         if not tracking_id:
-            tracking_id = datetime.date.today().isoformat() + f"-{random.randrange(100000, 999999)}"
+            tracking_id = self.tracking_ids()
 
         request_metadata = self._metadata_block({
             'UserDefinedTrackingID': tracking_id,
@@ -306,8 +405,7 @@ class CCE(Client):
             participant_data,
         )
         # - End custom build of docket xml
-        node = self.zeep.create_message(
-            self.zeep.service,
+        node = self.create_message(
             'RequestCourtCaseEvent',
             RequestMetadata = request_metadata,
             _value_1 = participant_any,
@@ -326,17 +424,24 @@ class CCE(Client):
 
         Args:
             otn: The Offense Tracking Number (OTN) to request
-            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a semi-random ID will be generated. The tracking_id will be added as a property of the response object.
+            tracking_id: If provided, the tracking ID to find the request downstream. If not provided, a unique ID is generated with the client's `tracking_ids`. The tracking_id will be added as a property of the response object.
             send_request: If True, sends the request to JNET and returns to the SOAPResponse. If False, returns the generated lxml.etree for the request only.
         Returns:
             The SOAPResponse for the request if `send_request` is `True`. Otherwise the lxml.etree for the request.
         Errors:
             An exception along with the error details if the request failed
+            jnet.exceptions.InvalidIdentifier if the client validates identifiers and the OTN cannot be valid.
+            jnet.exceptions.NotFound if the client has a `negative_cache` and AOPC did not find the OTN recently.
         """
 
-        # here we generate a new, random tracking id
+        if self.validate_identifiers:
+            otn = validation.normalize_otn(otn)
+        if self.negative_cache is not None and send_request:
+            self.negative_cache.check('otn', otn)
+
+        # here we generate a new, unique tracking id
         if not tracking_id:
-            tracking_id = datetime.date.today().isoformat() + f"-{random.randrange(100000, 999999)}"
+            tracking_id = self.tracking_ids()
 
         request_metadata = self._metadata_block({
             'UserDefinedTrackingID': tracking_id,
@@ -375,8 +480,7 @@ class CCE(Client):
             otn_data,
         )
 
-        node = self.zeep.create_message(
-            self.zeep.service,
+        node = self.create_message(
             'RequestCourtCaseEvent',
             RequestMetadata = request_metadata,
             _value_1 = otn_any,
@@ -386,11 +490,11 @@ class CCE(Client):
 
         #send it, but add the tracking number to the response
         result = self.make_request(node)
-        result._add_properties(tracking_id=tracking_id)
+        result._add_properties(tracking_id=tracking_id, otn=otn)
 
         return(result)
 
-    def check_requests(self, tracking_id = None, *, pending_only = True, record_limit = 500, docket_number = None, otn = None, clean = True, check = True, send_request = True, raw = False, ignore_errors = False):
+    def check_requests(self, tracking_id = None, *, pending_only = True, record_limit = 500, docket_number = None, otn = None, tracking_id_prefix = None, clean = True, check = True, send_request = True, raw = False, ignore_errors = False):
         """ Check the status of existing requests. The request may include records that were requested both by OTN or by Docket Number - they are not designated to separate queues.
 
         Args:
@@ -399,6 +503,7 @@ class CCE(Client):
             record_limit: Set the maximum return count. Default is 500.
             docket_number: If provided, filter requests for the provided docket number and throw a JNET.exceptions.RequestNotFound exception is not found.
             otn: If provided, filter requests for the provided OTN and throw a JNET.exceptions.RequestNotFound exception is not found.
+            tracking_id_prefix: If provided, only include requests whose tracking id starts with the prefix, i.e. a batch made with `TrackingIdGenerator.batch`. JNET only filters by a complete tracking id, so this lists a whole batch with one status check rather than one per request.
             clean: If True, calls `clean_info_response_data` to return cleaner data. If False, returns the full data. Default is True.
             check: If True, raises an exception if a docket_number or otn *is specified* and cannot be found. If False, it will return the not found records. If neither `otn` nor `docket_number` is specified, this parameter is ignored. Default is True.
             send_request: If True, sends the request to JNET and returns to the SOAPResponse. If False, returns the generated lxml.etree for the request only.
@@ -409,8 +514,7 @@ class CCE(Client):
             If `raw` is `True`, returns the SOAPResponse returned from the request.
             Otherwise, returns an array of data elements.
         """
-        node = self.zeep.create_message(
-            self.zeep.service,
+        node = self.create_message(
             'RequestCourtCaseEventInfo',
             _value_1 = self._alt_request_metadata(),
             RecordLimit = record_limit,
@@ -431,6 +535,12 @@ class CCE(Client):
         # change the record count to an integer
         result.data['RequestCourtCaseEventInfoResponse']['RecordCount'] = int(result.data['RequestCourtCaseEventInfoResponse']['RecordCount']
         )
+        if self.observers:
+            # a listing that is filtered, or cut off at the record limit, is not the whole backlog
+            complete = not (tracking_id or docket_number or otn or tracking_id_prefix) and (
+                record_limit is None or result.data['RequestCourtCaseEventInfoResponse']['RecordCount'] < record_limit
+            )
+            self.notify(self.status_event(result, tracking_id = tracking_id, pending_only = pending_only, complete = complete))
 
         if result.data['RequestCourtCaseEventInfoResponse']['RecordCount'] == 0:
             # -- no records!
@@ -452,6 +562,15 @@ class CCE(Client):
         if result.data['RequestCourtCaseEventInfoResponse']['RecordCount'] == record_limit:
             warnings.warn(f"check_requests returned the limit of {record_limit} records - you likely are not getting all outstanding requests")
 
+        if self.negative_cache is not None:
+            self.negative_cache.record(result.data['RequestCourtCaseEventInfoResponse']['RequestCourtCaseEventInfoMetadata'])
+
+        if tracking_id_prefix:
+            result.data['RequestCourtCaseEventInfoResponse']['RequestCourtCaseEventInfoMetadata'] = [
+                req for req in result.data['RequestCourtCaseEventInfoResponse']['RequestCourtCaseEventInfoMetadata']
+                if (req.get('UserDefinedTrackingID') or '').startswith(tracking_id_prefix)
+            ]
+
         # -- if the docket_number is provided, filter here
         if docket_number:
             filtered_results = []
@@ -549,8 +668,7 @@ class CCE(Client):
             jnet.exceptions.JNETError if unknown errors are received.
         """
 
-        node = self.zeep.create_message(
-            self.zeep.service,
+        node = self.create_message(
             'ReceiveCourtCaseEventReply',
             _value_1 = self._alt_request_metadata(),
             FileTrackingID = file_id,
@@ -568,6 +686,13 @@ class CCE(Client):
 
         # see if there's an error
         data = result.data
+        if self.observers:
+            self.notify({
+                'event': 'retrieve',
+                'timestamp': instrumentation.utcnow(),
+                'file_id': file_id,
+                'result': self.retrieve_outcome(data),
+            })
         # determine what the non-error return value would be
         if raw:
             return_value = result
@@ -601,6 +726,9 @@ class CCE(Client):
                 soap_response = result,
             )
 
+        if self.negative_cache is not None:
+            self.negative_cache.record_activity(metadata["BackendSystemReturn"].get("BackendSystemReturnText") or '')
+
         if metadata["BackendSystemReturn"]["BackendSystemReturnCode"] == "FAILURE":
             # -- these errors happen if the file_id exists, but the Docket Number tha was requested
             #    does not.
@@ -670,6 +798,29 @@ class CCE(Client):
     def retrieve_requests(self, tracking_id = None, *, docket_number = None, pending_only = True, raw = False, check = False, ignore_queued = True, ignore_not_found = False, include_metadata = False):
         """ Fetch all requests that are currently available.
 
+        This collects the results of `iter_retrieve_requests` into a list - see that function for the details and arguments.
+
+        Returns:
+            If `raw` is `True`, returns an array of SOAPResponse objects for each file.
+            If `include_metadata` is `True`, returns an array of the full data structure returned, including the `ResponseMetadata` that indicates information about the BackendRequest.
+            Otherwise, returns an array of the `CourtCaseEvent` data. May be an empty array if no requests are pending.
+        """
+        return(list(self.iter_retrieve_requests(
+            tracking_id,
+            docket_number = docket_number,
+            pending_only = pending_only,
+            raw = raw,
+            check = check,
+            ignore_queued = ignore_queued,
+            ignore_not_found = ignore_not_found,
+            include_metadata = include_metadata,
+        )))
+
+    def iter_retrieve_requests(self, tracking_id = None, *, docket_number = None, pending_only = True, raw = False, check = False, ignore_queued = True, ignore_not_found = False, include_metadata = False):
+        """ Fetch all requests that are currently available, yielding each file as it is retrieved.
+
+        Because the files are yielded one at a time, this can drain a large pending queue without holding all of the data in memory. Note that as a generator, nothing is requested (and no exceptions are raised) until iteration begins.
+
         Because of the constraints of the upstream SOAP system, the combination of ignore/check param can be confusing and differ based on what you want to do. Remember if a file is fetched, is will be removed from the pending queue and no longer show up in `check_request_status` by default.
 
         Therefore, note the following:
@@ -688,10 +839,10 @@ class CCE(Client):
             ignore_queued: If True, do not fetch records that queued and unfulfilled. If False, the records will be returned.
             ignore_not_found: If True, neither fetch nor throw an exception for not found records - just ignore them. Default is False.
             include_metadata: If True, includes the `ResponseMetadata` data envelope in the return value; otherwise returns only the `CourtCaseEvent` data. Default is False.
-        Returns:
-            If `raw` is `True`, returns an array of SOAPResponse objects for each file.
-            If `include_metadata` is `True`, returns an array of the full data structure returned, including the `ResponseMetadata` that indicates information about the BackendRequest.
-            Otherwise, returns an array of the `CourtCaseEvent` data. May be an empty array if no requests are pending.
+        Yields:
+            If `raw` is `True`, the SOAPResponse object for each file.
+            If `include_metadata` is `True`, the full data structure returned, including the `ResponseMetadata` that indicates information about the BackendRequest.
+            Otherwise, the `CourtCaseEvent` data for each file.
         Raises:
             If `check` is True and there was a backend error retrieving one of the files, raises a JNETError.
         """
@@ -708,9 +859,8 @@ class CCE(Client):
                     raise NotFound(f"Could not find any available files for docket {docket_number}")
                 elif tracking_id:
                     raise NotFound(f"Could not find any available files for tracking id {tracking_id}")
-            return([])
+            return
 
-        result = []
         queued_data = {}
         docket_data = {}
         not_found = []
@@ -762,9 +912,9 @@ class CCE(Client):
         for request_info in files_to_return:
             retrieved = self.retrieve_file_data(request_info['file_id'], check = False, raw = raw)
             if raw or include_metadata or 'CourtCaseEvent' not in retrieved['ReceiveCourtCaseEventReply']:
-                result.append(retrieved)
+                yield(retrieved)
             else:
-                result.append(retrieved['ReceiveCourtCaseEventReply']['CourtCaseEvent'])
+                yield(retrieved['ReceiveCourtCaseEventReply']['CourtCaseEvent'])
 
         # -- now handle "additional" requests, i.e. queued requests for which we fetched the completed data.
         # We do not add these to the return data because more complete data is provided, but we do this
@@ -772,7 +922,58 @@ class CCE(Client):
         for request_info in extra_fetches:
             retrieved = self.retrieve_file_data(request_info['file_id'], check = False)
 
-        return(result)
+    @staticmethod
+    def activity_state(activity_text:str):
+        """ A quick classification of the ActivityTypeText header of a status record: 'queued', 'not_found', 'invalid' or 'completed'. """
+        if 'Queued DOCKET NUMBER ' in activity_text:
+            return('queued')
+        elif 'NOT FOUND' in activity_text:
+            return('not_found')
+        elif 'Invalid Request Object!' in activity_text:
+            return('invalid')
+        return('completed')
+
+    def status_event(self, result, tracking_id = None, pending_only = True, complete = False):
+        """ The instrumentation event for a RequestCourtCaseEventInfo response, counting the records in each state.
+
+        Args:
+            result: The SOAPResponse of the status check, with an integer RecordCount.
+            tracking_id: The tracking id the listing was requested for, if any.
+            pending_only: Whether the listing only includes pending requests.
+            complete: True if the listing is not filtered in any way and has fewer records than the record limit, so it lists every request.
+        """
+        states = {'completed': 0, 'queued': 0, 'not_found': 0, 'invalid': 0}
+        listing = result.data['RequestCourtCaseEventInfoResponse'].get('RequestCourtCaseEventInfoMetadata') or []
+        for req in ([listing] if type(listing) is dict else listing):
+            headers = req.get('HeaderField') or []
+            for header in ([headers] if type(headers) is dict else headers):
+                if header.get('HeaderName') == 'ActivityTypeText':
+                    states[self.activity_state(header.get('HeaderValueText') or '')] += 1
+        return({
+            'event': 'status',
+            'timestamp': instrumentation.utcnow(),
+            'tracking_id': tracking_id,
+            'pending_only': pending_only,
+            'complete': complete,
+            'records': result.data['RequestCourtCaseEventInfoResponse']['RecordCount'],
+            **states,
+        })
+
+    @staticmethod
+    def retrieve_outcome(data:dict):
+        """ A quick classification of a ReceiveCourtCaseEventReply: 'completed', 'queued', 'not_found', 'invalid', 'no_record' or 'failure'. """
+        reply = data.get('ReceiveCourtCaseEventReply') or {}
+        if reply.get('ResponseStatusCode') == 'ERROR':
+            return('no_record' if reply.get('ResponseActionText') == 'No Record Found.' else 'failure')
+        backend = (reply.get('ResponseMetadata') or {}).get('BackendSystemReturn') or {}
+        text = backend.get('BackendSystemReturnText') or ''
+        if backend.get('BackendSystemReturnCode') == 'SUCCESS':
+            return('queued' if 'Queued DOCKET NUMBER ' in text else 'completed')
+        elif 'NOT FOUND' in text:
+            return('not_found')
+        elif 'Invalid Request Object!' in text:
+            return('invalid')
+        return('failure')
 
     @classmethod
     def clean_info_response_data(cls, request, ignore_errors = False):
@@ -888,6 +1089,7 @@ class CCE(Client):
 
                         result['found'] = True
                         result['type'] = 'participant'
+                        import inflection
                         result['participant_details'] = {}
                         splitter = re.compile(r'^(\w+):(.*)')
                         for substr in string.split('|'):
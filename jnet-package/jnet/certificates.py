@@ -0,0 +1,172 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Loading and caching of the client certificate.
+
+Decrypting the PKCS12 (`.pfx`) client certificate is comparatively slow, and scripts commonly build a
+new client per unit of work, so the decoded private key and certificate are cached for the life of the
+process. The cache is only held in memory. Entries are keyed by the real path of the file together with
+its modification time, size and inode, so a replaced or updated certificate is decrypted again, and by a salted
+hash of the password, so the password itself is never kept in the cache.
+
+Finding certificates is cached as well: the listing of the `cert/` directory is kept until one of its
+directories is modified, and the CA bundle is indexed by certificate fingerprint so that checking whether
+the endpoint certificate is installed is a set lookup rather than a search of the whole bundle.
+"""
+
+import os
+import re
+import ssl
+import hashlib
+import pathlib
+import threading
+
+# realpath -> (stat signature, password hash, cert data)
+_certificates = {}
+_lock = threading.Lock()
+# per-process salt for the password hashes used in the cache keys
+_salt = os.urandom(16)
+
+def _password_hash(password:str):
+    return(hashlib.sha256(_salt + password.encode('utf-8')).digest())
+
+def _signature(path:str):
+    stat = os.stat(path)
+    return((stat.st_mtime_ns, stat.st_size, stat.st_ino))
+
+def load_client_certificate(path:str, password:str):
+    """ Decrypt a PKCS12 client certificate, or return the cached result if the same file was already loaded with the same password.
+
+    Args:
+        path: The `.pfx` certificate file.
+        password: The password to decrypt it.
+    Returns:
+        A dict with the PEM-formatted `private_key` (bytes) and `certificate` (str).
+    Raises:
+        ValueError: If the password is wrong or the file is not a PKCS12 certificate.
+    """
+    realpath = os.path.realpath(path)
+    signature = _signature(realpath)
+    password_hash = _password_hash(password)
+    with _lock:
+        cached = _certificates.get(realpath)
+    if cached and cached[0] == signature and cached[1] == password_hash:
+        return(cached[2])
+
+    # cryptography is only needed here, so it is imported on first use
+    from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption
+    from cryptography.hazmat.primitives.serialization.pkcs12 import load_key_and_certificates
+
+    pfx = pathlib.Path(realpath).read_bytes()
+    private_key, main_cert, add_certs = load_key_and_certificates(pfx, password.encode('utf-8'), None)
+    data = {
+        'private_key': private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()),
+        'certificate': main_cert.public_bytes(Encoding.PEM).decode()
+    }
+    with _lock:
+        _certificates[realpath] = (signature, password_hash, data)
+    return(data)
+
+def clear_cache():
+    """ Forget every cached certificate, directory listing, and CA bundle index. """
+    with _lock:
+        _certificates.clear()
+        _indexes.clear()
+        _bundles.clear()
+
+
+#----------------------
+# Certificate search
+#----------------------
+
+# cert directory -> ({directory: mtime}, files in search order)
+_indexes = {}
+# bundle path -> (stat signature, set of fingerprints)
+_bundles = {}
+
+def _directory_mtimes(directories):
+    try:
+        return({directory: os.stat(directory).st_mtime_ns for directory in directories})
+    except FileNotFoundError:
+        return(None)
+
+def certificate_files(certdir):
+    """ The files in a certificate directory and all of its subdirectories, in the order they are searched.
+
+    The listing is cached, and is only refreshed when one of the directories has been modified, i.e. a file was added, removed or renamed. This avoids walking the tree on every client construction, which is slow on network-mounted home directories.
+
+    Args:
+        certdir: The `cert/` directory.
+    Returns:
+        A tuple of `pathlib.Path` objects.
+    """
+    key = os.path.realpath(certdir)
+    with _lock:
+        cached = _indexes.get(key)
+    if cached and _directory_mtimes(cached[0]) == cached[0]:
+        return(cached[1])
+
+    mtimes = {}
+    files = []
+
+    def walk(dirpath):
+        mtimes[dirpath] = os.stat(dirpath).st_mtime_ns
+        for fobj in dirpath.iterdir():
+            if fobj.is_dir():
+                walk(fobj)
+            else:
+                files.append(fobj)
+
+    walk(pathlib.Path(certdir))
+    files = tuple(files)
+    with _lock:
+        _indexes[key] = (mtimes, files)
+    return(files)
+
+def fingerprints(pem:bytes):
+    """ The SHA-256 fingerprints of the certificates in PEM data, or of the data itself if it is a single DER-encoded certificate. """
+    blocks = re.findall(rb'-----BEGIN CERTIFICATE-----.+?-----END CERTIFICATE-----', pem, re.S)
+    if not blocks:
+        return({hashlib.sha256(pem).hexdigest()})
+    return({hashlib.sha256(ssl.PEM_cert_to_DER_cert(block.decode('ascii'))).hexdigest() for block in blocks})
+
+def bundle_fingerprints(bundle:str = None):
+    """ The fingerprints of every certificate in a CA bundle, cached until the bundle file changes.
+
+    Args:
+        bundle: The bundle file. Default is the certifi bundle.
+    Returns:
+        A frozenset of SHA-256 hex digests.
+    """
+    if bundle is None:
+        import certifi
+        bundle = certifi.where()
+    signature = _signature(bundle)
+    with _lock:
+        cached = _bundles.get(bundle)
+    if cached and cached[0] == signature:
+        return(cached[1])
+    result = frozenset(fingerprints(pathlib.Path(bundle).read_bytes()))
+    with _lock:
+        _bundles[bundle] = (signature, result)
+    return(result)
+
+def is_installed(certpath:str, bundle:str = None):
+    """ True if every certificate in the file is in the CA bundle (by default the certifi bundle). """
+    return(fingerprints(pathlib.Path(certpath).read_bytes()) <= bundle_fingerprints(bundle))
@@ -0,0 +1,237 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Circuit breakers that stop sending requests to an endpoint that is down.
+
+When JNET or AOPC is unavailable, every worker otherwise keeps sending requests and waits out its own
+timeout for each one. A `CircuitBreakers` registry on the client keeps one `CircuitBreaker` per endpoint
+(i.e. beta and production), shared by every thread - and every client given the same registry:
+
+- closed: requests are sent, and their outcomes are counted.
+- open: after `failure_threshold` consecutive failures, or a failure rate of at least `error_rate`
+  over the last `window` calls, requests fail immediately with `jnet.exceptions.CircuitOpenError`.
+- half-open: once `reset_timeout` seconds have passed, up to `probes` requests are let through. If they
+  succeed the circuit closes, and if one fails it opens again for another `reset_timeout`.
+
+A failure is a request that got no response (i.e. a connection error or timeout), an http status that
+means the server is overloaded or down, or a Server SOAP fault (see `jnet.concurrency.is_overload`).
+Errors in the request itself, like an authentication fault or a docket that is not found, do not count.
+
+```python
+jnetclient = jnet.CCE(circuit_breakers = jnet.circuit.CircuitBreakers(failure_threshold = 5, reset_timeout = 30))
+```
+
+Every change of state is reported to the client's observers as a `circuit` event - see `jnet.instrumentation`.
+"""
+
+import time
+import collections
+
+from . import instrumentation
+from .exceptions import CircuitOpenError
+from .forksafe import ForkSafe
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitBreaker(ForkSafe):
+    """ The state of the circuit for one endpoint. See the module documentation for the states.
+
+    Constructor Args:
+        endpoint: The endpoint the breaker is for, which is included in its errors and events.
+        failure_threshold: The number of consecutive failures that open the circuit. Default is 5.
+        error_rate: The failure rate (0-1) over the last `window` calls that opens the circuit. Default is 0.5.
+        window: The number of recent calls the error rate is taken over. Default is 20.
+        min_calls: The number of calls in the window before the error rate is considered. Default is 10.
+        reset_timeout: Seconds the circuit stays open before it lets a probe through. Default is 30.
+        probes: The number of successful probes needed to close the circuit, which is also how many run at once. Default is 1.
+
+    Attributes:
+        state: 'closed', 'open' or 'half_open'.
+        consecutive_failures: The number of failures since the last success.
+        rejected: The number of requests failed fast while the circuit was open.
+    """
+
+    _fork_reset = {'_probes_in_flight': int}
+
+    def __init__(
+        self,
+        endpoint:str = None,
+        failure_threshold:int = 5,
+        error_rate:float = 0.5,
+        window:int = 20,
+        min_calls:int = 10,
+        reset_timeout:float = 30,
+        probes:int = 1,
+    ):
+        self.endpoint = endpoint
+        self.failure_threshold = failure_threshold
+        self.error_rate = error_rate
+        self.window = window
+        self.min_calls = min_calls
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.rejected = 0
+        self._outcomes = collections.deque(maxlen = window)
+        self._opened_at = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._init_fork_safe()
+
+    def failure_rate(self):
+        """ The fraction of failures among the recent calls, or None if there have been fewer than `min_calls`. """
+        if len(self._outcomes) < self.min_calls:
+            return(None)
+        return(self._outcomes.count(False) / len(self._outcomes))
+
+    def _event(self, previous:str):
+        return({
+            'event': 'circuit',
+            'timestamp': instrumentation.utcnow(),
+            'endpoint': self.endpoint,
+            'state': self.state,
+            'previous_state': previous,
+            'consecutive_failures': self.consecutive_failures,
+            'error_rate': self.failure_rate(),
+        })
+
+    def before_call(self):
+        """ Check that a request may be sent, before sending it.
+
+        Returns:
+            A tuple of whether the request is a half-open probe (to pass to `after_call`) and a `circuit` event if the state changed, or None.
+        Raises:
+            jnet.exceptions.CircuitOpenError if the circuit is open, or half-open with all of its probes already in flight.
+        """
+        with self._lock:
+            event = None
+            if self.state == OPEN:
+                remaining = self._opened_at + self.reset_timeout - time.monotonic()
+                if remaining > 0:
+                    self.rejected += 1
+                    raise CircuitOpenError(endpoint = self.endpoint, retry_after = remaining)
+                self.state = HALF_OPEN
+                self._probe_successes = 0
+                event = self._event(OPEN)
+            if self.state == HALF_OPEN:
+                if self._probes_in_flight >= self.probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(endpoint = self.endpoint, retry_after = 0)
+                self._probes_in_flight += 1
+                return(True, event)
+            return(False, event)
+
+    def after_call(self, probe:bool, failure:bool):
+        """ Record the outcome of a request that `before_call` allowed.
+
+        Args:
+            probe: Whether the request was a half-open probe, as returned by `before_call`.
+            failure: True if the request failed in a way that counts against the endpoint.
+        Returns:
+            A `circuit` event if the state changed, otherwise None.
+        """
+        with self._lock:
+            previous = self.state
+            if probe:
+                # not below zero, for a probe that was in flight when the breaker was `reset`
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                if self.state != HALF_OPEN:
+                    # another probe has already decided the state
+                    return(None)
+                if failure:
+                    self._open()
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.probes:
+                        self.state = CLOSED
+                        self.consecutive_failures = 0
+                        self._outcomes.clear()
+            else:
+                if self.state != CLOSED:
+                    # sent before the circuit opened, so it says nothing about the endpoint now
+                    return(None)
+                self._outcomes.append(not failure)
+                self.consecutive_failures = self.consecutive_failures + 1 if failure else 0
+                rate = self.failure_rate()
+                if failure and (self.consecutive_failures >= self.failure_threshold or (rate is not None and rate >= self.error_rate)):
+                    self._open()
+            return(self._event(previous) if self.state != previous else None)
+
+    def cancel(self, probe:bool):
+        """ Give back a call that `before_call` allowed but that was never sent, without recording an outcome.
+
+        Args:
+            probe: Whether the call was a half-open probe, as returned by `before_call`.
+        """
+        if probe:
+            with self._lock:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def _open(self):
+        self.state = OPEN
+        self._opened_at = time.monotonic()
+
+    def reset(self):
+        """ Close the circuit and forget the recent outcomes, including those of a half-open circuit's probes. """
+        with self._lock:
+            self.state = CLOSED
+            self.consecutive_failures = 0
+            self._outcomes.clear()
+            self._opened_at = None
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+
+class CircuitBreakers(ForkSafe):
+    """ A `CircuitBreaker` for each endpoint, created with the same settings on first use.
+
+    Give the same registry to several clients to share the state of each endpoint between them.
+
+    Constructor Args:
+        **settings: The settings for each `CircuitBreaker`, i.e. `failure_threshold` or `reset_timeout`.
+
+    Attributes:
+        breakers: dict of endpoint to its `CircuitBreaker`.
+    """
+
+    def __init__(self, **settings):
+        # fail on a misspelled setting now rather than on the first request
+        CircuitBreaker(**settings)
+        self.settings = settings
+        self.breakers = {}
+        self._init_fork_safe()
+
+    def breaker(self, endpoint:str):
+        """ The `CircuitBreaker` for an endpoint, i.e. 'https://ws.jnet.beta.pa.gov/'. """
+        breaker = self.breakers.get(endpoint)
+        if breaker is None:
+            with self._lock:
+                breaker = self.breakers.get(endpoint)
+                if breaker is None:
+                    breaker = self.breakers[endpoint] = CircuitBreaker(endpoint, **self.settings)
+        return(breaker)
+
+    def states(self):
+        """ Returns a dict of endpoint to the state of its circuit. """
+        return({endpoint: breaker.state for endpoint, breaker in list(self.breakers.items())})
@@ -0,0 +1,469 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" The `jnet` command line interface.
+
+This module is imported every time the `jnet` command runs, so it must stay light: only the standard
+library is imported at the top level, and the client (and with it zeep, xmlsec, lxml and cryptography)
+is only imported once a subcommand actually needs to talk to JNET. Run `jnet --help` for usage.
+"""
+
+import sys
+import os
+import atexit
+import csv
+import json
+import time
+import argparse
+import datetime
+
+def make_client(args):
+    """ Build the CCE client from the common commandline options. This is where the heavy imports happen. """
+    from .cce_client import CCE
+    from . import transport
+
+    if args.http2:
+        network_transport = transport.HTTPXTransport(compress_requests = args.compress_requests)
+    elif args.compress_requests:
+        network_transport = transport.RequestsTransport(compress_requests = True)
+    else:
+        network_transport = None
+    if args.replay:
+        client_transport = transport.ReplayTransport(args.replay)
+    elif args.record:
+        client_transport = transport.RecordingTransport(args.record, transport = network_transport)
+        # make sure the last exchanges are written however the command exits
+        atexit.register(client_transport.close)
+    else:
+        client_transport = network_transport
+
+    observers = []
+    if args.log_events:
+        from .instrumentation import JSONLinesLogger
+        logger = JSONLinesLogger(args.log_events)
+        atexit.register(logger.close)
+        observers.append(logger)
+
+    tracer = None
+    if args.trace_file:
+        from . import tracing
+        tracer = tracing.RecordingTracer(tracing.JSONLinesSpanExporter(args.trace_file))
+        atexit.register(tracer.close)
+
+    hedging = None
+    if args.hedge:
+        from .hedging import HedgingPolicy
+        hedging = HedgingPolicy(percentile = args.hedge)
+
+    limiter = None
+    if args.adaptive_concurrency:
+        from .concurrency import AIMDLimiter
+        limiter = AIMDLimiter(initial = min(4, args.adaptive_concurrency), maximum = args.adaptive_concurrency)
+
+    circuit_breakers = None
+    if args.circuit_breaker:
+        from .circuit import CircuitBreakers
+        circuit_breakers = CircuitBreakers()
+
+    tracking_ids = None
+    if args.tracking_prefix:
+        from .tracking import TrackingIdGenerator
+        tracking_ids = TrackingIdGenerator(prefix = args.tracking_prefix)
+
+    negative_cache = None
+    if args.not_found_cache:
+        from .negative_cache import NotFoundCache
+        negative_cache = NotFoundCache(args.not_found_cache, recheck_after = args.recheck_days * 86400)
+        atexit.register(negative_cache.close)
+
+    return(CCE(
+        config = args.config,
+        endpoint = 'beta' if args.beta else None,
+        verbose = args.verbose,
+        transport = client_transport,
+        observers = observers,
+        tracer = tracer,
+        hedging = hedging,
+        limiter = limiter,
+        circuit_breakers = circuit_breakers,
+        tracking_ids = tracking_ids,
+        validate_identifiers = args.validate,
+        negative_cache = negative_cache,
+    ))
+
+def dump_json(path, data):
+    """ Write a list of results to a json file, unwrapping it if there is only one result. """
+    with open(path, 'w') as fh:
+        if len(data) == 1:
+            json.dump(data[0], fh)
+        else:
+            json.dump(data, fh)
+
+def normalize_docket_number(docket_number):
+    return(docket_number.strip().upper())
+
+def read_docket_numbers(docket_numbers = (), input_path = None, column = None):
+    """ Combine docket numbers from the commandline and an input file, normalized and with duplicates removed.
+
+    Args:
+        docket_numbers: Docket numbers provided directly.
+        input_path: A file with one docket number per line or a csv file, or `-` for stdin.
+        column: For csv input, the name or 0-based index of the column with the docket numbers. If provided, the input is parsed as csv; otherwise only files ending in `.csv` are, and the first column is used.
+    Returns:
+        list of docket numbers, in the order first seen.
+    """
+    raw = list(docket_numbers)
+
+    if input_path:
+        fh = sys.stdin if input_path == '-' else open(input_path, newline = '')
+        with fh:
+            if column is not None or input_path.endswith('.csv'):
+                reader = csv.reader(fh)
+                index = 0
+                if column is not None and not str(column).isdigit():
+                    header = next(reader)
+                    if column not in header:
+                        raise Exception(f"Column '{column}' not found in the csv header: {header}")
+                    index = header.index(column)
+                elif column is not None:
+                    index = int(column)
+                raw.extend(row[index] for row in reader if len(row) > index)
+            else:
+                raw.extend(fh)
+
+    seen = set()
+    result = []
+    for docket_number in raw:
+        docket_number = normalize_docket_number(docket_number)
+        if docket_number and docket_number not in seen:
+            seen.add(docket_number)
+            result.append(docket_number)
+    return(result)
+
+def write_retry_file(path, docket_numbers):
+    """ Write the dockets to rerun to the retry file, one per line, or remove the file from an earlier run if there are none.
+
+    Args:
+        path: The retry file.
+        docket_numbers: The dockets that failed or were not fetched.
+    """
+    if docket_numbers:
+        with open(path, 'w') as fh:
+            fh.write("\n".join(docket_numbers) + "\n")
+    elif os.path.exists(path):
+        os.remove(path)
+
+#----------------------
+# Subcommands
+#----------------------
+
+def cmd_request(args):
+    """ Request one or more dockets. """
+    jnetclient = make_client(args)
+    requestdata = []
+    for docket_number in args.docket_number:
+        print(f"Making request for docket {docket_number}")
+        resp = jnetclient.request_docket(docket_number, tracking_id = args.tracking_id)
+        print(f"\n----Response Data-----\n{resp.data_string}\n\nTracking ID: {resp.tracking_id}\n")
+        requestdata.append(resp.data)
+
+    if args.output:
+        dump_json(args.output, requestdata)
+
+def cmd_participant(args):
+    """ Request the case history for a participant. """
+    jnetclient = make_client(args)
+    print(f"Making request for person")
+    resp = jnetclient.request_participant(
+        first_name = args.first_name,
+        last_name = args.last_name,
+        birthdate = args.birthdate,
+        tracking_id = args.tracking_id,
+    )
+    print(f"\n----Response Data-----\n{resp.data_string}\n\nTracking ID: {resp.tracking_id}\n")
+
+    if args.output:
+        dump_json(args.output, [resp.data])
+
+def cmd_status(args):
+    """ Check the status of pending requests. """
+    jnetclient = make_client(args)
+    if args.tracking_id:
+        requestdata = []
+        for tracking_id in args.tracking_id:
+            resp = jnetclient.check_requests(pending_only = not args.all, tracking_id = tracking_id)
+            print(f"\n----Tracking ID {tracking_id}-----\n{json.dumps(resp, indent = 4)}")
+            requestdata.extend(resp)
+    else:
+        requestdata = jnetclient.check_requests(
+            pending_only = not args.all,
+            record_limit = args.n,
+            docket_number = args.docket,
+            otn = args.otn,
+            tracking_id_prefix = args.tracking_prefix,
+            ignore_errors = args.ignore_errors,
+        )
+        print(f"\n----Response Data-----\n{json.dumps(requestdata, indent = 4)}")
+
+    print(f"\nTotal Count: {len(requestdata)} requests")
+    if len(requestdata) == args.n:
+        print("\t**Note: outstanding requests exceeds record_limit and so data does not represent all requests.\n\tYou can increase the limit by specifying `-n XXX` on the commandline.")
+    if args.output:
+        dump_json(args.output, requestdata)
+
+def cmd_retrieve(args):
+    """ Retrieve requested files. """
+    from . import output
+
+    if not args.file_id and not args.all and not args.docket and not args.tracking_id:
+        raise Exception("No file id, docket, or tracking id specified - use `--all` to retrieve all pending requests")
+
+    jnetclient = make_client(args)
+    if args.all or args.tracking_id or args.docket:
+        filedata = jnetclient.iter_retrieve_requests(
+            tracking_id = args.tracking_id,
+            docket_number = args.docket,
+            ignore_not_found = args.ignore_missing,
+            ignore_queued = not args.queued,
+        )
+    else:
+        filedata = (jnetclient.retrieve_file_data(file_id) for file_id in args.file_id)
+
+    if args.output and output.is_ndjson_path(args.output):
+        with output.NDJSONWriter(args.output, flush_every = args.flush_every) as writer:
+            writer.write_all(filedata)
+        print(f" Wrote {writer.count} retrieved files to {args.output}")
+        return
+
+    filedata = list(filedata)
+    if args.output:
+        dump_json(args.output, filedata)
+        print(f" Wrote {len(filedata)} retrieved files to {args.output}")
+    else:
+        print(f"--- Results ---\n{json.dumps(filedata, indent = 4)}\n\nTotal Count: {len(filedata)}")
+
+def cmd_fetch(args):
+    """ Request dockets, wait for them to be ready, and retrieve them. """
+    from . import output
+
+    docket_numbers = read_docket_numbers(args.docket_number, args.input, args.column)
+    if args.validate:
+        from . import validation
+        docket_numbers, invalid = validation.validate_docket_numbers(docket_numbers)
+        # normalizing can make two entries the same docket
+        docket_numbers = list(dict.fromkeys(docket_numbers))
+        for docket_number, reason in invalid:
+            print(f"Skipping invalid docket number {docket_number}: {reason}", file = sys.stderr)
+    if not docket_numbers:
+        raise Exception("No docket number specified - provide docket numbers or an `--input` file")
+
+    writer = None
+    output_dir = None
+    if args.output and output.is_ndjson_path(args.output):
+        writer = output.NDJSONWriter(args.output, flush_every = args.flush_every)
+    elif args.output and (args.output.endswith(('/', os.sep)) or os.path.isdir(args.output)):
+        # a directory gets one json file per docket
+        output_dir = args.output.rstrip('/' + os.sep) or args.output
+        os.makedirs(output_dir, exist_ok = True)
+
+    jnetclient = make_client(args)
+    # progress goes to stderr, so that json written to stdout can be piped
+    print(f"Fetching {len(docket_numbers)} dockets with concurrency {args.concurrency}", file = sys.stderr)
+
+    alldata = []
+    failed = []
+    unfinished = dict.fromkeys(docket_numbers)
+    started = time.time()
+    results = jnetclient.fetch_dockets(docket_numbers, timeout = args.timeout, concurrency = args.concurrency)
+    try:
+        for completed, (docket_number, filedata, error) in enumerate(results, start = 1):
+            elapsed = time.time() - started
+            remaining = elapsed / completed * (len(docket_numbers) - completed)
+            status = 'ok' if not error else f"FAILED ({type(error).__name__})"
+            print(f"[{completed}/{len(docket_numbers)}] {docket_number}: {status} - {format(elapsed, '.0f')}s elapsed, ~{format(remaining, '.0f')}s remaining", file = sys.stderr)
+            unfinished.pop(docket_number, None)
+
+            if error:
+                failed.append(docket_number)
+                if args.debug:
+                    raise error
+                if args.verbose:
+                    print(f"    {error}", file = sys.stderr)
+            elif writer:
+                writer.write_all(filedata)
+            elif output_dir:
+                dump_json(os.path.join(output_dir, f"{docket_number}.json"), filedata)
+            elif args.output:
+                alldata.extend(filedata)
+            else:
+                print(json.dumps(filedata, indent = 4))
+    finally:
+        # write out the buffered records and the last index entry, even if the batch is interrupted
+        if writer:
+            writer.close()
+        # the failed dockets, and the ones not finished if the batch was interrupted, can be rerun from the retry file
+        write_retry_file(args.retry_file, failed + list(unfinished))
+        if unfinished:
+            print(f"    *** Interrupted - wrote the {len(failed) + len(unfinished)} failed and unfinished dockets to {args.retry_file}. Rerun with `--input {args.retry_file}` to finish. ***", file = sys.stderr)
+
+    if writer:
+        print(f"    *** Wrote {writer.count} records to {args.output} ***")
+    elif output_dir:
+        print(f"    *** Wrote {len(docket_numbers) - len(failed)} dockets to {output_dir}/ ***")
+    elif args.output:
+        dump_json(args.output, alldata)
+        print(f"    *** Wrote {len(alldata)} records to {args.output} ***")
+
+    if failed:
+        print(f"    *** {len(failed)} of {len(docket_numbers)} dockets failed - wrote them to {args.retry_file}. Rerun with `--input {args.retry_file}` to retry. ***")
+        return(1)
+
+def cmd_synthetic(args):
+    """ Write a corpus of synthetic docket replies for benchmarks and tests. """
+    from .synthetic import SyntheticCCE
+
+    generator = SyntheticCCE(
+        seed = args.seed,
+        participants = args.participants,
+        charges = args.charges,
+        events = args.events,
+    )
+    started = time.time()
+    written = generator.write_corpus(args.output, args.count, start = args.start)
+    print(f"    *** Wrote {args.count} synthetic dockets ({format(written / 1024 / 1024, '.1f')}MB of xml) to {args.output} in {format(time.time() - started, '.1f')}s ***")
+
+#----------------------
+# Argument parsing
+#----------------------
+
+def build_parser():
+    """ Build the argument parser for all subcommands. """
+
+    # options shared by every subcommand
+    common = argparse.ArgumentParser(add_help = False)
+    common.add_argument('--config', default = None, help = "The path to a json configuration file or a directory with a `settings.json` file. Otherwise the default search path is used.")
+    common.add_argument('--beta', default = None, action = 'store_true', help = "If provided, hit the beta/development server instead of production jnet. Not necessary if you have the endpoint configured in your settings file.")
+    common.add_argument('--verbose', '-v', default = False, action = 'store_true', help = "Prints out technical details about the request and response")
+    common.add_argument('--debug', default = False, action = 'store_true', help = "Run with postmortem debugger to investigate an error")
+    common.add_argument('--record', default = None, metavar = 'ARCHIVE', help = "Record every request and response (with credentials redacted) to a compressed archive, i.e. `session.jsonl.gz`.")
+    common.add_argument('--replay', default = None, metavar = 'ARCHIVE', help = "Replay the responses from an archive made with `--record` instead of contacting JNET.")
+    common.add_argument('--http2', default = False, action = 'store_true', help = "Send requests over HTTP/2 when the server supports it, multiplexing concurrent requests over fewer connections. Requires `pip install 'httpx[http2]'`.")
+    common.add_argument('--compress-requests', default = False, action = 'store_true', help = "Gzip the request bodies. Only use this with a server that accepts compressed requests.")
+    common.add_argument('--hedge', default = None, type = float, metavar = 'PERCENTILE', help = "Resend a status check that has had no reply by this percentile of the observed latencies, i.e. 95, and use whichever reply comes first.")
+    common.add_argument('--adaptive-concurrency', default = None, type = int, metavar = 'MAX', help = "Adapt the number of SOAP calls sent at once to how JNET responds, up to MAX: the limit grows while replies are fast and is cut on faults or slow replies.")
+    common.add_argument('--circuit-breaker', default = False, action = 'store_true', help = "Stop sending requests for a while after repeated failures (connection errors, timeouts or overload statuses), failing fast instead.")
+    common.add_argument('--tracking-prefix', default = None, metavar = 'PREFIX', help = "Start the generated tracking ids of new requests with this prefix. With `status`, only list the requests whose tracking ids start with it.")
+    common.add_argument('--validate', default = False, action = 'store_true', help = "Check and normalize docket numbers and OTNs before requesting them, i.e. `cp 51 cr 100 2021` becomes CP-51-CR-0000100-2021. Invalid ones are reported and not sent.")
+    common.add_argument('--not-found-cache', default = None, metavar = 'FILE', help = "A SQLite file that remembers the dockets and OTNs AOPC did not find, so they are not requested again until --recheck-days have passed.")
+    common.add_argument('--recheck-days', default = 7, type = float, help = "With --not-found-cache, the days after which a docket that was not found is requested again (default 7).")
+    common.add_argument('--log-events', default = None, metavar = 'FILE', help = "Append a json line with the timings and sizes of every request to this file.")
+    common.add_argument('--trace-file', default = None, metavar = 'FILE', help = "Append a json line for every tracing span (docket fetches, SOAP calls, and their sign/network/parse phases) to this file.")
+
+    parser = argparse.ArgumentParser(prog = 'jnet', description = "Make requests to the JNET Court Case Event (CCE) services.")
+    subparsers = parser.add_subparsers(dest = 'command', metavar = 'command')
+
+    sub = subparsers.add_parser('request', parents = [common], help = "Request one or more dockets")
+    sub.add_argument('docket_number', nargs = '+', help = "The docket number(s) to request")
+    sub.add_argument('--tracking-id', '-t', default = None, help = "The user defined tracking id")
+    sub.add_argument('--output', '-o', default = None, help = "A path to a file to dump the results.")
+    sub.set_defaults(func = cmd_request)
+
+    sub = subparsers.add_parser('participant', parents = [common], help = "Request the case history for a participant")
+    sub.add_argument('--first-name', '-f', required = True, help = "The first name of the participant to search for")
+    sub.add_argument('--last-name', '-l', required = True, help = "The last name of the participant to search for")
+    sub.add_argument('--birthdate', '-b', required = True, type = datetime.date.fromisoformat, help = "The birthday of the person to search for, in ISO8601 format (yyyy-mm-dd)")
+    sub.add_argument('--tracking-id', '-t', default = None, help = "The user defined tracking id")
+    sub.add_argument('--output', '-o', default = None, help = "A path to a file to dump the results.")
+    sub.set_defaults(func = cmd_participant)
+
+    sub = subparsers.add_parser('status', parents = [common], help = "Check the status of requests")
+    sub.add_argument('--all', action = 'store_true', help = "If provided, show all requests, not just the pending ones.")
+    sub.add_argument('--tracking-id', '-t', nargs = '*', default = None, help = "Specify a specific tracking id (multiple allowed)")
+    sub.add_argument('--docket', '-d', default = None, help = "Specify a specific docket number to search for")
+    sub.add_argument('--otn', default = None, help = "Specify a specific OTN to search for")
+    sub.add_argument('-n', default = 100, type = int, help = "Specify a record limit (default 100)")
+    sub.add_argument('--ignore-errors', '-e', default = False, action = 'store_true', help = "Show the details of requests that cannot be processed instead of failing.")
+    sub.add_argument('--output', '-o', default = None, help = "A path to a file to dump the results.")
+    sub.set_defaults(func = cmd_status)
+
+    sub = subparsers.add_parser('retrieve', parents = [common], help = "Retrieve requested files")
+    sub.add_argument('file_id', nargs = '*', help = "The file_ids to fetch")
+    sub.add_argument('--tracking-id', '-t', default = None, help = "A tracking id to retrieve. Can be combined with --docket to narrow it down further")
+    sub.add_argument('--docket', '-d', default = None, help = "A docket number to retrieve. Can be combined with --tracking-id to narrow it down further")
+    sub.add_argument('--all', '-a', action = 'store_true', help = "If provided, retrieves all pending requests, clearing out the entire pending queue.")
+    sub.add_argument('--queued', '-q', action = 'store_true', help = "If provided, retrieves requests that are queued but not yet fulfilled.")
+    sub.add_argument('--ignore-missing', '-i', action = 'store_true', help = "If provided, don't fetch any requests that are not found.")
+    sub.add_argument('--output', '-o', default = None, help = "A path to a file to dump the results. A path ending in `.ndjson` or `.jsonl` (optionally followed by `.gz` or `.zst`) streams one docket per line.")
+    sub.add_argument('--flush-every', default = 100, type = int, help = "For line-delimited json output, the number of records to buffer before writing to disk (default 100).")
+    sub.set_defaults(func = cmd_retrieve)
+
+    sub = subparsers.add_parser('fetch', parents = [common], help = "Request dockets, wait until they are ready, and retrieve them")
+    sub.add_argument('docket_number', nargs = '*', help = "The docket number(s) to fetch")
+    sub.add_argument('--input', '-i', default = None, help = "A file with docket numbers to fetch, or `-` to read from stdin. One docket number per line, or csv (see `--column`).")
+    sub.add_argument('--column', '-c', default = None, help = "For csv input, the name or 0-based index of the column with the docket numbers.")
+    sub.add_argument('--concurrency', '-n', default = 1, type = int, help = "The number of dockets to request and poll for at the same time (default 1).")
+    sub.add_argument('--timeout', '-t', default = None, type = int, help = "Set an alternate timeout, in seconds, for each docket.")
+    sub.add_argument('--retry-file', default = 'failed-dockets.txt', help = "Dockets that fail are written to this file so they can be rerun with `--input` (default `failed-dockets.txt`).")
+    sub.add_argument('--output', '-o', default = None, help = "A path to a json file to dump the results. A path ending in `.ndjson` or `.jsonl` (optionally followed by `.gz` or `.zst`) streams one docket per line, and a directory (an existing one, or a path ending in `/`) gets one `<docket number>.json` file per docket.")
+    sub.add_argument('--flush-every', default = 100, type = int, help = "For line-delimited json output, the number of records to buffer before writing to disk (default 100).")
+    sub.set_defaults(func = cmd_fetch)
+
+    def size(value):
+        # either a fixed number or a min-max range, i.e. `10` or `1-20`
+        if '-' in value:
+            low, high = value.split('-', 1)
+            return((int(low), int(high)))
+        return(int(value))
+
+    sub = subparsers.add_parser('synthetic', parents = [common], help = "Generate synthetic docket replies for benchmarks and tests")
+    sub.add_argument('--output', '-o', required = True, help = "A directory to write one xml file per docket, or a `.jsonl`/`.ndjson` file (optionally `.gz` or `.zst`) to write one docket per line.")
+    sub.add_argument('--count', '-n', default = 1000, type = int, help = "The number of dockets to generate (default 1000).")
+    sub.add_argument('--start', default = 0, type = int, help = "The index of the first docket, to generate a corpus in pieces (default 0).")
+    sub.add_argument('--seed', default = 0, type = int, help = "The random seed (default 0).")
+    sub.add_argument('--participants', default = (1, 4), type = size, help = "Participants per docket, as a number or a range like `1-4` (default 1-4).")
+    sub.add_argument('--charges', default = (1, 12), type = size, help = "Charges per docket, as a number or a range like `1-12` (default 1-12).")
+    sub.add_argument('--events', default = (2, 30), type = size, help = "Calendar events per docket, as a number or a range like `2-30` (default 2-30).")
+    sub.set_defaults(func = cmd_synthetic)
+
+    return(parser)
+
+def main(argv = None):
+    """ Entry point for the `jnet` console script. """
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not args.command:
+        parser.print_help()
+        return(2)
+
+    if not args.debug:
+        return(args.func(args))
+
+    try:
+        return(args.func(args))
+    except Exception:
+        import pdb, traceback
+        errtype, value, tb = sys.exc_info()
+        print("\n*** Error caught, preparing for post-mortem debugging ***\n------------")
+        traceback.print_exception(errtype, value, tb)
+        print("\n------------\n")
+        pdb.post_mortem(tb)
+        raise
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -24,18 +24,25 @@ import re
 import requests
 import zeep
 import zeep.wsse
-import lxml
+import lxml.etree
 import pathlib
-import pdb,warnings
-
-from cryptography.hazmat.primitives.serialization import Encoding, PrivateFormat, NoEncryption, PublicFormat
-from cryptography.hazmat.primitives.serialization.pkcs12 import load_key_and_certificates
+import warnings
+import time
+import threading
+import gc
 
 from .signature import JNetSignature
 from .response import SOAPResponse
 from .exceptions import AuthenticationUseridError
-
-class Client():
+from .transport import RequestsTransport
+from . import instrumentation
+from . import tracing
+from . import certificates
+from . import concurrency
+from . import tracking
+from .forksafe import ForkSafe
+
+class Client(ForkSafe):
     """
     Baseclass for communicating with jnet.
 
@@ -43,12 +50,28 @@ class Client():
     but the requests use the private key and client certificate in PEM format. In
     the future possibility of separating out the private key and client certificate, it would be trivial to add arguments that connect to the `client_pem_key` and `client_pem_cert` properties.
 
+    Thread safety: a single client may be shared by many threads, i.e. the workers of a
+    `ThreadPoolExecutor`. The zeep client and the certificate data are initialized once under a
+    lock, and everything specific to a single call (the request timer and the current tracing span)
+    is kept in context variables rather than on the instance. Settings such as the endpoint or the
+    certificate should not be changed while requests are in flight.
+
+    Process pools: a client can be pickled, i.e. passed to `multiprocessing` or
+    `concurrent.futures.ProcessPoolExecutor` workers. The pickle carries the configuration and the
+    decoded certificate, so the child does not decrypt the PFX again, while the zeep client and the
+    http session are rebuilt on first use in the child. With the 'fork' start method, call
+    `warm_up()` before creating the pool so that every worker inherits the parsed WSDL and the
+    certificate instead of building its own; the http session is always dropped in the child so
+    that workers never share a connection with the parent.
+
     Class Properties:
         wsdl_path: The wsdl_path must be defined in each subclass and specify the WSDL file for the requests that may be included. The files should exist relative to the jnet object folder.
         url_path: The URL Path is the subclass-specific path for the endpoint, i.e. for "https://ws.jnet.beta.pa.gov/AOPC/CCERequest", the "endpoint" is "https://ws.jnet.beta.pa.gov/" and the "url_path" is "/AOPC/CCERequest". These are separate because the url_path is expected to be the same for all requests in a class, but the endpoint can change from one request to another (beta vs production)
 
     """
 
+    _fork_locks = {'_lock': threading.RLock}
+
     wsdl_path = None
     url_path = None
 
@@ -62,6 +85,15 @@ class Client():
         user_id:str = None,
         verbose:bool = False,
         test:bool = False,
+        transport = None,
+        observers = None,
+        tracer = None,
+        hedging = None,
+        limiter = None,
+        circuit_breakers = None,
+        tracking_ids = None,
+        validate_identifiers = False,
+        negative_cache = None,
     ):
         """
         Args:
@@ -73,14 +105,33 @@ class Client():
             endpoint: Custom override for the property - see details in property documentation.
             server_certificate: Custom override for the property - see details in property documentation.
             user_id: Custom override for the property - see details in property documentation.
+            transport: The `jnet.transport.Transport` that sends requests. Default is a `RequestsTransport`, which pools connections. Use a `RecordingTransport` or `ReplayTransport` to capture or replay exchanges.
+            observers: A list of callables that receive a timing event for every request - see `add_observer`.
+            tracer: A `jnet.tracing.Tracer` that records a span for every request and docket fetch. Default is a no-op tracer.
+            hedging: A `jnet.hedging.HedgingPolicy` that sends a second copy of slow read-only requests, such as status checks, and uses the first reply. Default is None, i.e. no hedging.
+            limiter: A `jnet.concurrency.AIMDLimiter` that adapts how many SOAP calls the client sends at once, from the latency and faults of the replies. Default is None, i.e. no limit.
+            circuit_breakers: A `jnet.circuit.CircuitBreakers` registry that fails requests fast with `CircuitOpenError` while their endpoint is down. Default is None.
+            tracking_ids: A callable that returns a new, unique tracking id for each request, i.e. a `jnet.tracking.TrackingIdGenerator` with a batch prefix. Default is the process-wide `jnet.tracking.default_generator`.
+            validate_identifiers: If True, docket numbers and OTNs are normalized (see `jnet.validation`) before they are requested, and ones that cannot be valid raise `jnet.exceptions.InvalidIdentifier` without being sent. Default is False.
+            negative_cache: A `jnet.negative_cache.NotFoundCache` that records the docket numbers and OTNs that AOPC did not find, so that requests for them raise `jnet.exceptions.NotFound` without being sent until the cache's `recheck_after` has passed. Default is None.
         """
 
         self._zeep = None
-        self.error = None
         self._cert_data = None
+        # the lock guards the lazy initialization of the zeep client and certificate data
+        self._init_fork_safe()
 
         self.verbose = verbose
         self.test = test
+        self.transport = transport if transport else RequestsTransport()
+        self.observers = list(observers) if observers else []
+        self.tracer = tracer if tracer else tracing.NOOP_TRACER
+        self.hedging = hedging
+        self.limiter = limiter
+        self.circuit_breakers = circuit_breakers
+        self.tracking_ids = tracking_ids if tracking_ids else tracking.default_generator
+        self.validate_identifiers = validate_identifiers
+        self.negative_cache = negative_cache
 
         # naively set all user/config settings,
         # though if not provided the property
@@ -93,19 +144,35 @@ class Client():
         self.server_certificate = server_certificate
         self.user_id = user_id
 
+    def __getstate__(self):
+        """ Pickle the configuration and certificate data, but not the zeep client or the lock, which are rebuilt in the new process. """
+        state = super().__getstate__()
+        state['_zeep'] = None
+        return(state)
+
+    def warm_up(self, freeze:bool = False):
+        """ Load everything the client builds lazily - the certificate, the WSDL, the zeep client and the SSLContext for the endpoint - ahead of the first request.
+
+        Call this in the parent process before forking workers, so that each worker inherits the loaded client through copy-on-write instead of parsing the WSDL and decrypting the certificate itself.
+
+        Args:
+            freeze: If True, also call `gc.freeze()` so that garbage collection in the workers does not touch, and so copy, the inherited objects. Default is False.
+        Returns:
+            The client, to allow chaining.
+        """
+        self.zeep.service
+        if hasattr(self.transport, 'ssl_context') and self.endpoint.startswith('https'):
+            self.transport.ssl_context(self.server_certificate)
+        if freeze:
+            gc.freeze()
+        return(self)
+
 
     def find_certificate(self, strmatch):
-        """ Attempt to find a certificate in the cert/ folder that matches the string. """
+        """ Attempt to find a certificate in the cert/ folder that matches the string.
 
-        def recurse_subdir(dirpath):
-            for fobj in dirpath.iterdir():
-                if not fobj.is_dir():
-                    if strmatch in fobj.name:
-                        return(fobj)
-                else:
-                    result = recurse_subdir(fobj)
-                    if result:
-                        return(result)
+        The folder listing is cached until the folder changes - see `jnet.certificates.certificate_files`.
+        """
 
         cert = pathlib.Path(self.config_root_dir + "/cert")
         if not cert.exists() or not cert.is_dir():
@@ -116,7 +183,7 @@ class Client():
             else:
                 raise FileNotFoundError(f"There is no cert/ directory to attempt to find a certificate matching {strmatch}")
 
-        certfile = recurse_subdir(cert)
+        certfile = next((fobj for fobj in certificates.certificate_files(cert) if strmatch in fobj.name), None)
         if not certfile:
             raise FileNotFoundError(f"Could not find a certificate matching {strmatch} in the cert/ folder")
         return(certfile.as_posix())
@@ -127,60 +194,62 @@ class Client():
 
         Initializes the default client and then calls `configure_client(client)`, which must be defined in the subclass. The default client includes standard namescapes for web transport, client certificates, gjxdm, and jnet.
         """
-        if not self._zeep:
-
-            if not self.wsdl_path:
-                raise Exception("wsdl_path required to be defined as either a class or instance variable")
-
-            wsdl_file = os.path.dirname(__file__) + "/" + self.wsdl_path
-            if not os.path.exists(wsdl_file):
-                raise FileNotFoundError(f"Could not find wsdl file at '{wsdl_file}'")
-
-            client = zeep.Client(
-                wsdl_file,
-                wsse = JNetSignature(
-                    self.client_pem_key,
-                    self.client_pem_cert,
-                )
-            )
-            # set namespaces for standard schemas
-            client.set_ns_prefix("wsa", zeep.ns.WSA)
-            client.set_ns_prefix("xsd", zeep.ns.XSD)
-            client.set_ns_prefix("xsi", zeep.ns.XSI)
-
-            # WSSE security for client side certificate schemas
-            client.set_ns_prefix("wsse-util", zeep.ns.WSU)
-            client.set_ns_prefix("wsse", zeep.ns.WSSE)
-            client.set_ns_prefix("xmlds", zeep.ns.DS)
-            client.set_ns_prefix("wsse", zeep.ns.WSSE)
-
-            # namespaces taht we expect to be in all jnet requests
-            client.set_ns_prefix("jnet-m", "http://www.jnet.state.pa.us/niem/jnet/metadata/1")
-            client.set_ns_prefix("pacourts", "http://us.pacourts.us/niem/aopc/Extension/2")
-            client.set_ns_prefix("jxdm", "http://niem.gov/niem/domains/jxdm/4.0")
-            client.set_ns_prefix("niem-core", "http://niem.gov/niem/niem-core/2.0")
-
-            self.configure_client(client)
-            self._zeep = client
+        if self._zeep is None:
+            with self._lock:
+                # check again, as another thread may have built the client while this one waited
+                if self._zeep is None:
+                    if not self.wsdl_path:
+                        raise Exception("wsdl_path required to be defined as either a class or instance variable")
+
+                    wsdl_file = os.path.dirname(__file__) + "/" + self.wsdl_path
+                    if not os.path.exists(wsdl_file):
+                        raise FileNotFoundError(f"Could not find wsdl file at '{wsdl_file}'")
+
+                    client = zeep.Client(
+                        wsdl_file,
+                        wsse = JNetSignature(
+                            self.client_pem_key,
+                            self.client_pem_cert,
+                        )
+                    )
+                    # set namespaces for standard schemas
+                    client.set_ns_prefix("wsa", zeep.ns.WSA)
+                    client.set_ns_prefix("xsd", zeep.ns.XSD)
+                    client.set_ns_prefix("xsi", zeep.ns.XSI)
+
+                    # WSSE security for client side certificate schemas
+                    client.set_ns_prefix("wsse-util", zeep.ns.WSU)
+                    client.set_ns_prefix("wsse", zeep.ns.WSSE)
+                    client.set_ns_prefix("xmlds", zeep.ns.DS)
+                    client.set_ns_prefix("wsse", zeep.ns.WSSE)
+
+                    # namespaces taht we expect to be in all jnet requests
+                    client.set_ns_prefix("jnet-m", "http://www.jnet.state.pa.us/niem/jnet/metadata/1")
+                    client.set_ns_prefix("pacourts", "http://us.pacourts.us/niem/aopc/Extension/2")
+                    client.set_ns_prefix("jxdm", "http://niem.gov/niem/domains/jxdm/4.0")
+                    client.set_ns_prefix("niem-core", "http://niem.gov/niem/niem-core/2.0")
+
+                    self.configure_client(client)
+                    self._zeep = client
 
         return(self._zeep)
 
     @property
     def cert_data(self):
-        """ dict: Retains the data for the private_key and client certificate as parsed from the client certificate file. """
-        if not self._cert_data:
-            if not self.client_certificate:
-                raise FileNotFoundError("No client certificate provided or found")
-            if not os.path.exists(self.client_certificate):
-                raise FileNotFoundError(f"Provided '{self.client_certificate}' as the client certificate, but no file exists at that location")
-            if not self.client_password:
-                raise Exception("No client password to decrypt the client certificate")
-            pfx = pathlib.Path(self.client_certificate).read_bytes()
-            private_key, main_cert, add_certs = load_key_and_certificates(pfx, self.client_password.encode('utf-8'), None)
-            self._cert_data = {
-                'private_key': private_key.private_bytes(Encoding.PEM, PrivateFormat.PKCS8, NoEncryption()),
-                'certificate': main_cert.public_bytes(Encoding.PEM).decode()
-            }
+        """ dict: Retains the data for the private_key and client certificate as parsed from the client certificate file.
+
+        The decrypted certificate is cached for the whole process (see `jnet.certificates`), so clients using the same certificate only decrypt it once.
+        """
+        if self._cert_data is None:
+            with self._lock:
+                if self._cert_data is None:
+                    if not self.client_certificate:
+                        raise FileNotFoundError("No client certificate provided or found")
+                    if not os.path.exists(self.client_certificate):
+                        raise FileNotFoundError(f"Provided '{self.client_certificate}' as the client certificate, but no file exists at that location")
+                    if not self.client_password:
+                        raise Exception("No client password to decrypt the client certificate")
+                    self._cert_data = certificates.load_client_certificate(self.client_certificate, self.client_password)
 
         return(self._cert_data)
 
@@ -353,14 +422,9 @@ class Client():
 
         # see if the endpoint certificate is in the certifi store
         # and raise an informative error if not
-        import certifi
-        with open(certifi.where()) as storefh:
-            certstore = storefh.read()
-            with open(certpath) as certfh:
-                cert = certfh.read().strip()
-                if cert not in certstore:
-                    # - so the certificate has not been installed
-                    raise Exception(f"endpoint certificate found at {certdir}, but it appears neither the certificate is installed nor has the full certificate chain been created as a combined file.\n\nYou should install the certificate by running `python bin/install_certificate.py {certpath}` or create a combined certificate by running `python bin/create_certificate_chain.py {certdir}`")
+        if not certificates.is_installed(certpath):
+            # - so the certificate has not been installed
+            raise Exception(f"endpoint certificate found at {certdir}, but it appears neither the certificate is installed nor has the full certificate chain been created as a combined file.\n\nYou should install the certificate by running `python bin/install_certificate.py {certpath}` or create a combined certificate by running `python bin/create_certificate_chain.py {certdir}`")
 
         self._server_certificate = True
 
@@ -398,6 +462,47 @@ class Client():
 
         return(full_url)
 
+    #----------------------
+    # Instrumentation
+    #----------------------
+
+    def add_observer(self, observer):
+        """ Register a callable to receive instrumentation events.
+
+        The observer is called with a dict for every SOAP call made by the client, with the operation, tracking id, the time spent building, signing, sending and parsing the request, the request and response sizes, and the http status. See `jnet.instrumentation` for the event fields and for ready-made observers. Observers may be called from several threads at once.
+        """
+        self.observers.append(observer)
+
+    def remove_observer(self, observer):
+        """ Stop sending events to an observer added with `add_observer`. """
+        self.observers.remove(observer)
+
+    def notify(self, event:dict):
+        """ Send an event to every observer. An observer that fails issues a warning but does not interrupt the request. """
+        for observer in self.observers:
+            try:
+                observer(event)
+            except Exception as e:
+                warnings.warn(f"jnet observer {observer!r} failed: {e!r}")
+
+    def create_message(self, operation:str, **kwargs):
+        """ Build and sign the envelope for a SOAP operation.
+
+        This is `zeep.Client.create_message` for the client's service, with the build and signing times recorded for the instrumentation event that `make_request` reports.
+
+        Args:
+            operation: The WSDL operation name.
+            **kwargs: The operation parameters.
+        Returns:
+            The lxml.etree for the signed request.
+        """
+        timer = instrumentation.start_timer()
+        started = time.perf_counter()
+        node = self.zeep.create_message(self.zeep.service, operation, **kwargs)
+        # the signature plugin records its own time, so the build time is whatever remains
+        timer.durations['build'] = time.perf_counter() - started - timer.get('sign')
+        return(node)
+
     def make_request(self, node):
         """ Sends the request to jnet.
 
@@ -407,31 +512,174 @@ class Client():
             print("---- REQUEST ----")
             print(lxml.etree.tostring(node, pretty_print = True).decode('utf-8'))
 
-        headers = {'Content-Type': 'application/soap+xml; charset=utf-8'}
+        # replies are decompressed as they are read, and parsed from the bytes
+        headers = {'Content-Type': 'application/soap+xml; charset=utf-8', 'Accept-Encoding': 'gzip, deflate'}
 
         if not self.url_path:
             raise Exception("No url path provided, which must be defined in the subclass to specify the full endpoint to make a request to.")
 
+        timer = instrumentation.take_timer()
+        url = self.get_endpoint_url(node)
+        body = lxml.etree.tostring(node)
+        response = None
+        error = None
         try:
-            response = requests.post(
-                self.get_endpoint_url(node),
-                headers=headers,
-                data=lxml.etree.tostring(node),
-                verify = self.server_certificate,
-            )
-        except requests.exceptions.SSLError as sslerr:
-            # it's easy to forget that requests expects server certificates to be the entire
-            # chain and not just the endpoint - so we'll add an extra message.
-            if self.server_certificate and "certificate verify failed: unable to get local issuer" in f"{sslerr}":
-                print("***Server Certificate verification failed****\nNote: This can occur if you specified the SSL certificate for the endpoint but did not include the full certificate chain. \nRun with `server_certificate = False` to temporarily skip verification", file = sys.stderr)
+            try:
+                response, failed = self.send_request(node, url, body, headers, timer)
+            except requests.exceptions.SSLError as sslerr:
+                # it's easy to forget that requests expects server certificates to be the entire
+                # chain and not just the endpoint - so we'll add an extra message.
+                if self.server_certificate and "certificate verify failed: unable to get local issuer" in f"{sslerr}":
+                    print("***Server Certificate verification failed****\nNote: This can occur if you specified the SSL certificate for the endpoint but did not include the full certificate chain. \nRun with `server_certificate = False` to temporarily skip verification", file = sys.stderr)
+                raise
+
+            if not response.ok:
+                from .exceptions import error_factory
+                raise error_factory(response, failed)
+
+            with timer.phase('parse'):
+                obj = SOAPResponse(response)
+                if self.observers:
+                    # the data is otherwise converted lazily by the caller, which would
+                    # leave most of the parse time out of the event
+                    obj.data
+        except Exception as e:
+            error = e
             raise
+        finally:
+            if self.observers or self.tracer.enabled:
+                event = self.request_event(node, url, body, response, timer, error)
+                if self.observers:
+                    self.notify(event)
+                if self.tracer.enabled:
+                    self.trace_request(event, timer, error)
 
-        if not response.ok:
-            from .exceptions import error_factory
-            raise error_factory(response)
-
-        obj = SOAPResponse(response)
         if self.verbose:
             print(f"\n\n---- Response ----\n{obj}")
 
         return(obj)
+
+    def send_request(self, node, url:str, body:bytes, headers:dict, timer):
+        """ Send the signed request with the transport, under the client's `circuit_breakers`, `limiter` and `hedging` policy if they are set.
+
+        Args:
+            node: The signed request envelope.
+            url: The full endpoint url.
+            body: The serialized envelope.
+            headers: The http headers to send.
+            timer: The `RequestTimer` of the call, which the network time and the number of hedges are recorded to.
+        Returns:
+            tuple of the response from the transport, and the `SOAPResponse` of a failed response (parsed once, both to classify the failure and to raise the error), or None if the request succeeded or the reply is not xml.
+        Raises:
+            jnet.exceptions.CircuitOpenError if the circuit breaker for the endpoint is open.
+        """
+        breaker = self.circuit_breakers.breaker(self.endpoint) if self.circuit_breakers is not None else None
+        if breaker is not None:
+            probe, event = breaker.before_call()
+            if event and self.observers:
+                self.notify(event)
+        # waiting for a slot is not network time
+        try:
+            slot = self.limiter.acquire() if self.limiter is not None else None
+        except BaseException:
+            if breaker is not None:
+                breaker.cancel(probe)
+            raise
+        operation = self.operation_name(node)
+        response = None
+        failed = None
+        try:
+            with timer.phase('network'):
+                if self.hedging is not None:
+                    response, timer.hedges = self.hedging.send(
+                        self.transport,
+                        operation,
+                        url,
+                        body,
+                        headers,
+                        verify = self.server_certificate,
+                        limiter = self.limiter,
+                        notify = self.notify if self.observers else None,
+                    )
+                else:
+                    response = self.transport.send(
+                        url,
+                        body,
+                        headers,
+                        verify = self.server_certificate,
+                    )
+        finally:
+            if response is not None and not response.ok:
+                failed = SOAPResponse.from_failure(response)
+            failure = concurrency.is_overload(response, failed)
+            events = []
+            if slot is not None:
+                events.append(self.limiter.release(slot, fault = failure, operation = operation))
+            if breaker is not None:
+                events.append(breaker.after_call(probe, failure))
+            if self.observers:
+                for event in events:
+                    if event:
+                        self.notify(event)
+        return((response, failed))
+
+    def trace_request(self, event:dict, timer, error = None):
+        """ Record the span for a SOAP call, with its sign, network and parse phases as child spans.
+
+        The span is recorded after the fact from the timer, as the envelope is built and signed before `make_request` is called.
+        """
+        attributes = {
+            'rpc.system': 'soap',
+            'rpc.method': event['operation'],
+            'url.full': event['url'],
+            'http.response.status_code': event['status'],
+            'http.request.body.size': event['request_bytes'],
+            'http.response.body.size': event['response_bytes'],
+            'jnet.tracking_id': event['tracking_id'],
+            'jnet.file_id': event['file_id'],
+            'jnet.hedges': event['hedges'],
+        }
+        # OpenTelemetry rejects None values, i.e. the status of a call without a response or the file id of a status check
+        span = self.tracer.start_span(f"jnet {event['operation']}", {key: value for key, value in attributes.items() if value is not None}, start_time = timer.started)
+        for name, started, ended in timer.intervals:
+            self.tracer.start_span(f"jnet.{name}", start_time = started, parent = span).end(end_time = ended)
+        if error:
+            span.set_error(error)
+        span.end()
+
+    @staticmethod
+    def soap_body(node):
+        """ The SOAP Body element of a request envelope, or None. """
+        return(next((child for child in node if lxml.etree.QName(child).localname == 'Body'), None))
+
+    @classmethod
+    def operation_name(cls, node):
+        """ The SOAP operation of a request envelope, i.e. the first element of its Body, or None. """
+        soap_body = cls.soap_body(node)
+        return(lxml.etree.QName(soap_body[0]).localname if soap_body is not None and len(soap_body) else None)
+
+    def request_event(self, node, url:str, body:bytes, response, timer, error = None):
+        """ Build the instrumentation event for a SOAP call - see `jnet.instrumentation`. """
+        soap_body = self.soap_body(node)
+        operation = self.operation_name(node)
+        fields = {}
+        if soap_body is not None:
+            for element in soap_body.iter('{*}UserDefinedTrackingID', '{*}FileTrackingID'):
+                fields[lxml.etree.QName(element).localname] = element.text
+
+        phases = {name: timer.get(name) for name in ('build', 'sign', 'network', 'parse')}
+        return({
+            'event': 'request',
+            'timestamp': instrumentation.utcnow(),
+            'operation': operation,
+            'tracking_id': fields.get('UserDefinedTrackingID'),
+            'file_id': fields.get('FileTrackingID'),
+            'url': url,
+            'status': response.status_code if response is not None else None,
+            'request_bytes': len(body),
+            'response_bytes': len(response.content) if response is not None else 0,
+            **{f"{name}_seconds": value for name, value in phases.items()},
+            'total_seconds': sum(phases.values()),
+            'hedges': timer.hedges,
+            'error': type(error).__name__ if error else None,
+        })
@@ -0,0 +1,231 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Adaptive limits on the number of SOAP calls sent to JNET at once.
+
+A fixed worker count for a batch is guesswork: too few leaves the batch window unused, and too many
+brings on faults and slow replies from JNET. An `AIMDLimiter` on the client adjusts the limit as the
+batch runs, the way TCP adjusts its congestion window: every healthy reply raises the limit a little
+(additive increase, by about `increase` for each round of `limit` calls), and a fault or a reply much
+slower than usual cuts it by a factor (multiplicative decrease). Calls beyond the limit wait for a slot.
+
+```python
+limiter = jnet.concurrency.AIMDLimiter(initial = 4, maximum = 32)
+jnetclient = jnet.CCE(limiter = limiter)
+for docket_number, data, error in jnetclient.fetch_dockets(docket_numbers):
+    ...
+```
+
+Every change to the limit is reported to the client's observers as a `concurrency` event - see
+`jnet.instrumentation`.
+"""
+
+import time
+import threading
+
+from . import instrumentation
+from .forksafe import ForkSafe
+
+# http statuses that mean the server is overloaded or throttling, rather than that the request was wrong
+OVERLOAD_STATUSES = frozenset([429, 502, 503, 504])
+
+# SOAP faults for errors in the request itself, which JNET returns with a 500 like any other fault
+CLIENT_FAULTS = frozenset(['Authentication_Error', 'Validation_Error', 'Invalid_Request'])
+
+def is_overload(response, soap_response = ...):
+    """ Whether the outcome of a call means that the server is overloaded or down, rather than that the request was wrong.
+
+    Every SOAP fault comes back as an http 500, so a 500 only counts if its fault blames the server: a
+    `Server` faultcode that is not one of the `CLIENT_FAULTS`, or a body that is not a SOAP fault at all,
+    i.e. an error page from a proxy.
+
+    Args:
+        response: The http response, or None if no response was received (a connection error or timeout).
+        soap_response: The response parsed with `SOAPResponse.from_failure`, which is None if it is not xml. Default is to parse a 500 here.
+    Returns:
+        True if the call should count against the limiter and circuit breakers.
+    """
+    if response is None or response.status_code in OVERLOAD_STATUSES:
+        return(True)
+    if response.status_code != 500:
+        return(False)
+
+    if soap_response is ...:
+        from .response import SOAPResponse
+        soap_response = SOAPResponse.from_failure(response)
+    fault = soap_response.fault if soap_response is not None else None
+    if not fault:
+        return(True)
+    faultcode = (fault['faultcode'] or '').rpartition(':')[2]
+    return(not faultcode.startswith('Client') and fault['faultstring'] not in CLIENT_FAULTS)
+
+
+class Slot():
+    """ A call holding a place under the limit, returned by `AIMDLimiter.acquire`.
+
+    Attributes:
+        started: When the slot was acquired, from `time.perf_counter`.
+        generation: The number of cuts to the limit before the slot was acquired.
+        saturated: True if the calls in flight were using most of the limit when the slot was acquired.
+    """
+
+    __slots__ = ('started', 'generation', 'saturated')
+
+    def __init__(self, generation:int, saturated:bool):
+        self.started = time.perf_counter()
+        self.generation = generation
+        self.saturated = saturated
+
+
+class AIMDLimiter(ForkSafe):
+    """ An additive increase / multiplicative decrease limit on concurrent calls.
+
+    A reply is unhealthy if it is a fault that means the server is overloaded (see `is_overload`), or if
+    it took more than `latency_tolerance` times the smoothed latency of recent replies to the same
+    operation, as a retrieval of a large docket is much slower than a status check even when JNET is
+    healthy. The limit is cut
+    at most once for the calls that were already in flight when it was last cut, as they all saw the same
+    overload. The limit only grows while the calls in flight use at least half of it, so that a limit
+    that is not reached does not creep up to the maximum.
+
+    Constructor Args:
+        initial: The starting limit. Default is 4.
+        minimum: The lowest limit. Default is 1.
+        maximum: The highest limit. Default is 32.
+        increase: How much the limit grows over each round of `limit` healthy replies. Default is 1.
+        decrease: The factor the limit is multiplied by when it is cut. Default is 0.5.
+        latency_tolerance: How many times slower than the smoothed latency a reply can be before it counts as a latency spike. Default is 2.
+        smoothing: The weight of each new latency in the smoothed latency. Default is 0.1.
+
+    Attributes:
+        limit: The current limit, which may be fractional; `int(limit)` calls run at once.
+        in_flight: The number of calls holding a slot.
+        baselines: The smoothed latency in seconds of each operation that has had a reply.
+        decisions: The number of times the limit was raised, or cut for a 'fault' or a 'latency' spike.
+    """
+
+    _fork_locks = {'_condition': threading.Condition}
+    _fork_reset = {'in_flight': int}
+
+    def __init__(
+        self,
+        initial:float = 4,
+        minimum:float = 1,
+        maximum:float = 32,
+        increase:float = 1,
+        decrease:float = 0.5,
+        latency_tolerance:float = 2,
+        smoothing:float = 0.1,
+    ):
+        if not minimum <= initial <= maximum or minimum < 1:
+            raise ValueError(f"The limits must satisfy 1 <= minimum <= initial <= maximum, not {minimum}, {initial} and {maximum}")
+        if not 0 < decrease < 1:
+            raise ValueError(f"decrease must be a factor between 0 and 1, not {decrease}")
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_tolerance = latency_tolerance
+        self.smoothing = smoothing
+
+        self.in_flight = 0
+        self.baselines = {}
+        self.decisions = {'increase': 0, 'fault': 0, 'latency': 0}
+        self._generation = 0
+        self._init_fork_safe()
+
+    def acquire(self, timeout:float = None):
+        """ Wait until a call can start under the limit and take a slot for it.
+
+        Args:
+            timeout: The most seconds to wait, or None to wait as long as it takes.
+        Returns:
+            The `Slot`, to pass to `release` when the call is finished.
+        Raises:
+            TimeoutError if no slot became free within the timeout.
+        """
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout = timeout):
+                raise TimeoutError(f"No concurrency slot became free within {timeout} seconds")
+            self.in_flight += 1
+            return(Slot(self._generation, self.in_flight * 2 >= self.limit))
+
+    def cancel(self, slot:Slot):
+        """ Give back a slot whose call was never sent, without adjusting the limit. """
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+    def release(self, slot:Slot, fault:bool = False, latency:float = None, operation:str = None):
+        """ Give back a slot and adjust the limit for the outcome of its call.
+
+        Args:
+            slot: The slot returned by `acquire`.
+            fault: True if the call failed in a way that suggests the server is overloaded.
+            latency: The seconds the call took. Default is the time since the slot was acquired.
+            operation: The SOAP operation of the call, whose latency is compared to that of earlier calls of the same operation. Default is None, which is tracked like an operation of its own.
+        Returns:
+            A `concurrency` event for the client's observers if the limit changed, otherwise None.
+        """
+        if latency is None:
+            latency = time.perf_counter() - slot.started
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+            previous = self.limit
+            baseline = self.baselines.get(operation)
+            reason = None
+            if fault:
+                reason = 'fault'
+            elif baseline is not None and latency > baseline * self.latency_tolerance:
+                reason = 'latency'
+
+            if not fault:
+                # every reply moves the baseline, so a lasting slowdown becomes the new normal instead of holding the limit down
+                self.baselines[operation] = latency if baseline is None else baseline + self.smoothing * (latency - baseline)
+
+            if reason:
+                if slot.generation != self._generation:
+                    # already cut for the overload this call saw
+                    reason = None
+                else:
+                    self.limit = max(self.minimum, self.limit * self.decrease)
+                    self._generation += 1
+            elif slot.saturated and self.limit < self.maximum:
+                self.limit = min(self.maximum, self.limit + self.increase / self.limit)
+                # only whole steps are reported, as the fractional growth between them does not change what runs
+                reason = 'increase' if int(self.limit) > int(previous) else None
+                if reason:
+                    self._condition.notify_all()
+
+            if reason is None:
+                return(None)
+            self.decisions[reason] += 1
+            return({
+                'event': 'concurrency',
+                'timestamp': instrumentation.utcnow(),
+                'reason': reason,
+                'operation': operation,
+                'limit': int(self.limit),
+                'previous_limit': int(previous),
+                'in_flight': self.in_flight,
+                'latency_seconds': latency,
+                'baseline_seconds': baseline,
+            })
@@ -18,14 +18,22 @@
 # along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
 
 import json
-from .response import SOAPResponse
 
-def error_factory(http_response):
-    """ Return a JNET-related error, while attempting to identify common issues. """
-    try:
-        obj = SOAPResponse(http_response, allow_failure = True)
-    except Exception as e:
-        obj = None
+def error_factory(http_response, soap_response = ...):
+    """ Return a JNET-related error, while attempting to identify common issues.
+
+    The error is classified from the SOAP Fault fields alone (see `SOAPResponse.fault`), so the response is
+    only converted to `data` if the error's data or message is used.
+
+    Args:
+        http_response: The failed http response.
+        soap_response: The response parsed with `SOAPResponse.from_failure`, which is None if it is not xml. Default is to parse it here.
+    """
+    if soap_response is ...:
+        # imported here so that `jnet.exceptions` can be used without loading lxml
+        from .response import SOAPResponse
+        soap_response = SOAPResponse.from_failure(http_response)
+    obj = soap_response
 
     if not obj:
         return(JNETTransportError(http_response))
@@ -33,55 +41,112 @@ def error_factory(http_response):
     # requests that succeed in getting through to JNet will have XML error details in the response text.
     # some of these are knowable, so we'll parse them
     if http_response.status_code == 500:
-        if 'Fault' in obj.data and obj.data['Fault']['faultstring'] == 'Authentication_Error':
+        fault = obj.fault
+        faultstring = fault['faultstring'] if fault else None
+        if faultstring == 'Authentication_Error':
             raise AuthenticationError(http_response = http_response, soap_response = obj)
-        elif 'Fault' in obj.data and obj.data['Fault']['faultstring'] == 'Validation_Error':
+        elif faultstring == 'Validation_Error':
             raise AuthenticationUseridError(http_response = http_response, soap_response = obj)
 
     # Some other error, just provide as much as we can
     raise JNETTransportError(http_response = http_response, soap_response = obj)
 
+def _data_details(data):
+    """ The error data as json, to append to a message. """
+    if not data:
+        return('')
+    return("\n\nError Data:\n" + json.dumps(data, sort_keys = True, indent = 4))
+
+def _restore(cls, args):
+    """ Recreate a pickled error without calling its constructor, whose arguments differ by class. """
+    error = cls.__new__(cls)
+    error.args = args
+    return(error)
+
+def _fault_detail(soap_response):
+    """ The ': ErrorModuleText' of a SOAP Fault for an error message, or '' if there is none. """
+    fault = soap_response.fault if soap_response else None
+    if fault and fault['detail']:
+        return(': ' + fault['detail'])
+    return('')
+
 
 class JNETError(Exception):
     """ THe JNET Error base class, for all JNET-related errors.
 
     All jnet errors have the following accessors, though not all will be available in all error contexts:
 
+    The `details` of the error, like the response data, are appended to the message when it is first used
+    (i.e. when the error is printed). Until then `args` holds the message without them, as converting and
+    serializing the data for every failed request is costly when JNET is down and every request fails.
+
     Attributes:
         message: The error message
         http_response: The raw repsonse from an http request via the `requests` module
         soap_response: The SOAPResponse object associated with the error
-        data: Freeform data associated with the error
+        data: Freeform data associated with the error, which defaults to the data of the SOAPResponse.
     """
 
     def __init__(self,  message = None, data = None, http_response = None, soap_response = None,):
         self.http_response = http_response
         self.response = soap_response
-        if data:
-            self.data = data
-        elif soap_response:
-            self.data = soap_response.data
-        else:
-            self.data = None
+        self._data = data if data else None
+        self._default_message = not message
+        self._rendered = False
 
         if not message:
-            if soap_response:
-                message = f"An Exception occurred with a JNET response!\n\nResponse Data:\n" + json.dumps(soap_response.data)
-            elif data:
-                message = f"A JNET Exception occurred!\n\nData:\n" + json.dumps(data)
-            else:
-                message = "A generic JNET error occurred (but no more information was provided)"
-
+            message = self.default_message()
         super().__init__(message)
 
+    def default_message(self):
+        """ The message for an error that was not given one. """
+        if self.response:
+            return("An Exception occurred with a JNET response!")
+        elif self._data:
+            return("A JNET Exception occurred!")
+        return("A generic JNET error occurred (but no more information was provided)")
+
+    def details(self):
+        """ The text appended to the message when it is first used, which by default is the response or the data of an error that was not given a message. """
+        if not self._default_message:
+            return('')
+        if self.response:
+            return("\n\nResponse Data:\n" + json.dumps(self.response.data))
+        elif self._data:
+            return("\n\nData:\n" + json.dumps(self._data))
+        return('')
+
+    @property
+    def data(self):
+        if self._data is None and self.response:
+            return(self.response.data)
+        return(self._data)
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
     @property
     def message(self):
+        if not self._rendered:
+            self._rendered = True
+            self.args = (self.args[0] + self.details(),)
         return(self.args[0])
 
     @message.setter
     def message(self, value):
+        self._rendered = True
         self.args = (value,)
 
+    def __reduce__(self):
+        return((_restore, (type(self), self.args), self.__dict__))
+
+    def __str__(self):
+        return(self.message)
+
+    def __repr__(self):
+        return(f"{type(self).__name__}({self.message!r})")
+
 
 class JNETTransportError(JNETError):
     """ The general JNET Error class for transport-related errors.
@@ -94,11 +159,12 @@ class JNETTransportError(JNETError):
         if not message:
             message = "Request failed!"
 
-        # the default is to render the http_request or soap_response into a nice, pretty message
-        message += f"\n\tStatus Code:{http_response.status_code}\n\tReason: {http_response.reason}\n\n--- TEXT ---\n{http_response.text}"
-
         super().__init__(http_response = http_response, message = message, soap_response = soap_response, data = data)
 
+    def details(self):
+        """ The http response, rendered into a nice, pretty message. """
+        return(f"\n\tStatus Code:{self.http_response.status_code}\n\tReason: {self.http_response.reason}\n\n--- TEXT ---\n{self.http_response.text}")
+
 class NotFound(JNETError):
     """ This exception happens when a request is made to JNET and no matching record is found.
 
@@ -106,11 +172,11 @@ class NotFound(JNETError):
     """
 
     def __init__(self, message = "Result not Found!", data=None, **kwargs):
-
-        if data:
-            message += "\n\nError Data:\n" + json.dumps(data, sort_keys = True, indent = 4)
         super().__init__(message = message, data=data, **kwargs)
 
+    def details(self):
+        return(_data_details(self._data))
+
 class NoResults(JNETError):
     """ This exception happens when the user makes a request that has no results.
 
@@ -118,12 +184,11 @@ class NoResults(JNETError):
     """
 
     def __init__(self, message = "JNET returned no results!", data=None, **kwargs):
-
-        if data:
-            message += "\n\nError Data:\n" + json.dumps(data, sort_keys = True, indent = 4)
-
         super().__init__(message = message, data=data, **kwargs)
 
+    def details(self):
+        return(_data_details(self._data))
+
 class InvalidRequest(JNETError):
     """ This exception happens when a request is made to JNET and the docket number is invalid.
 
@@ -131,22 +196,35 @@ class InvalidRequest(JNETError):
     """
 
     def __init__(self, message = "Invalid Request!", data=None, **kwargs):
-
-        if data:
-            message += "\n\nError Data:\n" + json.dumps(data, sort_keys = True, indent = 4)
         super().__init__(message = message, data=data, **kwargs)
 
+    def details(self):
+        return(_data_details(self._data))
+
+class InvalidIdentifier(InvalidRequest):
+    """ This exception happens when a docket number or OTN is rejected before it is sent to JNET, because it cannot be valid.
+
+    See `jnet.validation`.
+
+    Attributes:
+        value: The docket number or OTN as it was given.
+        kind: 'docket number' or 'OTN'.
+        reason: Why it is invalid.
+    """
+
+    def __init__(self, message = None, value = None, kind = 'docket number', reason = None, **kwargs):
+        self.value = value
+        self.kind = kind
+        self.reason = reason
+        if not message:
+            message = f"Invalid {kind} {value!r}: {reason}"
+        super().__init__(message = message, **kwargs)
+
 class AuthenticationError(JNETTransportError):
 
     def __init__(self, http_response, soap_response = None, **kwargs):
 
-        if soap_response:
-            try:
-                error_code = ': ' + soap_response.data['Fault']['detail']['JNETFaultDetail']['ErrorModuleText']
-            except KeyError as ke:
-                error_code = ''
-        else:
-            error_code = ''
+        error_code = _fault_detail(soap_response)
 
         message = "Received Authentication_Error from JNET server, which usually is an issue with your client certificate or key" + error_code
         super().__init__(http_response=http_response, soap_response=soap_response, message = message, **kwargs)
@@ -155,13 +233,6 @@ class AuthenticationUseridError(JNETError):
 
     def __init__(self, message = None, http_response = None, soap_response = None, **kwargs):
 
-        if soap_response:
-            try:
-                error_code = ': ' + soap_response.data['Fault']['detail']['JNETFaultDetail']['ErrorModuleText']
-            except KeyError as ke:
-                error_code = ''
-        else:
-            error_code = ''
         if not message:
             message = "Received Validation_Error from JNET server, which usually is an issue with the user-id in the RequestMetadata. Verify that you are supplying the correct value for your organization and client certificate"
         super().__init__(http_response=http_response, soap_response=soap_response, message = message, **kwargs)
@@ -172,13 +243,28 @@ class QueuedError(JNETError):
 
     def __init__(self, message = None, http_response = None, soap_response = None, **kwargs):
 
-        if soap_response:
-            try:
-                error_code = ': ' + soap_response.data['Fault']['detail']['JNETFaultDetail']['ErrorModuleText']
-            except KeyError as ke:
-                error_code = ''
-        else:
-            error_code = ''
         if not message:
             message = "Received Validation_Error from JNET server, which usually is an issue with the user-id in the RequestMetadata. Verify that you are supplying the correct value for your organization and client certificate"
         super().__init__(http_response=http_response, soap_response=soap_response, message = message, **kwargs)
+
+
+class CircuitOpenError(JNETError):
+    """ This exception happens when a request is not sent because the circuit breaker for its endpoint is open, as recent requests to it failed.
+
+    See `jnet.circuit`.
+
+    Attributes:
+        endpoint: The endpoint that the request was for.
+        retry_after: The seconds until the circuit lets a probe request through.
+    """
+
+    def __init__(self, message = None, endpoint = None, retry_after = None, **kwargs):
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+        if not message:
+            message = f"Not sending the request, as recent requests to {endpoint} failed."
+            if retry_after:
+                message += f" A new request will be tried in {retry_after:.1f} seconds."
+            else:
+                message += " A probe request is checking whether it has recovered."
+        super().__init__(message = message, **kwargs)
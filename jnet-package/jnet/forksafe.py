@@ -0,0 +1,90 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+
+""" A mixin for objects that hold locks, connections or threads that must not cross into another process.
+
+A lock held by another thread at the time of a fork is never released in the child, and connections
+and threads either do not survive a fork or belong to the parent. Neither can be pickled. A
+`ForkSafe` class declares that state, and the mixin replaces it in a forked child and leaves it out of
+the pickled state:
+
+```python
+class Limiter(ForkSafe):
+    _fork_locks = {'_condition': threading.Condition}
+    _fork_reset = {'in_flight': int}
+
+    def __init__(self):
+        self.in_flight = 0
+        self._init_fork_safe()
+```
+
+Classes with more to do, i.e. to keep part of a connection pool, extend `after_fork`.
+"""
+
+import os
+import weakref
+import threading
+
+# every fork safe object in the process, so their state can be replaced in a forked child
+_instances = weakref.WeakSet()
+
+def _reset_after_fork():
+    for instance in list(_instances):
+        instance.after_fork()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child = _reset_after_fork)
+
+
+class ForkSafe():
+    """ A mixin that replaces the locks and per-process state of an object in a forked child, and leaves them out when it is pickled.
+
+    Class Attributes:
+        _fork_locks: The locks, as a dict of the attribute name to a factory, i.e. `threading.Lock`. They are created by `_init_fork_safe`, replaced in a forked child, and recreated when unpickled. Default is a `_lock`.
+        _fork_reset: The state that belongs to the process, like connections or counts of calls in flight, as a dict of the attribute name to a factory for its initial value. It is reset in a forked child and in the pickled state.
+    """
+
+    _fork_locks = {'_lock': threading.Lock}
+    _fork_reset = {}
+
+    def _init_fork_safe(self):
+        """ Create the locks and track the object, so that it is reset in forked children. Call it from `__init__`. """
+        for name, factory in self._fork_locks.items():
+            setattr(self, name, factory())
+        _instances.add(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in self._fork_locks:
+            state.pop(name, None)
+        for name, factory in self._fork_reset.items():
+            state[name] = factory()
+        return(state)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._init_fork_safe()
+
+    def after_fork(self):
+        """ Called in a forked child to replace the locks and reset the state inherited from the parent. """
+        for name, factory in self._fork_locks.items():
+            setattr(self, name, factory())
+        for name, factory in self._fork_reset.items():
+            setattr(self, name, factory())
@@ -0,0 +1,290 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Hedged requests, to cut the tail latency of read-only SOAP calls.
+
+Most status checks come back quickly, but an occasional one takes many times the median, and in
+`fetch_docket_data` one slow poll holds up the docket behind it. With a `HedgingPolicy` on the client, a
+read-only call that has had no reply by a high percentile of the latencies observed for its operation is
+sent a second time, and whichever reply arrives first is used. The slower request is left to finish in
+the background and its reply is discarded.
+
+Only operations that can safely be sent twice are hedged. `RequestCourtCaseEventInfo` (the status
+check of `check_requests`) only reads, and is hedged by default. `ReceiveCourtCaseEvent`
+(`retrieve_file_data`) returns the same file when it is repeated, but marks the file as retrieved, so it is
+only hedged if it is listed in `operations`. `RequestCourtCaseEvent` creates a new request at AOPC and
+is never hedged.
+
+A budget bounds the extra load: every call earns a fraction of a hedge, and a hedge is only sent when a
+whole one has been earned, so hedges never exceed that fraction of the calls (plus a small burst). A
+hedge also takes a slot of the client's `jnet.concurrency.AIMDLimiter`, and is not sent if none is free.
+
+The original request and the hedge run on a thread pool, so that the first reply can be returned while
+the other request is still waiting. The hedge delay is counted from when the original request is sent,
+and when every worker of the pool is busy, the call is sent from the calling thread and not hedged, so
+that waiting for a worker never causes a hedge.
+
+```python
+jnetclient = jnet.CCE(hedging = jnet.hedging.HedgingPolicy(percentile = 95, budget = 0.05))
+```
+"""
+
+import time
+import threading
+import collections
+import concurrent.futures
+
+from . import instrumentation
+from . import concurrency
+from .forksafe import ForkSafe
+
+# operations that change state at JNET, which are never sent twice
+UNSAFE_OPERATIONS = frozenset(['RequestCourtCaseEvent'])
+
+
+class HedgingPolicy(ForkSafe):
+    """ Decides when to send a second copy of a slow read-only request, and sends it.
+
+    The hedge delay for an operation is the `percentile` of the latencies of its recent calls, so it adapts to
+    how the service is performing. No hedges are sent until `min_samples` calls of the operation have completed.
+
+    A policy may be shared by several clients. Hedged calls run on its own thread pool, which is started
+    on first use and can be shut down with `close`.
+
+    Constructor Args:
+        operations: The operations that may be hedged. Default is ('RequestCourtCaseEventInfo',). Add 'ReceiveCourtCaseEvent' to hedge file retrievals as well.
+        percentile: The latency percentile (0-100) after which a hedge is sent. Default is 95.
+        budget: The most hedges to send per call, i.e. 0.05 for at most 5% more requests. Default is 0.05.
+        burst: The most hedges that can be saved up while calls are fast, to spend on a run of slow ones. Default is 10.
+        min_samples: The number of completed calls of an operation before it is hedged. Default is 20.
+        window: The number of recent latencies per operation that the percentile is taken from. Default is 500.
+        min_delay: The shortest hedge delay in seconds, so that a very fast service is not hedged on noise. Default is 0.005.
+        max_workers: The size of the thread pool that hedged calls run on; each hedged call needs two threads until its first reply. Calls beyond it are sent from the calling thread and not hedged. Default is 64.
+
+    Attributes:
+        calls: The number of calls of hedged operations.
+        hedges: The number of hedges sent.
+        hedge_wins: The number of hedges that replied before the original request.
+    """
+
+    # the threads of the pool do not survive a fork
+    _fork_reset = {'_executor': lambda: None, '_busy': int}
+
+    def __init__(
+        self,
+        operations = ('RequestCourtCaseEventInfo',),
+        percentile:float = 95,
+        budget:float = 0.05,
+        burst:float = 10,
+        min_samples:int = 20,
+        window:int = 500,
+        min_delay:float = 0.005,
+        max_workers:int = 64,
+    ):
+        unsafe = UNSAFE_OPERATIONS.intersection(operations)
+        if unsafe:
+            raise ValueError(f"{', '.join(sorted(unsafe))} cannot be hedged, as sending it twice would create a second request")
+        if not 0 < percentile < 100:
+            raise ValueError(f"percentile must be between 0 and 100, not {percentile}")
+        self.operations = frozenset(operations)
+        self.percentile = percentile
+        self.budget = budget
+        self.burst = burst
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        self.max_workers = max_workers
+
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen = self.window))
+        # operation -> (number of samples when computed, delay), as sorting the window for every call is wasted work
+        self._delays = {}
+        self._recorded = collections.Counter()
+        self._tokens = 0.0
+        self._executor = None
+        # the calls running on the pool, so that none is queued behind the others
+        self._busy = 0
+        self._init_fork_safe()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_latencies'] = {operation: list(latencies) for operation, latencies in self._latencies.items()}
+        return(state)
+
+    def __setstate__(self, state):
+        latencies = state.pop('_latencies')
+        super().__setstate__(state)
+        self._latencies = collections.defaultdict(lambda: collections.deque(maxlen = self.window))
+        for operation, values in latencies.items():
+            self._latencies[operation].extend(values)
+
+    @property
+    def executor(self):
+        """ The thread pool that hedged calls run on, started on first use. """
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = concurrent.futures.ThreadPoolExecutor(max_workers = self.max_workers, thread_name_prefix = 'jnet-hedge')
+        return(self._executor)
+
+    def record(self, operation:str, seconds:float):
+        """ Add the latency of a completed call to the operation's window. """
+        with self._lock:
+            self._latencies[operation].append(seconds)
+            self._recorded[operation] += 1
+
+    def delay(self, operation:str):
+        """ The seconds to wait for a reply before hedging a call of `operation`, or None if it is not hedged (yet). """
+        if operation not in self.operations:
+            return(None)
+        with self._lock:
+            recorded = self._recorded[operation]
+            if recorded < self.min_samples:
+                return(None)
+            computed, delay = self._delays.get(operation, (0, None))
+            # the percentile moves slowly, so it is only taken again after a few more samples
+            if delay is None or recorded - computed >= 10:
+                delay = max(instrumentation.percentile(sorted(self._latencies[operation]), self.percentile), self.min_delay)
+                self._delays[operation] = (recorded, delay)
+            return(delay)
+
+    def _earn(self):
+        with self._lock:
+            self.calls += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+
+    def _spend(self):
+        """ Take a hedge from the budget. Returns False if none is left. """
+        with self._lock:
+            # allow for the rounding of the fractions added up in `_earn`
+            if self._tokens < 1 - 1e-9:
+                return(False)
+            self._tokens -= 1
+            self.hedges += 1
+            return(True)
+
+    def _refund(self):
+        """ Give back a hedge taken with `_spend` that was not sent. """
+        with self._lock:
+            self._tokens += 1
+            self.hedges -= 1
+
+    def _timed_send(self, transport, operation:str, url:str, body:bytes, headers:dict, verify):
+        started = time.perf_counter()
+        response = transport.send(url, body, headers, verify = verify)
+        # every reply is a sample of the service's latency, including those that lose the race
+        self.record(operation, time.perf_counter() - started)
+        return(response)
+
+    def _submit(self, *args):
+        """ Start `_pooled_send` on the pool if a worker is free. Returns the future, or None if every worker is busy. """
+        with self._lock:
+            if self._busy >= self.max_workers:
+                return(None)
+            self._busy += 1
+        try:
+            return(self.executor.submit(self._pooled_send, *args))
+        except BaseException:
+            with self._lock:
+                self._busy -= 1
+            raise
+
+    def _pooled_send(self, sending, limiter, slot, notify, transport, operation:str, url:str, body:bytes, headers:dict, verify):
+        """ A request on the pool, which sets the `sending` event when it starts and releases its limiter `slot` (if any) when it is done. """
+        response = None
+        try:
+            if sending is not None:
+                sending.set()
+            response = self._timed_send(transport, operation, url, body, headers, verify)
+            return(response)
+        finally:
+            with self._lock:
+                self._busy -= 1
+            if slot is not None:
+                event = limiter.release(slot, fault = concurrency.is_overload(response), operation = operation)
+                if event and notify is not None:
+                    notify(event)
+
+    def send(self, transport, operation:str, url:str, body:bytes, headers:dict, verify = True, limiter = None, notify = None):
+        """ Send a request with `transport`, and hedge it if no reply arrives within the operation's hedge delay.
+
+        Args:
+            transport: The `jnet.transport.Transport` to send the request with.
+            operation: The SOAP operation of the request, i.e. 'RequestCourtCaseEventInfo'.
+            url, body, headers, verify: As with `Transport.send`.
+            limiter: The `jnet.concurrency.AIMDLimiter` that the original request holds a slot of, if any. A hedge is only sent if it can take a slot as well.
+            notify: Called with the `concurrency` event if the hedge's reply changes the limit. Default is None.
+        Returns:
+            A tuple of the first response and the number of hedges sent (0 or 1).
+        Raises:
+            The exception of the original request, if it failed before a reply arrived from either request.
+        """
+        if operation not in self.operations:
+            return(transport.send(url, body, headers, verify = verify), 0)
+
+        self._earn()
+        delay = self.delay(operation)
+        if delay is None:
+            return(self._timed_send(transport, operation, url, body, headers, verify), 0)
+
+        sending = threading.Event()
+        primary = self._submit(sending, None, None, None, transport, operation, url, body, headers, verify)
+        if primary is None:
+            # every worker is busy, and waiting for one would count towards the delay
+            return(self._timed_send(transport, operation, url, body, headers, verify), 0)
+        sending.wait()
+        done, pending = concurrent.futures.wait([primary], timeout = delay)
+        if done or not self._spend():
+            return(primary.result(), 0)
+
+        slot = None
+        if limiter is not None:
+            try:
+                slot = limiter.acquire(timeout = 0)
+            except TimeoutError:
+                # the limit is in use, and the hedge would go beyond it
+                self._refund()
+                return(primary.result(), 0)
+        hedge = self._submit(None, limiter, slot, notify, transport, operation, url, body, headers, verify)
+        if hedge is None:
+            if slot is not None:
+                limiter.cancel(slot)
+            self._refund()
+            return(primary.result(), 0)
+        pending = {primary, hedge}
+        while pending:
+            done, pending = concurrent.futures.wait(pending, return_when = concurrent.futures.FIRST_COMPLETED)
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    if future is hedge:
+                        with self._lock:
+                            self.hedge_wins += 1
+                    return(future.result(), 1)
+        # neither request got a reply
+        return(primary.result(), 1)
+
+    def close(self):
+        """ Shut down the thread pool, without waiting for requests that lost their race. """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait = False)
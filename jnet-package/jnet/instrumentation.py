@@ -0,0 +1,265 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Timing and size instrumentation for requests to JNET.
+
+Observers are plain callables that are registered on a client with `Client.add_observer` and are called
+with one event dict per SOAP call. The `event` key identifies the kind of event:
+
+`request` - emitted by `Client.make_request` for every SOAP call:
+    operation: The request element in the SOAP body, i.e. 'RequestCourtCaseEvent', 'RequestCourtCaseEventInfo' or 'ReceiveCourtCaseEvent'.
+    tracking_id: The UserDefinedTrackingID in the request, if any.
+    file_id: The FileTrackingID in the request, if any.
+    url: The endpoint url.
+    status: The http status code, or None if no response was received.
+    request_bytes: The size of the signed request body.
+    response_bytes: The size of the response body.
+    build_seconds: Time spent building the envelope in zeep, not including signing.
+    sign_seconds: Time spent signing the envelope.
+    network_seconds: Time from sending the request until the full response was received.
+    parse_seconds: Time spent parsing the response into a `SOAPResponse` and its data.
+    total_seconds: The sum of the phases above.
+    hedges: The number of duplicate requests sent by a `jnet.hedging.HedgingPolicy` because the reply was slow (0 or 1).
+    error: The name of the exception raised, or None.
+
+`status` - emitted by `CCE.check_requests` for every status listing received:
+    tracking_id: The tracking id the listing was filtered by, if any.
+    pending_only: True if the listing only includes requests that have not been retrieved.
+    complete: True if the listing was not filtered (by tracking id, docket number, OTN or tracking id prefix) or cut off at the record limit.
+    records: The number of records listed.
+    completed, queued, not_found, invalid: The number of records in each state.
+
+`retrieve` - emitted by `CCE.retrieve_file_data` for every file retrieved:
+    file_id: The FileTrackingID.
+    result: 'completed', 'queued', 'not_found', 'invalid', 'no_record' or 'failure'.
+
+`concurrency` - emitted by `Client.make_request` when the client's `jnet.concurrency.AIMDLimiter` changes its limit:
+    reason: 'increase' after healthy replies, or 'fault' or 'latency' when the limit was cut.
+    operation: The SOAP operation of the reply that caused the change.
+    limit, previous_limit: The number of concurrent calls allowed after and before the change.
+    in_flight: The number of calls still in flight.
+    latency_seconds: The latency of the reply that caused the change.
+    baseline_seconds: The smoothed latency of the operation it was compared to.
+
+`circuit` - emitted by `Client.make_request` when the circuit breaker for an endpoint changes state - see `jnet.circuit`:
+    endpoint: The endpoint of the circuit.
+    state, previous_state: 'closed', 'open' or 'half_open', after and before the change.
+    consecutive_failures: The number of failures in a row at the time.
+    error_rate: The failure rate over the recent calls, or None if there were too few.
+
+`docket` - emitted by `CCE.fetch_docket_data` for every docket:
+    docket_number, tracking_id: The docket and its request.
+    polls: The number of status checks made before the docket was ready.
+    turnaround_seconds: Time from the request until JNET listed the docket as ready, i.e. the AOPC turnaround.
+    retrieve_seconds: Time spent retrieving the data once it was ready.
+    total_seconds: The total time for the docket.
+    records: The number of records retrieved.
+    error: The name of the exception raised, or None.
+
+Every event also has a `timestamp` in ISO8601 format (UTC).
+
+```python
+aggregator = jnet.instrumentation.TimingAggregator()
+jnetclient = jnet.CCE(observers = [aggregator, jnet.instrumentation.JSONLinesLogger('requests.jsonl')])
+...
+print(aggregator.report())
+```
+"""
+
+import time
+import datetime
+import threading
+import contextlib
+import contextvars
+import collections
+
+# the timer for the SOAP call currently being built in this thread/context
+_current_timer = contextvars.ContextVar('jnet_request_timer', default = None)
+
+def utcnow():
+    """ The current time as an ISO8601 string, for event timestamps. """
+    return(datetime.datetime.now(datetime.timezone.utc).isoformat())
+
+
+class RequestTimer():
+    """ Accumulates the time spent in each phase of a single SOAP call.
+
+    `Client.create_message` starts a timer for the call, `JNetSignature.apply` adds its signing time to
+    it, and `Client.make_request` takes it back to add the network and parse times and report the event.
+
+    Attributes:
+        durations: dict of phase name to seconds.
+        intervals: list of (phase name, start, end) in nanoseconds since the epoch, for tracing.
+        started: When the call started, in nanoseconds since the epoch.
+        hedges: The number of hedged duplicates sent for the call.
+    """
+
+    def __init__(self):
+        self.durations = {}
+        self.intervals = []
+        self.started = time.time_ns()
+        self.hedges = 0
+
+    @contextlib.contextmanager
+    def phase(self, name:str):
+        """ Context manager that adds the time spent inside it to the `name` phase. """
+        started = time.perf_counter()
+        started_ns = time.time_ns()
+        try:
+            yield(self)
+        finally:
+            self.durations[name] = self.durations.get(name, 0) + time.perf_counter() - started
+            self.intervals.append((name, started_ns, time.time_ns()))
+
+    def get(self, name:str):
+        return(self.durations.get(name, 0))
+
+
+def start_timer():
+    """ Start timing a new SOAP call in the current context and return its `RequestTimer`. """
+    timer = RequestTimer()
+    _current_timer.set(timer)
+    return(timer)
+
+def current_timer():
+    """ The `RequestTimer` for the SOAP call being built in the current context, or None. """
+    return(_current_timer.get())
+
+def take_timer():
+    """ Remove and return the current `RequestTimer`, or a new one if no call was being timed. """
+    timer = _current_timer.get()
+    _current_timer.set(None)
+    return(timer if timer else RequestTimer())
+
+def phase(name:str):
+    """ Time the `name` phase of the current SOAP call, if there is one. """
+    timer = _current_timer.get()
+    if timer is None:
+        return(contextlib.nullcontext())
+    return(timer.phase(name))
+
+
+class JSONLinesLogger():
+    """ An observer that writes every event as a line of json.
+
+    Constructor Args:
+        path: The log file. Events are appended if it already exists. A `.gz` or `.zst` suffix compresses the log.
+        flush_every: The number of events to buffer before writing. Default is 1, so the log can be followed while a batch runs.
+        events: If provided, only log events of these kinds, i.e. `['request']`.
+    """
+
+    def __init__(self, path:str, flush_every:int = 1, events = None):
+        from . import output
+        self.path = path
+        self.events = set(events) if events else None
+        self._writer = output.NDJSONWriter(path, flush_every = flush_every, append = True)
+        self._lock = threading.Lock()
+
+    def __call__(self, event:dict):
+        if self.events and event['event'] not in self.events:
+            return
+        with self._lock:
+            self._writer.write(event)
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+
+
+def percentile(values, pct:float):
+    """ The `pct` percentile (0-100) of a sorted list of values, interpolating between the closest ranks. """
+    if not values:
+        return(None)
+    rank = (len(values) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return(values[low] + (values[high] - values[low]) * (rank - low))
+
+
+class TimingAggregator():
+    """ An observer that keeps the numeric fields of recent events in memory and reports percentiles.
+
+    Values are grouped by operation for `request` events and by the event kind for all others, i.e. 'docket'.
+    Only the last `window` values of each field are kept, so that a long-running worker uses a fixed amount
+    of memory; the percentiles are of those values, while `count` and `errors` cover every event.
+
+    Constructor Args:
+        percentiles: The percentiles to report. Default is (50, 90, 99).
+        window: The number of recent values of each field to keep. Default is 10000.
+    """
+
+    def __init__(self, percentiles = (50, 90, 99), window:int = 10000):
+        self.percentiles = percentiles
+        self.window = window
+        self.samples = collections.defaultdict(lambda: collections.defaultdict(lambda: collections.deque(maxlen = window)))
+        self.counts = collections.Counter()
+        self.errors = collections.Counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def group(event:dict):
+        if event['event'] == 'request':
+            return(event.get('operation') or 'unknown')
+        return(event['event'])
+
+    def __call__(self, event:dict):
+        group = self.group(event)
+        with self._lock:
+            self.counts[group] += 1
+            if event.get('error'):
+                self.errors[group] += 1
+            for field, value in event.items():
+                if type(value) in (int, float) and field != 'status':
+                    self.samples[group][field].append(value)
+
+    def reset(self):
+        with self._lock:
+            self.samples.clear()
+            self.counts.clear()
+            self.errors.clear()
+
+    def summary(self):
+        """ Returns percentiles for every numeric field.
+
+        Returns:
+            dict of group (operation or event kind) to a dict with `count`, `errors`, and, for each numeric field, a dict of `p50`, `p90`, etc.
+        """
+        with self._lock:
+            result = {}
+            for group, fields in self.samples.items():
+                result[group] = {'count': self.counts[group], 'errors': self.errors[group]}
+                for field, values in fields.items():
+                    values = sorted(values)
+                    result[group][field] = {f"p{pct}": percentile(values, pct) for pct in self.percentiles}
+            return(result)
+
+    def report(self, fields = ('build_seconds', 'sign_seconds', 'network_seconds', 'parse_seconds', 'total_seconds', 'response_bytes', 'turnaround_seconds')):
+        """ Returns a plain text table of the percentiles for each group. """
+        lines = []
+        for group, stats in sorted(self.summary().items()):
+            lines.append(f"{group}: {stats['count']} calls, {stats['errors']} errors")
+            for field in fields:
+                if field not in stats:
+                    continue
+                if field.endswith('_seconds'):
+                    values = ' '.join(f"{name}={value * 1000:.1f}ms" for name, value in stats[field].items())
+                else:
+                    values = ' '.join(f"{name}={value:.0f}" for name, value in stats[field].items())
+                lines.append(f"    {field:<20} {values}")
+        return("\n".join(lines))
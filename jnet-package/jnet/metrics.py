@@ -0,0 +1,357 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Process-local counters and histograms for long-running jnet workers, in the Prometheus text format.
+
+There is no dependency on a metrics service or client library: the values live in memory, and can be
+read from a small local http endpoint or written to a file periodically (i.e. for the node exporter's
+textfile collector).
+
+```python
+metrics = jnet.metrics.JNETMetrics()
+jnetclient = jnet.CCE(observers = [metrics])
+metrics.registry.serve(9464)                    # http://127.0.0.1:9464/metrics
+metrics.registry.write_every('/var/lib/node_exporter/jnet.prom', 15)
+```
+"""
+
+import os
+import time
+import bisect
+import threading
+import http.server
+
+# latency buckets in seconds for SOAP calls
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# buckets in seconds for the AOPC turnaround of a docket request
+TURNAROUND_BUCKETS = (1, 5, 10, 20, 30, 60, 120, 300, 600, 1800)
+# buckets for the number of status checks before a docket is ready
+POLL_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100)
+# the value of the circuit state gauge for each state of a `jnet.circuit.CircuitBreaker`
+CIRCUIT_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+def _escape(value):
+    return(str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"'))
+
+def _format_labels(names, values, extra = ()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)] + [f'{name}="{value}"' for name, value in extra]
+    return('{' + ','.join(pairs) + '}' if pairs else '')
+
+def _format_value(value):
+    if value == float('inf'):
+        return('+Inf')
+    if type(value) is float and value.is_integer():
+        return(str(int(value)))
+    return(repr(value))
+
+
+class Metric():
+    """ The base class for a metric family: a name, help text, and a value for each combination of label values. """
+
+    kind = None
+
+    def __init__(self, name:str, documentation:str, labels = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels:dict):
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name} takes the labels {self.labels}, not {tuple(labels)}")
+        return(tuple(str(labels[name]) for name in self.labels))
+
+    def samples(self):
+        """ Returns a list of (suffix, label values, extra labels, value) for the text format. """
+        raise NotImplementedError("samples must be implemented in the subclass")
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, values, extra, value in self.samples():
+            lines.append(f"{self.name}{suffix}{_format_labels(self.labels, values, extra)} {_format_value(value)}")
+        return("\n".join(lines))
+
+
+class Counter(Metric):
+    """ A value that only goes up, i.e. the number of requests. """
+
+    kind = 'counter'
+
+    def inc(self, amount:float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return(self._values.get(self._key(labels), 0))
+
+    def samples(self):
+        with self._lock:
+            return([('', key, (), value) for key, value in sorted(self._values.items())])
+
+
+class Gauge(Metric):
+    """ A value that can go up and down, i.e. the number of pending requests. """
+
+    kind = 'gauge'
+
+    def set(self, value:float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount:float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount:float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels):
+        return(self._values.get(self._key(labels), 0))
+
+    def samples(self):
+        with self._lock:
+            return([('', key, (), value) for key, value in sorted(self._values.items())])
+
+
+class Histogram(Metric):
+    """ Counts observations in cumulative buckets, along with their sum and count. """
+
+    kind = 'histogram'
+
+    def __init__(self, name:str, documentation:str, labels = (), buckets = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value:float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # per-bucket counts (plus +Inf), sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0]
+            state[0][index] += 1
+            state[1] += value
+
+    def get(self, **labels):
+        """ Returns a dict with the `count` and `sum` of the observations. """
+        state = self._values.get(self._key(labels))
+        if state is None:
+            return({'count': 0, 'sum': 0})
+        return({'count': sum(state[0]), 'sum': state[1]})
+
+    def samples(self):
+        result = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += count
+                    result.append(('_bucket', key, (('le', _format_value(float(bound))),), cumulative))
+                result.append(('_sum', key, (), total))
+                result.append(('_count', key, (), cumulative))
+        return(result)
+
+
+class MetricsRegistry():
+    """ A collection of metrics that can be rendered together in the Prometheus text exposition format. """
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name in self._metrics:
+                metric = self._metrics[name]
+                if type(metric) is not cls:
+                    raise ValueError(f"{name} is already registered as a {metric.kind}")
+                return(metric)
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return(metric)
+
+    def counter(self, name:str, documentation:str, labels = ()):
+        """ Returns the counter named `name`, creating it if necessary. """
+        return(self._register(Counter, name, documentation, labels))
+
+    def gauge(self, name:str, documentation:str, labels = ()):
+        """ Returns the gauge named `name`, creating it if necessary. """
+        return(self._register(Gauge, name, documentation, labels))
+
+    def histogram(self, name:str, documentation:str, labels = (), buckets = LATENCY_BUCKETS):
+        """ Returns the histogram named `name`, creating it if necessary. """
+        return(self._register(Histogram, name, documentation, labels, buckets = buckets))
+
+    def get(self, name:str):
+        return(self._metrics[name])
+
+    def render(self):
+        """ Returns all metrics in the Prometheus text exposition format. """
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return("\n".join(metric.render() for metric in metrics) + "\n")
+
+    def write(self, path:str):
+        """ Write the metrics to a file. The file is replaced atomically so a reader never sees a partial file. """
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, 'w') as fh:
+            fh.write(self.render())
+        os.replace(tmp, path)
+
+    def write_every(self, path:str, interval:float = 15):
+        """ Write the metrics to a file every `interval` seconds in a background thread.
+
+        Returns:
+            A `threading.Event` - set it to stop writing.
+        """
+        stop = threading.Event()
+
+        def loop():
+            while not stop.wait(interval):
+                self.write(path)
+            self.write(path)
+
+        threading.Thread(target = loop, name = 'jnet-metrics-writer', daemon = True).start()
+        return(stop)
+
+    def serve(self, port:int = 9464, host:str = '127.0.0.1'):
+        """ Serve the metrics at `http://{host}:{port}/metrics` from a background thread.
+
+        Args:
+            port: The port to listen on, or 0 for any free port. Default is 9464.
+            host: The interface to listen on. Default is 127.0.0.1, so the metrics are only available locally.
+        Returns:
+            The `http.server.ThreadingHTTPServer` - call `shutdown()` to stop it. The port is `server.server_address[1]`.
+        """
+        registry = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?')[0] not in ('/', '/metrics'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = http.server.ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target = server.serve_forever, name = 'jnet-metrics-server', daemon = True).start()
+        return(server)
+
+
+# the default registry, shared by every `JNETMetrics` that is not given its own
+REGISTRY = MetricsRegistry()
+
+
+class JNETMetrics():
+    """ A client observer (see `jnet.instrumentation`) that records the client's events as metrics.
+
+    Metrics:
+        jnet_requests_total{operation, status}: SOAP calls by operation and http status ('none' if there was no response).
+        jnet_request_errors_total{operation, error}: SOAP calls that raised an exception, by exception name.
+        jnet_request_duration_seconds{operation}: Histogram of the total time for each SOAP call.
+        jnet_request_phase_seconds{operation, phase}: Histogram of the time spent building, signing, on the network, and parsing.
+        jnet_request_bytes_total{operation} / jnet_response_bytes_total{operation}: Bytes sent and received.
+        jnet_hedged_requests_total{operation}: Duplicate requests sent for slow calls by a `jnet.hedging.HedgingPolicy`.
+        jnet_status_records_total{state}: Records seen in status listings, by state (completed, queued, not_found, invalid).
+        jnet_pending_requests: The number of pending requests in the latest status listing that was neither filtered nor cut off at its record limit, i.e. the retrieval backlog.
+        jnet_retrievals_total{result}: Files retrieved, by result (completed, queued, not_found, invalid, no_record, failure).
+        jnet_dockets_total{result}: Dockets fetched with `fetch_docket_data`, by result ('ok' or the exception name).
+        jnet_poll_cycles_total: Status checks made while waiting for dockets.
+        jnet_docket_polls: Histogram of the number of status checks per docket.
+        jnet_docket_turnaround_seconds: Histogram of the time from a docket request until it was ready.
+        jnet_concurrency_limit: The current limit of an `AIMDLimiter` on concurrent SOAP calls.
+        jnet_concurrency_changes_total{reason}: Changes to the concurrency limit, by reason (increase, fault, latency).
+        jnet_circuit_state{endpoint}: The state of the circuit breaker for an endpoint: 0 closed, 1 half-open, 2 open.
+        jnet_circuit_changes_total{endpoint, state}: Changes of circuit breaker state, by the new state.
+        jnet_last_event_timestamp_seconds: When the latest event was recorded, to detect a stalled worker.
+
+    Constructor Args:
+        registry: The `MetricsRegistry` to record to. Default is the shared `jnet.metrics.REGISTRY`.
+    """
+
+    def __init__(self, registry:MetricsRegistry = None):
+        self.registry = registry if registry is not None else REGISTRY
+        r = self.registry
+        self.requests = r.counter('jnet_requests_total', "SOAP calls made to JNET.", ('operation', 'status'))
+        self.errors = r.counter('jnet_request_errors_total', "SOAP calls to JNET that raised an exception.", ('operation', 'error'))
+        self.duration = r.histogram('jnet_request_duration_seconds', "Total time for each SOAP call.", ('operation',))
+        self.phases = r.histogram('jnet_request_phase_seconds', "Time spent in each phase of a SOAP call.", ('operation', 'phase'))
+        self.request_bytes = r.counter('jnet_request_bytes_total', "Bytes sent to JNET.", ('operation',))
+        self.response_bytes = r.counter('jnet_response_bytes_total', "Bytes received from JNET.", ('operation',))
+        self.hedges = r.counter('jnet_hedged_requests_total', "Duplicate requests sent for slow SOAP calls.", ('operation',))
+        self.status_records = r.counter('jnet_status_records_total', "Records seen in status listings, by state.", ('state',))
+        self.pending = r.gauge('jnet_pending_requests', "Pending requests in the latest unfiltered status listing.")
+        self.retrievals = r.counter('jnet_retrievals_total', "Files retrieved, by result.", ('result',))
+        self.dockets = r.counter('jnet_dockets_total', "Dockets fetched, by result.", ('result',))
+        self.poll_cycles = r.counter('jnet_poll_cycles_total', "Status checks made while waiting for dockets.")
+        self.docket_polls = r.histogram('jnet_docket_polls', "Status checks per docket.", buckets = POLL_BUCKETS)
+        self.turnaround = r.histogram('jnet_docket_turnaround_seconds', "Time from a docket request until it was ready.", buckets = TURNAROUND_BUCKETS)
+        self.concurrency_limit = r.gauge('jnet_concurrency_limit', "The current limit on concurrent SOAP calls.")
+        self.concurrency_changes = r.counter('jnet_concurrency_changes_total', "Changes to the concurrency limit, by reason.", ('reason',))
+        self.circuit_state = r.gauge('jnet_circuit_state', "The state of the circuit breaker for an endpoint: 0 closed, 1 half-open, 2 open.", ('endpoint',))
+        self.circuit_changes = r.counter('jnet_circuit_changes_total', "Changes of circuit breaker state.", ('endpoint', 'state'))
+        self.last_event = r.gauge('jnet_last_event_timestamp_seconds', "Unix time of the latest recorded event.")
+
+    def __call__(self, event:dict):
+        kind = event['event']
+        if kind == 'request':
+            operation = event['operation'] or 'unknown'
+            self.requests.inc(operation = operation, status = event['status'] or 'none')
+            if event['error']:
+                self.errors.inc(operation = operation, error = event['error'])
+            self.duration.observe(event['total_seconds'], operation = operation)
+            for phase in ('build', 'sign', 'network', 'parse'):
+                self.phases.observe(event[f"{phase}_seconds"], operation = operation, phase = phase)
+            self.request_bytes.inc(event['request_bytes'], operation = operation)
+            self.response_bytes.inc(event['response_bytes'], operation = operation)
+            if event['hedges']:
+                self.hedges.inc(event['hedges'], operation = operation)
+        elif kind == 'status':
+            for state in ('completed', 'queued', 'not_found', 'invalid'):
+                if event[state]:
+                    self.status_records.inc(event[state], state = state)
+            if event['pending_only'] and event['complete']:
+                self.pending.set(event['records'])
+        elif kind == 'retrieve':
+            self.retrievals.inc(result = event['result'])
+        elif kind == 'concurrency':
+            self.concurrency_limit.set(event['limit'])
+            self.concurrency_changes.inc(reason = event['reason'])
+        elif kind == 'circuit':
+            self.circuit_state.set(CIRCUIT_STATES[event['state']], endpoint = event['endpoint'])
+            self.circuit_changes.inc(endpoint = event['endpoint'], state = event['state'])
+        elif kind == 'docket':
+            self.dockets.inc(result = event['error'] or 'ok')
+            self.poll_cycles.inc(event['polls'])
+            self.docket_polls.observe(event['polls'])
+            if event['turnaround_seconds'] is not None:
+                self.turnaround.observe(event['turnaround_seconds'])
+        self.last_event.set(time.time())
@@ -0,0 +1,311 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+
+""" A persistent cache of the docket numbers and OTNs that AOPC did not find.
+
+A docket that does not exist still goes through a full request, the AOPC turnaround and a poll cycle
+before it comes back as 'DOCKET NOT FOUND', and pipelines that resubmit the same input every day pay
+for it every day. A `NotFoundCache` on the client remembers every NOT FOUND in the status listings and
+replies the client sees, and `request_docket`, `request_otn` and `fetch_docket_data` raise
+`jnet.exceptions.NotFound` straight away for an identifier that was not found within `recheck_after`
+seconds, instead of asking again.
+
+```python
+cache = jnet.negative_cache.NotFoundCache('not-found.sqlite3', recheck_after = 7 * 86400)
+jnetclient = jnet.CCE(negative_cache = cache)
+```
+
+The entries are kept in a SQLite table with the time each identifier was last not found, so they are
+shared between runs and between processes using the same file. The time is that of the result itself
+(the `CreationDateTime` of a status record), not when it was seen, as a status listing repeats the same
+records on every poll, and an entry only ever moves forward in time. When a docket that was not found
+is found by a later request, the time it was found is kept too, so that the older NOT FOUND records
+still in the listings do not add it back. Most identifiers that are requested
+are not in the cache, so the entries are also added to an in-memory Bloom filter, and a lookup only
+reads the table when the filter says the identifier may be there. The filter is loaded when the cache
+is opened; entries added by other processes after that are only seen after `refresh()`.
+"""
+
+import re
+import math
+import time
+import datetime
+import sqlite3
+import hashlib
+
+from .exceptions import NotFound
+from .forksafe import ForkSafe
+
+# 'DOCKET NOT FOUND: CP-51-CR-0000001-2022 aopc:error' in status listings and replies
+_not_found_re = re.compile(r'(DOCKET|OTN) NOT FOUND:?\s+(\S+?)(?:\s*aopc|\s|$)')
+_found_re = re.compile(r'(?:Completed|Queued) (DOCKET NUMBER|OTN) (\S+)')
+
+_kinds = {'DOCKET': 'docket', 'DOCKET NUMBER': 'docket', 'OTN': 'otn'}
+
+def _key(kind:str, identifier:str):
+    return(f"{kind}:{identifier.strip().upper()}")
+
+def _timestamp(text:str):
+    """ A `CreationDateTime` as a unix timestamp, or None if there is none. Times without a zone are local time. """
+    try:
+        return(datetime.datetime.fromisoformat(text.strip().replace('Z', '+00:00')).timestamp())
+    except (AttributeError, ValueError):
+        return(None)
+
+
+class BloomFilter():
+    """ A set of strings that can answer 'maybe present' or 'definitely not present' in a fixed amount of memory.
+
+    Constructor Args:
+        capacity: The number of items it is sized for. More can be added, but the false positive rate grows.
+        error_rate: The false positive rate at `capacity` items. Default is 0.01.
+
+    Attributes:
+        size: The number of bits.
+        hashes: The number of bits set for each item.
+        count: The number of items added.
+    """
+
+    def __init__(self, capacity:int, error_rate:float = 0.01):
+        self.capacity = max(int(capacity), 1)
+        self.error_rate = error_rate
+        self.size = max(int(math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2)), 8)
+        self.hashes = max(int(round(self.size / self.capacity * math.log(2))), 1)
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, item:str):
+        # two independent 64 bit hashes, combined into `hashes` positions (Kirsch & Mitzenmacher)
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size = 16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return(((h1 + i * h2) % self.size for i in range(self.hashes)))
+
+    def add(self, item:str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item:str):
+        bits = self.bits
+        return(all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item)))
+
+
+class NotFoundCache(ForkSafe):
+    """ The docket numbers and OTNs that AOPC did not find, and when. Safe to share between threads.
+
+    Constructor Args:
+        path: The SQLite database file, which is created if it does not exist. Default is ':memory:', which is not persistent and not shared with forked or unpickled copies.
+        recheck_after: The seconds after which an identifier that was not found is requested again, in case it has since been filed. Default is 7 days.
+        capacity: The number of entries the Bloom filter is sized for. It is rebuilt at twice the size if the cache outgrows it. Default is 100000.
+        error_rate: The Bloom filter false positive rate, i.e. the fraction of lookups for identifiers that are not in the cache that still read the table. Default is 0.01.
+
+    Attributes:
+        path: The database file.
+        recheck_after: The seconds an entry is used for.
+    """
+
+    # the parent's connection must not be used by the child
+    _fork_reset = {'_connection': lambda: None}
+
+    def __init__(self, path:str = ':memory:', recheck_after:float = 7 * 86400, capacity:int = 100000, error_rate:float = 0.01):
+        self.path = path
+        self.recheck_after = recheck_after
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._connection = None
+        self._init_fork_safe()
+        self.refresh()
+
+    @property
+    def connection(self):
+        """ The SQLite connection, which is opened (and the table created) on first use. Only use it while holding the lock. """
+        if self._connection is None:
+            connection = sqlite3.connect(self.path, timeout = 30, check_same_thread = False, isolation_level = None)
+            if self.path != ':memory:':
+                # readers do not block the process that is writing
+                connection.execute('PRAGMA journal_mode=WAL')
+            for table in ('not_found', 'found'):
+                connection.execute(
+                    f'CREATE TABLE IF NOT EXISTS {table} (kind TEXT NOT NULL, identifier TEXT NOT NULL, checked REAL NOT NULL, PRIMARY KEY (kind, identifier)) WITHOUT ROWID'
+                )
+            self._connection = connection
+        return(self._connection)
+
+    def refresh(self):
+        """ Rebuild the Bloom filter from the table, i.e. to see the entries added by other processes. """
+        with self._lock:
+            self._load()
+
+    def _load(self):
+        rows = self.connection.execute('SELECT kind, identifier FROM not_found').fetchall()
+        bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+        for kind, identifier in rows:
+            bloom.add(_key(kind, identifier))
+        self._bloom = bloom
+
+    def __len__(self):
+        with self._lock:
+            return(self.connection.execute('SELECT COUNT(*) FROM not_found').fetchone()[0])
+
+    def add(self, kind:str, identifier:str, checked:float = None):
+        """ Record that an identifier was not found.
+
+        An entry is only moved to a later time, and is not added if the identifier was found at or after `checked`.
+
+        Args:
+            kind: 'docket' or 'otn'.
+            identifier: The docket number or OTN.
+            checked: The time it was not found, as a unix timestamp. Default is now.
+        Returns:
+            True if the entry was added or moved, otherwise False.
+        """
+        identifier = identifier.strip().upper()
+        checked = time.time() if checked is None else checked
+        with self._lock:
+            cursor = self.connection.execute(
+                'INSERT INTO not_found (kind, identifier, checked) SELECT ?, ?, ? '
+                'WHERE NOT EXISTS (SELECT 1 FROM found WHERE kind = ? AND identifier = ? AND checked >= ?) '
+                'ON CONFLICT (kind, identifier) DO UPDATE SET checked = excluded.checked WHERE excluded.checked > checked',
+                (kind, identifier, checked, kind, identifier, checked),
+            )
+            if cursor.rowcount < 1:
+                return(False)
+            self._bloom.add(_key(kind, identifier))
+            if self._bloom.count > self._bloom.capacity:
+                self._load()
+        return(True)
+
+    def discard(self, kind:str, identifier:str, checked:float = None):
+        """ Remove an identifier once it has been found, unless it was not found again after that.
+
+        Args:
+            kind: 'docket' or 'otn'.
+            identifier: The docket number or OTN.
+            checked: The time it was found, as a unix timestamp. Default is now.
+        """
+        if _key(kind, identifier) not in self._bloom:
+            # it was never added, so there is nothing to remove or to keep out
+            return
+        identifier = identifier.strip().upper()
+        checked = time.time() if checked is None else checked
+        with self._lock:
+            self.connection.execute('DELETE FROM not_found WHERE kind = ? AND identifier = ? AND checked <= ?', (kind, identifier, checked))
+            self.connection.execute(
+                'INSERT INTO found (kind, identifier, checked) VALUES (?, ?, ?) '
+                'ON CONFLICT (kind, identifier) DO UPDATE SET checked = excluded.checked WHERE excluded.checked > checked',
+                (kind, identifier, checked),
+            )
+
+    def checked(self, kind:str, identifier:str):
+        """ The unix timestamp when the identifier was last not found, or None if it is not in the cache. """
+        if _key(kind, identifier) not in self._bloom:
+            return(None)
+        with self._lock:
+            row = self.connection.execute(
+                'SELECT checked FROM not_found WHERE kind = ? AND identifier = ?', (kind, identifier.strip().upper())
+            ).fetchone()
+        return(row[0] if row else None)
+
+    def is_not_found(self, kind:str, identifier:str):
+        """ Returns True if the identifier was not found within the last `recheck_after` seconds. """
+        checked = self.checked(kind, identifier)
+        return(checked is not None and time.time() - checked < self.recheck_after)
+
+    def check(self, kind:str, identifier:str):
+        """ Raise `NotFound` if the identifier was not found within the last `recheck_after` seconds.
+
+        Args:
+            kind: 'docket' or 'otn'.
+            identifier: The docket number or OTN.
+        Raises:
+            jnet.exceptions.NotFound if it is in the cache and has not expired.
+        """
+        checked = self.checked(kind, identifier)
+        if checked is not None and time.time() - checked < self.recheck_after:
+            label = 'Docket Number' if kind == 'docket' else 'OTN'
+            when = time.strftime('%Y-%m-%d %H:%M', time.localtime(checked))
+            raise NotFound(
+                f"AOPC returned NOT FOUND for {label} {identifier} at {when}, so it was not requested again (see `jnet.negative_cache`)",
+                data = {'kind': kind, 'identifier': identifier, 'checked': checked},
+            )
+
+    def record_activity(self, text:str, checked:float = None):
+        """ Update the cache from the activity text of a status record or reply: add a NOT FOUND identifier, or discard one that was found.
+
+        Args:
+            text: The `ActivityTypeText` header of a status record, or the `BackendSystemReturnText` of a reply.
+            checked: The time of the result, as a unix timestamp. Default is now.
+        Returns:
+            tuple of (kind, identifier) that was added, or None.
+        """
+        match = _not_found_re.search(text)
+        if match:
+            kind, identifier = _kinds[match.group(1)], match.group(2)
+            if self.add(kind, identifier, checked):
+                return((kind, identifier))
+            return(None)
+        match = _found_re.search(text)
+        if match:
+            self.discard(_kinds[match.group(1)], match.group(2), checked)
+        return(None)
+
+    def record(self, records):
+        """ Update the cache from status records, either the `RequestCourtCaseEventInfoMetadata` elements of a status listing or the results of `CCE.clean_info_response_data`.
+
+        Each record is dated by its `CreationDateTime`, and they are recorded oldest first, so the latest
+        result for an identifier wins.
+
+        Args:
+            records: A list of status records.
+        Returns:
+            list of the (kind, identifier) tuples that were added.
+        """
+        activities = []
+        for record in records:
+            # cleaned results keep the record they were made from
+            headers = record.get('raw', record).get('HeaderField') or []
+            fields = {header.get('HeaderName'): header.get('HeaderValueText') for header in ([headers] if type(headers) is dict else headers)}
+            if fields.get('ActivityTypeText'):
+                activities.append((_timestamp(fields.get('CreationDateTime')), fields['ActivityTypeText']))
+
+        now = time.time()
+        added = []
+        for checked, text in sorted(activities, key = lambda activity: now if activity[0] is None else activity[0]):
+            result = self.record_activity(text, checked)
+            if result:
+                added.append(result)
+        return(added)
+
+    def purge(self):
+        """ Delete the entries older than `recheck_after`. Returns the number deleted. """
+        with self._lock:
+            cutoff = time.time() - self.recheck_after
+            cursor = self.connection.execute('DELETE FROM not_found WHERE checked < ?', (cutoff,))
+            # a NOT FOUND from before the cutoff has expired anyway
+            self.connection.execute('DELETE FROM found WHERE checked < ?', (cutoff,))
+            self._load()
+        return(cursor.rowcount)
+
+    def close(self):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
@@ -0,0 +1,233 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+import os
+import io
+import json
+import time
+import gzip
+import zlib
+
+NDJSON_EXTENSIONS = ('.ndjson', '.jsonl')
+COMPRESSION_EXTENSIONS = {
+    '.gz': 'gzip',
+    '.zst': 'zstd',
+}
+
+def _zstandard():
+    """ Import the optional `zstandard` module, with a helpful message if it is missing. """
+    try:
+        import zstandard
+    except ModuleNotFoundError:
+        raise ModuleNotFoundError("zstd compression requires the `zstandard` package: `python3 -m pip install zstandard`") from None
+    return(zstandard)
+
+def ndjson_compression(path:str):
+    """ Returns the compression ('gzip', 'zstd', or None) implied by the file extension of `path`. """
+    for ext, compression in COMPRESSION_EXTENSIONS.items():
+        if path.endswith(ext):
+            return(compression)
+    return(None)
+
+def is_ndjson_path(path:str):
+    """ True if the path looks like line-delimited json, i.e. ends in `.ndjson` or `.jsonl` with an optional `.gz` or `.zst` suffix. """
+    if not path:
+        return(False)
+    for ext in COMPRESSION_EXTENSIONS:
+        if path.endswith(ext):
+            path = path[:-len(ext)]
+            break
+    return(path.endswith(NDJSON_EXTENSIONS))
+
+def index_path(path:str):
+    """ The location of the chunk index that accompanies a compressed ndjson file. """
+    return(path + '.idx')
+
+
+class NDJSONWriter():
+    """ Streams records to a newline-delimited json file, one record per line.
+
+    Records are buffered and written out every `flush_every` records or `flush_interval` seconds,
+    whichever comes first, so memory use stays flat no matter how many records are written.
+
+    For compressed output, each flush is written as a complete, independent gzip member or zstd
+    frame. The concatenated file is still a valid gzip/zstd file for any standard tool, but the
+    byte offset of each member is also recorded in a `.idx` file alongside the output so that
+    `ndjson_chunks` can split the file for parallel loading without decompressing it first.
+
+    Constructor Args:
+        path: The output file. Compression is inferred from a `.gz` or `.zst` suffix unless provided.
+        compression: 'gzip', 'zstd', or None to override the inferred compression.
+        flush_every: The number of records to buffer before writing. Default is 100.
+        flush_interval: The maximum number of seconds to hold buffered records. Default is 5.
+        append: If True, add to an existing file instead of replacing it. Default is False.
+
+    The writer is a context manager, and `close()` must be called (or the `with` block exited) to write the final records.
+    """
+
+    def __init__(self, path:str, compression:str = 'infer', flush_every:int = 100, flush_interval:float = 5.0, append:bool = False):
+        self.path = path
+        self.compression = ndjson_compression(path) if compression == 'infer' else compression
+        if self.compression not in (None, 'gzip', 'zstd'):
+            raise ValueError(f"Unknown compression '{self.compression}' - must be 'gzip', 'zstd', or None")
+
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.count = 0
+
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._zstd = _zstandard().ZstdCompressor() if self.compression == 'zstd' else None
+
+        self._fh = open(path, 'ab' if append else 'wb')
+        self._index = None
+        if self.compression:
+            self._index = open(index_path(path), 'a' if append else 'w')
+
+    def write(self, record):
+        """ Add a single record to the output. """
+        self._buffer.append(json.dumps(record))
+        self.count += 1
+        if len(self._buffer) >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def write_all(self, records):
+        """ Add each record in an iterable to the output. """
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """ Write out all buffered records and flush them to disk. """
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+
+        payload = ("\n".join(self._buffer) + "\n").encode('utf-8')
+        records = len(self._buffer)
+        self._buffer = []
+
+        if self.compression == 'gzip':
+            compressor = zlib.compressobj(wbits = 31)
+            payload = compressor.compress(payload) + compressor.flush()
+        elif self.compression == 'zstd':
+            payload = self._zstd.compress(payload)
+
+        offset = self._fh.tell()
+        self._fh.write(payload)
+        self._fh.flush()
+        if self._index:
+            self._index.write(f"{offset}\t{len(payload)}\t{records}\n")
+            self._index.flush()
+
+    def close(self):
+        """ Write any remaining records and close the file. """
+        if self._fh.closed:
+            return
+        self.flush()
+        self._fh.close()
+        if self._index:
+            self._index.close()
+
+    def __enter__(self):
+        return(self)
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _decode_lines(raw:bytes):
+    for line in raw.splitlines():
+        if line.strip():
+            yield(json.loads(line))
+
+def iter_ndjson(path:str, compression:str = 'infer'):
+    """ Iterate over the records in a (possibly compressed) ndjson file without loading the whole file. """
+    if compression == 'infer':
+        compression = ndjson_compression(path)
+
+    if compression == 'gzip':
+        fh = gzip.open(path, 'rb')
+    elif compression == 'zstd':
+        raw = open(path, 'rb')
+        fh = io.BufferedReader(_zstandard().ZstdDecompressor().stream_reader(raw, read_across_frames = True, closefd = True))
+    else:
+        fh = open(path, 'rb')
+
+    with fh:
+        for line in fh:
+            if line.strip():
+                yield(json.loads(line))
+
+def ndjson_chunks(path:str, target_size:int = 8 * 1024 * 1024):
+    """ Split an ndjson file into byte ranges that can be loaded independently, i.e. in parallel worker processes.
+
+    Compressed files are split on the member/frame boundaries recorded in the `.idx` file written by `NDJSONWriter` (and the whole file is one chunk if there is no index). Uncompressed files are split every `target_size` bytes, aligned to the next line break.
+
+    Args:
+        path: The ndjson file.
+        target_size: The approximate number of bytes per chunk. Default is 8MB.
+    Returns:
+        list of (offset, length) tuples to pass to `read_ndjson_chunk`.
+    """
+    filesize = os.path.getsize(path)
+
+    if ndjson_compression(path):
+        if not os.path.exists(index_path(path)):
+            return([(0, filesize)])
+
+        chunks = []
+        with open(index_path(path)) as fh:
+            for line in fh:
+                offset, length, records = (int(v) for v in line.split("\t"))
+                # merge adjacent members until we reach the target size
+                if chunks and chunks[-1][1] + length <= target_size and chunks[-1][0] + chunks[-1][1] == offset:
+                    chunks[-1] = (chunks[-1][0], chunks[-1][1] + length)
+                else:
+                    chunks.append((offset, length))
+        return(chunks)
+
+    chunks = []
+    offset = 0
+    with open(path, 'rb') as fh:
+        while offset < filesize:
+            fh.seek(min(offset + target_size, filesize))
+            fh.readline()
+            end = min(fh.tell(), filesize)
+            chunks.append((offset, end - offset))
+            offset = end
+    return(chunks)
+
+def read_ndjson_chunk(path:str, offset:int, length:int):
+    """ Load the records in a single chunk returned by `ndjson_chunks`.
+
+    Returns:
+        list of records in the chunk.
+    """
+    with open(path, 'rb') as fh:
+        fh.seek(offset)
+        raw = fh.read(length)
+
+    compression = ndjson_compression(path)
+    if compression == 'gzip':
+        raw = gzip.decompress(raw)
+    elif compression == 'zstd':
+        reader = _zstandard().ZstdDecompressor().stream_reader(io.BytesIO(raw), read_across_frames = True)
+        raw = reader.read()
+
+    return(list(_decode_lines(raw)))
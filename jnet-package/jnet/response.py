@@ -17,22 +17,31 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
 
-import lxml
+import lxml.etree
 import xmltodict
 from collections import OrderedDict
 import re 
 import json
+import threading
 
 
 regex = re.compile(r'^[^:]+:')
 xmlnsre = re.compile(r'^\@xmlns(:[\w\-]+)?$')
 
+# targeted lookups of the SOAP Fault fields, relative to the Envelope, so that errors can be classified without converting the whole response to `data`
+_fault_xpath = lxml.etree.XPath("*[local-name()='Body']/*[local-name()='Fault']")
+_fault_field_xpaths = {
+    'faultcode': lxml.etree.XPath("string(*[local-name()='faultcode'])", smart_strings = False),
+    'faultstring': lxml.etree.XPath("string(*[local-name()='faultstring'])", smart_strings = False),
+    'detail': lxml.etree.XPath("string(*[local-name()='detail']/*[local-name()='JNETFaultDetail']/*[local-name()='ErrorModuleText'])", smart_strings = False),
+}
+
 class SOAPResponse():
     """ A class to encapsulate and simplify JNET responses.  
 
     Constructor Args:
-        http_response: A response with SOAP xml contact that follows the interface for a requests.post response. Optional if xml is provided instead.
-        xml: An lxml.etree object to set as the underlying data. Allowed only as an alternative to http_response
+        http_response: A response with SOAP xml contact that follows the interface for a requests.post response. Optional if xml is provided instead. The raw bytes of its `content` are parsed, so the body is never decoded to a str.
+        xml: An lxml.etree object, or the xml as a str or bytes, to set as the underlying data. Allowed only as an alternative to http_response
         allow_failure: If True, process a response that is not "ok." By default, an error is thrown on a non-good response to minimize hard to track down errors.  Default is False.
         **kwargs: Any additional parameters will be added as accessors on the object, allowing custom clients to quickly add features to the response objects without requiring subclassing.
 
@@ -43,10 +52,12 @@ class SOAPResponse():
     """
     def __init__(self, http_response = None, xml = None, allow_failure = False, **extra_params):
         
+        # the xml as received, which is converted to `data` without serializing the tree again
+        self._raw = None
         if http_response is None:
             if xml is None:
                 raise Exception("Neither an http_response nor an xml object provided")
-            if type(xml) is str:
+            if type(xml) in (str, bytes):
                 self.xml = xml
             else:
                 self._xml = xml
@@ -54,12 +65,41 @@ class SOAPResponse():
             if not http_response.ok and not allow_failure:
                 raise Exception("Response does not have an okay value.  Failing.")
 
-            self.xml = http_response.text #http_response.text.encode()
+            self.xml = http_response.content
         
         self._data = None
+        self._data_lock = threading.Lock()
         if extra_params:
             self._add_properties(**extra_params)
     
+    @classmethod
+    def from_failure(cls, http_response):
+        """ Parse the reply to a failed request, i.e. a SOAP Fault.
+
+        A failed reply is parsed once with this, and the result given to both `jnet.concurrency.is_overload`
+        and `jnet.exceptions.error_factory`.
+
+        Returns:
+            The SOAPResponse, or None if the reply is not xml.
+        """
+        try:
+            return(cls(http_response, allow_failure = True))
+        except Exception:
+            return(None)
+
+    def __getstate__(self):
+        # the lxml tree cannot be pickled, so it is parsed again from the xml as received
+        state = self.__dict__.copy()
+        state['_raw'] = self._raw if self._raw is not None else self.xml_string
+        del state['_xml']
+        del state['_data_lock']
+        return(state)
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._xml = lxml.etree.fromstring(self._raw)
+        self._data_lock = threading.Lock()
+
     def _add_properties(self, **kwargs):
         """ Adds additional properties for the response.  
         
@@ -94,9 +134,9 @@ class SOAPResponse():
     @xml.setter
     def xml(self, xml_string):
         if type(xml_string) is str:
-            self._xml = lxml.etree.fromstring(xml_string.encode())
-        else:
-            self._xml = lxml.etree.fromstring(xml_string)
+            xml_string = xml_string.encode()
+        self._xml = lxml.etree.fromstring(xml_string)
+        self._raw = xml_string
 
     @property
     def xml_string(self):
@@ -111,23 +151,41 @@ class SOAPResponse():
         namespaces to give a data structure that is more accessible to the average user.
 
         Because this can be a comparatively time consuming processes, it is done lasily
-        on first access and the result is saved for future accesses.
+        on first access and the result is saved for future accesses. Concurrent first
+        accesses from several threads convert the xml only once.
         """
 
-        if not self._data:
-            # process the first time it's calle 
-            # unwrap the envelope
-            bodyregex = re.compile(r':body$', re.I)
-            rawdata = next(iter(xmltodict.parse(self.xml_string).values()))
-            # find the body            
-            for k in rawdata.keys():
-                if bodyregex.search(k):
-                    rawdata = rawdata[k]
-                    break
-            self._data = self._recurse_datastruct(rawdata)
-            
+        if self._data is None:
+            # the response may be shared between threads, so only one converts it
+            with self._data_lock:
+                if self._data is None:
+                    # process the first time it's calle 
+                    # unwrap the envelope
+                    bodyregex = re.compile(r':body$', re.I)
+                    rawdata = next(iter(xmltodict.parse(self._raw if self._raw is not None else self.xml_string).values()))
+                    # find the body            
+                    for k in rawdata.keys():
+                        if bodyregex.search(k):
+                            rawdata = rawdata[k]
+                            break
+                    self._data = self._recurse_datastruct(rawdata)
+
         return(self._data)
     
+    @property
+    def fault(self):
+        """ The SOAP Fault in the response, or None if it is not a fault.
+
+        The fields are read directly from the xml, which is much cheaper than converting the response with `data`.
+
+        Returns:
+            A dict with the `faultcode` (i.e. 'soap:Server'), the `faultstring` (i.e. 'Authentication_Error'), and the `detail`, which is the JNETFaultDetail ErrorModuleText. Missing fields are None.
+        """
+        faults = _fault_xpath(self.xml)
+        if not faults:
+            return(None)
+        return({field: xpath(faults[0]) or None for field, xpath in _fault_field_xpaths.items()})
+
     @property
     def data_string(self):
         """ Returns a string representing the response data. """
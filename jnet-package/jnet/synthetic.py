@@ -0,0 +1,371 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Generate synthetic, schema-shaped JNET replies for benchmarks and tests.
+
+Real dockets are confidential, so this module builds `ReceiveCourtCaseEventReply` and
+`RequestCourtCaseEventInfoResponse` xml with the same structure and roughly the same size as real
+data, but with invented values. Everything is generated from a seed: the docket at a given index is
+always the same for the same seed and sizes, no matter what else was generated before it, so a corpus
+can be produced in parallel or regenerated in pieces.
+
+The xml is built with plain string formatting, without lxml or zeep, so it is fast enough to produce
+gigabytes of test data.
+
+```python
+import jnet.synthetic
+generator = jnet.synthetic.SyntheticCCE(seed = 42, charges = (1, 20))
+xml = generator.court_case_event_reply(0)
+listing = generator.status_listing(500)
+```
+"""
+
+import os
+import random
+import datetime
+
+SOAP_NS = "http://schemas.xmlsoap.org/soap/envelope/"
+MESSAGE_NS = "http://jnet.state.pa.us/message/aopc/CCERequestReply/1"
+METADATA_NS = "http://www.jnet.state.pa.us/niem/jnet/metadata/1"
+EXTENSION_NS = "http://us.pacourts.us/niem/aopc/Extension/2"
+NIEM_CORE_NS = "http://niem.gov/niem/niem-core/2.0"
+JXDM_NS = "http://niem.gov/niem/domains/jxdm/4.0"
+
+# the kinds of records that appear in a RequestCourtCaseEventInfo listing, and how often
+# each appears in a listing by default
+STATUS_KINDS = {
+    'completed': 0.6,
+    'queued': 0.1,
+    'not_found': 0.1,
+    'invalid': 0.05,
+    'participant': 0.1,
+    'participant_not_found': 0.05,
+}
+
+FIRST_NAMES = (
+    'James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+    'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Carlos', 'Karen',
+    'Luis', 'Aaliyah', 'Andre', 'Keisha', 'Minh', 'Mei', 'Tyrone', 'Imani', 'Jose', 'Maria',
+)
+LAST_NAMES = (
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Rodriguez', 'Martinez',
+    'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson', 'Thomas', 'Taylor', 'Moore', 'Jackson', 'Martin',
+    'Lee', 'Nguyen', 'Harris', 'Clark', 'Lewis', 'Robinson', 'Walker', 'Young', 'Allen', 'King',
+)
+STREETS = ('Market St', 'Broad St', 'Girard Ave', 'Lehigh Ave', 'Germantown Ave', 'Frankford Ave', 'Passyunk Ave', 'Baltimore Ave')
+STATUTES = (
+    ('18 § 2701 §§ A1', 'Simple Assault', 'M2'),
+    ('18 § 2702 §§ A1', 'Aggravated Assault', 'F1'),
+    ('18 § 3502 §§ A1', 'Burglary - Overnight Accommodations; Person Present', 'F1'),
+    ('18 § 3921 §§ A', 'Theft By Unlawful Taking - Movable Property', 'M1'),
+    ('18 § 3925 §§ A', 'Receiving Stolen Property', 'M1'),
+    ('18 § 6106 §§ A1', 'Firearms Not To Be Carried Without A License', 'F3'),
+    ('18 § 6108', 'Carrying Firearms Public In Philadelphia', 'M1'),
+    ('35 § 780-113 §§ A30', 'Manufacture, Delivery, or Possession With Intent to Manufacture or Deliver', 'F'),
+    ('35 § 780-113 §§ A16', 'Intentional Possession of a Controlled Substance By Person Not Registered', 'M'),
+    ('18 § 2705', 'Recklessly Endangering Another Person', 'M2'),
+    ('75 § 3802 §§ A1', 'DUI: General Impairment', 'M'),
+    ('18 § 5503 §§ A1', 'Disorderly Conduct Engage In Fighting', 'M3'),
+)
+DISPOSITIONS = ('Held for Court', 'Withdrawn', 'Nolle Prossed', 'Guilty Plea', 'Guilty', 'Not Guilty', 'Dismissed', 'Proceed to Court')
+EVENT_TYPES = ('Preliminary Arraignment', 'Preliminary Hearing', 'Formal Arraignment', 'Status Listing', 'Pretrial Conference', 'Trial', 'Sentencing', 'Violation of Probation Hearing')
+EVENT_STATUSES = ('Scheduled', 'Continued', 'Moved', 'Cancelled')
+JUDGES = ('Brandeis-Roman, Charles', 'Coleman, Rose Marie', 'Ehrlich, Lillian', 'Means, Tracy', 'Palumbo, Frank', 'Bronson, Glenn', 'Woods-Skipper, Sheila')
+ROLES = ('Defendant', 'Complainant', 'Witness', 'Arresting Officer')
+RACES = ('Black', 'White', 'Asian', 'Unknown/Unreported')
+
+def envelope(body:str):
+    """ Wrap the body xml in a SOAP envelope with the message (`m:`) and metadata (`jnet-m:`) namespaces declared. """
+    return(
+        f"<?xml version=\"1.0\" encoding=\"UTF-8\"?>"
+        f"<soap:Envelope xmlns:soap=\"{SOAP_NS}\" xmlns:m=\"{MESSAGE_NS}\" xmlns:jnet-m=\"{METADATA_NS}\">"
+        f"<soap:Body>{body}</soap:Body></soap:Envelope>"
+    )
+
+def activity_text(kind:str, docket_number:str = None, otn:str = None, participant:dict = None):
+    """ The `ActivityTypeText` header that JNET lists for a request in a RequestCourtCaseEventInfo response.
+
+    Args:
+        kind: 'completed', 'queued', 'not_found' or 'invalid'.
+        docket_number: The docket number of a docket request.
+        otn: The OTN of an OTN request.
+        participant: A dict of the participant search fields (i.e. FirstName, LastName, BirthDate) of a participant request.
+    """
+    if participant:
+        if kind == 'not_found':
+            return("PARTICIPANT NOT FOUND")
+        details = '|'.join(f"{k}:{v}" for k, v in participant.items())
+        return(f"CASE PARTICIPANT {details}|")
+    elif otn:
+        return(f"Completed OTN {otn}")
+    elif kind == 'completed':
+        return(f"Completed DOCKET NUMBER {docket_number}")
+    elif kind == 'queued':
+        return(f"Queued DOCKET NUMBER {docket_number}")
+    elif kind == 'not_found':
+        return(f"DOCKET NOT FOUND: {docket_number} aopc:error")
+    elif kind == 'invalid':
+        return(f"Invalid Request Object! Docket Number not supported!{docket_number}aopc:error")
+    raise ValueError(f"Unknown request kind '{kind}'")
+
+def info_metadata(file_id:str, tracking_id:str, header_text:str, created:datetime.datetime):
+    """ A `RequestCourtCaseEventInfoMetadata` element for a single request. The header text must already be xml-safe. """
+    return(
+        f"<jnet-m:RequestCourtCaseEventInfoMetadata>"
+        f"<jnet-m:FileTrackingID>{file_id}</jnet-m:FileTrackingID>"
+        f"<jnet-m:UserDefinedTrackingID>{tracking_id}</jnet-m:UserDefinedTrackingID>"
+        f"<jnet-m:HeaderField><jnet-m:HeaderName>ActivityTypeText</jnet-m:HeaderName>"
+        f"<jnet-m:HeaderValueText>{header_text}</jnet-m:HeaderValueText></jnet-m:HeaderField>"
+        f"<jnet-m:HeaderField><jnet-m:HeaderName>CreationDateTime</jnet-m:HeaderName>"
+        f"<jnet-m:HeaderValueText>{created.isoformat()}</jnet-m:HeaderValueText></jnet-m:HeaderField>"
+        f"</jnet-m:RequestCourtCaseEventInfoMetadata>"
+    )
+
+
+class SyntheticCCE():
+    """ A seeded generator of synthetic Court Case Event data.
+
+    Sizes can be given as a fixed number or as a (minimum, maximum) tuple, in which case each docket
+    draws its own size from the range.
+
+    Constructor Args:
+        seed: The random seed. The same seed and sizes always produce the same data. Default is 0.
+        participants: The number of case participants per docket. Default is (1, 4).
+        charges: The number of charges per docket. Default is (1, 12).
+        events: The number of calendar events per docket. Default is (2, 30).
+        year: The filing year used in generated docket numbers. Default is 2022.
+    """
+
+    def __init__(self, seed = 0, participants = (1, 4), charges = (1, 12), events = (2, 30), year:int = 2022):
+        self.seed = seed
+        self.participants = participants
+        self.charges = charges
+        self.events = events
+        self.year = year
+
+    def rng(self, *key):
+        """ A `random.Random` for a single item, so that every docket and listing can be generated independently. """
+        return(random.Random(':'.join(str(k) for k in (self.seed,) + key)))
+
+    @staticmethod
+    def _size(rng, size):
+        if type(size) in (tuple, list):
+            return(rng.randint(size[0], size[1]))
+        return(size)
+
+    @staticmethod
+    def _date(rng, start_year:int, end_year:int):
+        return(datetime.date(rng.randint(start_year, end_year), rng.randint(1, 12), rng.randint(1, 28)))
+
+    def docket_number(self, index:int):
+        """ The docket number for the docket at `index`, i.e. CP-51-CR-0000042-2022 for index 42. """
+        return(f"CP-51-CR-{index:07d}-{self.year}")
+
+    def otn(self, index:int):
+        """ The OTN for the docket at `index`. """
+        return(f"N{index % 10000000:07d}{index % 10}")
+
+    def participant(self, rng):
+        """ A dict of participant search fields (FirstName, LastName, BirthDate). """
+        return({
+            'FirstName': rng.choice(FIRST_NAMES),
+            'LastName': rng.choice(LAST_NAMES),
+            'BirthDate': self._date(rng, 1950, 2004).isoformat(),
+        })
+
+    #----------------------
+    # ReceiveCourtCaseEventReply
+    #----------------------
+
+    def court_case_event(self, index:int, participants = None, charges = None, events = None):
+        """ The `CourtCaseEvent` element for the docket at `index`.
+
+        Args:
+            index: The docket index, which determines the docket number and seeds the rest of the data.
+            participants, charges, events: Override the generator's sizes for this docket.
+        Returns:
+            The xml as a string.
+        """
+        rng = self.rng('docket', index)
+        docket_number = self.docket_number(index)
+        filed = self._date(rng, self.year, self.year)
+        parts = [
+            f"<pac:CourtCaseEvent xmlns:pac=\"{EXTENSION_NS}\" xmlns:nc=\"{NIEM_CORE_NS}\" xmlns:jxdm=\"{JXDM_NS}\">",
+            f"<pac:CaseDocketID><nc:ID>{docket_number}</nc:ID></pac:CaseDocketID>",
+            f"<pac:CaseOTN><nc:ID>{self.otn(index)}</nc:ID></pac:CaseOTN>",
+            f"<nc:CaseCategoryText>Criminal</nc:CaseCategoryText>",
+            f"<pac:CaseCourt><nc:OrganizationName>Philadelphia County Court of Common Pleas</nc:OrganizationName>",
+            f"<pac:CourtJudicialDistrictID><nc:ID>51</nc:ID></pac:CourtJudicialDistrictID></pac:CaseCourt>",
+            f"<pac:CaseFiling><nc:ActivityDate><nc:Date>{filed.isoformat()}</nc:Date></nc:ActivityDate></pac:CaseFiling>",
+            f"<pac:CaseStatus><nc:StatusDescriptionText>{rng.choice(('Active', 'Closed', 'Inactive'))}</nc:StatusDescriptionText>",
+            f"<nc:StatusDate><nc:Date>{filed.isoformat()}</nc:Date></nc:StatusDate></pac:CaseStatus>",
+        ]
+
+        for n in range(self._size(rng, self.participants if participants is None else participants)):
+            person = self.participant(rng)
+            parts.append(
+                f"<pac:CaseParticipant><pac:CaseParticipantRoleText>{ROLES[0] if n == 0 else rng.choice(ROLES[1:])}</pac:CaseParticipantRoleText>"
+                f"<nc:PersonName><nc:PersonGivenName>{person['FirstName']}</nc:PersonGivenName>"
+                f"<nc:PersonMiddleName>{rng.choice(FIRST_NAMES)}</nc:PersonMiddleName>"
+                f"<nc:PersonSurName>{person['LastName']}</nc:PersonSurName></nc:PersonName>"
+                f"<nc:PersonBirthDate><nc:Date>{person['BirthDate']}</nc:Date></nc:PersonBirthDate>"
+                f"<nc:PersonSexText>{rng.choice(('Male', 'Female'))}</nc:PersonSexText>"
+                f"<nc:PersonRaceText>{rng.choice(RACES)}</nc:PersonRaceText>"
+                f"<nc:ContactMailingAddress><nc:StreetFullText>{rng.randint(100, 9999)} {rng.choice(STREETS)}</nc:StreetFullText>"
+                f"<nc:LocationCityName>Philadelphia</nc:LocationCityName><nc:LocationStateName>PA</nc:LocationStateName>"
+                f"<nc:LocationPostalCode>191{rng.randint(2, 54):02d}</nc:LocationPostalCode></nc:ContactMailingAddress>"
+                f"<jxdm:PersonStateFingerprintIdentification><nc:ID>{rng.randint(1000000, 9999999)}</nc:ID></jxdm:PersonStateFingerprintIdentification>"
+                f"</pac:CaseParticipant>"
+            )
+
+        for n in range(self._size(rng, self.charges if charges is None else charges)):
+            statute, description, grade = rng.choice(STATUTES)
+            offense = filed - datetime.timedelta(days = rng.randint(0, 30))
+            parts.append(
+                f"<pac:Charge><pac:ChargeSequenceID><nc:ID>{n + 1}</nc:ID></pac:ChargeSequenceID>"
+                f"<pac:ChargeStatute><jxdm:StatuteCodeSectionIdentification><nc:ID>{statute}</nc:ID></jxdm:StatuteCodeSectionIdentification>"
+                f"<jxdm:StatuteDescriptionText>{description}</jxdm:StatuteDescriptionText></pac:ChargeStatute>"
+                f"<pac:ChargeGradeText>{grade}</pac:ChargeGradeText>"
+                f"<pac:ChargeOffenseDate><nc:Date>{offense.isoformat()}</nc:Date></pac:ChargeOffenseDate>"
+                f"<pac:ChargeDisposition><nc:DispositionDate><nc:Date>{(filed + datetime.timedelta(days = rng.randint(0, 365))).isoformat()}</nc:Date></nc:DispositionDate>"
+                f"<nc:DispositionText>{rng.choice(DISPOSITIONS)}</nc:DispositionText></pac:ChargeDisposition>"
+                f"</pac:Charge>"
+            )
+
+        for n in range(self._size(rng, self.events if events is None else events)):
+            when = filed + datetime.timedelta(days = 14 * n + rng.randint(0, 13))
+            parts.append(
+                f"<pac:CaseCalendarEvent><nc:ActivityDate><nc:DateTime>{when.isoformat()}T{rng.randint(8, 15):02d}:{rng.choice(('00', '30'))}:00</nc:DateTime></nc:ActivityDate>"
+                f"<nc:ActivityDescriptionText>{rng.choice(EVENT_TYPES)}</nc:ActivityDescriptionText>"
+                f"<pac:CourtRoomID><nc:ID>Courtroom {rng.randint(200, 1200)}</nc:ID></pac:CourtRoomID>"
+                f"<pac:JudgeName><nc:PersonFullName>{rng.choice(JUDGES)}</nc:PersonFullName></pac:JudgeName>"
+                f"<pac:EventStatusText>{rng.choice(EVENT_STATUSES)}</pac:EventStatusText></pac:CaseCalendarEvent>"
+            )
+
+        parts.append("</pac:CourtCaseEvent>")
+        return(''.join(parts))
+
+    def court_case_event_reply(self, index:int, tracking_id:str = None, **sizes):
+        """ A complete `ReceiveCourtCaseEventReply` envelope for the docket at `index`.
+
+        Args:
+            index: The docket index.
+            tracking_id: The UserDefinedTrackingID to report. Default is 'synthetic-{index}'.
+            **sizes: `participants`, `charges` or `events` to override the generator's sizes.
+        Returns:
+            The xml as a string.
+        """
+        if tracking_id is None:
+            tracking_id = f"synthetic-{index}"
+        return(envelope(
+            f"<m:ReceiveCourtCaseEventReply>"
+            f"<jnet-m:ResponseMetadata><jnet-m:UserDefinedTrackingID>{tracking_id}</jnet-m:UserDefinedTrackingID>"
+            f"<jnet-m:BackendSystemReturn><jnet-m:BackendSystemName>AOPC</jnet-m:BackendSystemName>"
+            f"<jnet-m:BackendSystemReturnCode>SUCCESS</jnet-m:BackendSystemReturnCode>"
+            f"<jnet-m:BackendSystemReturnText>{activity_text('completed', self.docket_number(index))}</jnet-m:BackendSystemReturnText>"
+            f"</jnet-m:BackendSystemReturn></jnet-m:ResponseMetadata>"
+            f"{self.court_case_event(index, **sizes)}"
+            f"</m:ReceiveCourtCaseEventReply>"
+        ))
+
+    #----------------------
+    # RequestCourtCaseEventInfoResponse
+    #----------------------
+
+    def status_record(self, index:int, kind:str = None, tracking_id:str = None):
+        """ A `RequestCourtCaseEventInfoMetadata` element for the request at `index`.
+
+        Args:
+            index: The request index, which is also the FileTrackingID.
+            kind: One of the `STATUS_KINDS`. If not provided, it is drawn at random with the default weights.
+            tracking_id: The UserDefinedTrackingID. Default is 'synthetic-{index}'.
+        """
+        rng = self.rng('status', index)
+        if kind is None:
+            kind = rng.choices(list(STATUS_KINDS), weights = list(STATUS_KINDS.values()))[0]
+        if tracking_id is None:
+            tracking_id = f"synthetic-{index}"
+
+        if kind == 'participant':
+            text = activity_text('completed', participant = self.participant(rng))
+        elif kind == 'participant_not_found':
+            text = activity_text('not_found', participant = self.participant(rng))
+        elif kind == 'invalid':
+            text = activity_text(kind, f"CP-51-CR-{index}-{self.year % 100}")
+        elif kind in STATUS_KINDS:
+            text = activity_text(kind, self.docket_number(index))
+        else:
+            raise ValueError(f"Unknown status kind '{kind}' - must be one of {', '.join(STATUS_KINDS)}")
+
+        created = datetime.datetime(self.year, 1, 1) + datetime.timedelta(seconds = rng.randint(0, 365 * 86400))
+        return(info_metadata(str(index), tracking_id, text, created))
+
+    def status_listing(self, records:int = 100, start:int = 0, kinds = None):
+        """ A complete `RequestCourtCaseEventInfoResponse` envelope.
+
+        Args:
+            records: The number of status records to list. JNET lists at most 500. Default is 100.
+            start: The index of the first record. Default is 0.
+            kinds: A list of kinds to cycle through, i.e. `['completed', 'queued']`. Default is to draw each kind at random, weighted as in `STATUS_KINDS`.
+        Returns:
+            The xml as a string.
+        """
+        body = ''.join(
+            self.status_record(index, kinds[(index - start) % len(kinds)] if kinds else None)
+            for index in range(start, start + records)
+        )
+        return(envelope(
+            f"<m:RequestCourtCaseEventInfoResponse><jnet-m:RecordCount>{records}</jnet-m:RecordCount>"
+            f"{body}</m:RequestCourtCaseEventInfoResponse>"
+        ))
+
+    #----------------------
+    # Corpora
+    #----------------------
+
+    def corpus(self, count:int, start:int = 0):
+        """ Iterate over (docket_number, ReceiveCourtCaseEventReply xml) for `count` dockets. """
+        for index in range(start, start + count):
+            yield((self.docket_number(index), self.court_case_event_reply(index)))
+
+    def write_corpus(self, path:str, count:int, start:int = 0):
+        """ Write `count` synthetic docket replies to disk.
+
+        Args:
+            path: Either a directory, which will get one `{docket_number}.xml` file per docket, or a line-delimited json file (i.e. `corpus.jsonl.gz`) with one `{"docket_number": ..., "xml": ...}` record per docket.
+            count: The number of dockets.
+            start: The index of the first docket. Default is 0.
+        Returns:
+            The number of bytes of xml written.
+        """
+        from . import output
+
+        written = 0
+        if output.is_ndjson_path(path):
+            with output.NDJSONWriter(path) as writer:
+                for docket_number, xml in self.corpus(count, start):
+                    writer.write({'docket_number': docket_number, 'xml': xml})
+                    written += len(xml.encode('utf-8'))
+            return(written)
+
+        os.makedirs(path, exist_ok = True)
+        for docket_number, xml in self.corpus(count, start):
+            with open(os.path.join(path, docket_number + '.xml'), 'wb') as fh:
+                written += fh.write(xml.encode('utf-8'))
+        return(written)
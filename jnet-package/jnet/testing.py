@@ -0,0 +1,704 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+import os
+import re
+import sys
+import ssl
+import queue
+import socket
+import selectors
+import time
+import random
+import datetime
+import tempfile
+import threading
+import collections
+import http.server
+import gzip
+import zlib
+from xml.sax.saxutils import escape
+
+import lxml.etree
+
+from . import synthetic
+from .concurrency import CLIENT_FAULTS
+from .synthetic import SOAP_NS, MESSAGE_NS, METADATA_NS, EXTENSION_NS, NIEM_CORE_NS
+
+# a permissive check of the docket number structure, i.e. CP-51-CR-0000001-2022 or MJ-20301-CR-0000042-2020
+DOCKET_RE = re.compile(r'^[A-Z]{2}-\d{2,5}-[A-Z]{2}-\d{7}-\d{4}$')
+
+def create_test_certificate(path:str, password:str = 'jnet-test'):
+    """ Write a self-signed PKCS12 (`.pfx`) client certificate, suitable for signing requests to a mock server.
+
+    Args:
+        path: The file to write.
+        password: The password to encrypt the certificate with. Default is 'jnet-test'.
+    Returns:
+        The path to the certificate.
+    """
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.hazmat.primitives.serialization import pkcs12
+
+    key = rsa.generate_private_key(public_exponent = 65537, key_size = 2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "jnet-test-client")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(x509.random_serial_number()).not_valid_before(
+        now - datetime.timedelta(days = 1)
+    ).not_valid_after(
+        now + datetime.timedelta(days = 30)
+    ).sign(key, hashes.SHA256())
+
+    with open(path, 'wb') as fh:
+        fh.write(pkcs12.serialize_key_and_certificates(
+            b"jnet-test-client", key, cert, None, serialization.BestAvailableEncryption(password.encode('utf-8'))
+        ))
+    return(path)
+
+def create_server_certificate(certfile:str, keyfile:str, hostnames = ('localhost', '127.0.0.1')):
+    """ Write a self-signed server certificate and its private key in PEM format, for serving https from a mock server.
+
+    Args:
+        certfile: The certificate file to write. This doubles as the CA bundle for clients to verify the server.
+        keyfile: The private key file to write.
+        hostnames: The host names and IP addresses the certificate is valid for.
+    Returns:
+        The path to the certificate.
+    """
+    import ipaddress
+    from cryptography import x509
+    from cryptography.x509.oid import NameOID
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+
+    names = []
+    for hostname in hostnames:
+        try:
+            names.append(x509.IPAddress(ipaddress.ip_address(hostname)))
+        except ValueError:
+            names.append(x509.DNSName(hostname))
+
+    # an RSA key like the JNET endpoints, so the handshake cost is representative
+    key = rsa.generate_private_key(public_exponent = 65537, key_size = 2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostnames[0])])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = x509.CertificateBuilder().subject_name(name).issuer_name(name).public_key(
+        key.public_key()
+    ).serial_number(x509.random_serial_number()).not_valid_before(
+        now - datetime.timedelta(days = 1)
+    ).not_valid_after(
+        now + datetime.timedelta(days = 30)
+    ).add_extension(
+        x509.SubjectAlternativeName(names), critical = False
+    ).add_extension(
+        x509.BasicConstraints(ca = True, path_length = None), critical = True
+    ).sign(key, hashes.SHA256())
+
+    with open(keyfile, 'wb') as fh:
+        fh.write(key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()))
+    with open(certfile, 'wb') as fh:
+        fh.write(cert.public_bytes(serialization.Encoding.PEM))
+    return(certfile)
+
+
+class MockFile():
+    """ A file in the mock server's request queue. """
+
+    def __init__(self, file_id, tracking_id, kind, ready_at, docket_number = None, otn = None, participant = None):
+        self.file_id = file_id
+        self.tracking_id = tracking_id
+        self.kind = kind
+        self.ready_at = ready_at
+        self.docket_number = docket_number
+        self.otn = otn
+        self.participant = participant
+        self.retrieved = False
+        self.created = datetime.datetime.now()
+
+    @property
+    def activity_text(self):
+        """ The `ActivityTypeText` header for the file in a RequestCourtCaseEventInfo listing. """
+        return(synthetic.activity_text(self.kind, self.docket_number, otn = self.otn, participant = self.participant))
+
+
+class MockJNET():
+    """ A local stand-in for the JNET Court Case Event (CCE) request-reply service.
+
+    The server implements RequestCourtCaseEvent, RequestCourtCaseEventInfo and ReceiveCourtCaseEvent
+    well enough for the `CCE` client to run its full request - poll - retrieve cycle without a network
+    or credentials, which makes it useful for offline tests and for benchmarking batch throughput and
+    concurrency. Signatures are not verified.
+
+    Each docket request adds a file to a pending queue that becomes visible to status requests after
+    `turnaround` seconds, the way AOPC takes a while to fulfill a request. Dockets listed in `queued`
+    first produce a "Queued" file and then a completed file after `queued_turnaround` seconds; dockets
+    in `not_found` produce a "DOCKET NOT FOUND" file, and malformed docket numbers (or those listed in
+    `invalid`) produce an "Invalid Request Object!" file.
+
+    Constructor Args:
+        turnaround: Seconds before a requested docket appears in the status listing. Default is 0.
+        queued: Docket numbers that are queued before they are completed.
+        queued_turnaround: Seconds before a queued docket is completed. Default is 2x the turnaround.
+        not_found: Docket numbers that AOPC does not find.
+        invalid: Docket numbers that AOPC rejects as invalid, in addition to malformed docket numbers.
+        latency: Seconds to wait before answering any request, a dict of operation name -> seconds, or a callable that takes the operation name and returns the seconds, i.e. to add occasional slow replies. This can be changed while the server is running to inject slowdowns.
+        fault_rate: The probability (0-1) that a request fails with a SOAP Fault. Default is 0.
+        seed: A seed for the random fault injection.
+        host: The interface to listen on. Default is 127.0.0.1
+        port: The port to listen on. Default is 0, i.e. any free port.
+        tls: If True, serve https with a throwaway self-signed certificate, which `client()` configures as the server certificate. Default is False.
+        http2: If True, also offer HTTP/2 during the TLS handshake, so clients that support it multiplex their requests over one connection. Requires `tls` and the `h2` package. Default is False.
+        compress: If True, gzip the replies to clients that accept it, as with `Accept-Encoding: gzip`. Request bodies sent with a gzip or deflate `Content-Encoding` are always accepted. Default is False.
+
+    Usage:
+        with jnet.testing.MockJNET(turnaround = 1, not_found = ['CP-51-CR-0000001-2022']) as server:
+            client = server.client()
+            data = client.fetch_docket_data('CP-51-CR-0000002-2022')
+
+    The server records `counts` of requests per operation and the `peak_in_flight` number of
+    concurrent requests, to check the concurrency a client actually achieved. With `tls`, it also
+    counts `handshakes` as 'full' or 'resumed', and the negotiated `protocols` of each connection. The
+    `request_encodings` and `response_encodings` count the content encoding of every request and reply.
+    """
+
+    url_path = "/AOPC/CCERequest"
+
+    def __init__(
+        self,
+        turnaround:float = 0,
+        queued = (),
+        queued_turnaround:float = None,
+        not_found = (),
+        invalid = (),
+        latency = 0,
+        fault_rate:float = 0,
+        seed = None,
+        host:str = '127.0.0.1',
+        port:int = 0,
+        tls:bool = False,
+        http2:bool = False,
+        compress:bool = False,
+    ):
+        if http2 and not tls:
+            raise ValueError("http2 requires tls, as HTTP/2 is negotiated during the TLS handshake")
+        self.turnaround = turnaround
+        self.queued = set(queued)
+        self.queued_turnaround = queued_turnaround if queued_turnaround is not None else turnaround * 2
+        self.not_found = set(not_found)
+        self.invalid = set(invalid)
+        self.latency = latency
+        self.fault_rate = fault_rate
+        self.host = host
+        self.port = port
+        self.tls = tls
+        self.http2 = http2
+        self.compress = compress
+        self.server_certificate = None
+
+        self.files = collections.OrderedDict()
+        self.counts = collections.Counter()
+        self.handshakes = collections.Counter()
+        self.protocols = collections.Counter()
+        self.request_encodings = collections.Counter()
+        self.response_encodings = collections.Counter()
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+        self._random = random.Random(seed)
+        self._faults = collections.deque()
+        self._next_file_id = 1000
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+        self._tempdir = None
+
+    #----------------------
+    # Server lifecycle
+    #----------------------
+
+    def start(self):
+        """ Start serving requests in a background thread. Returns the server. """
+        mock = self
+
+        class Handler(MockJNETHandler):
+            server_mock = mock
+
+        class Server(http.server.ThreadingHTTPServer):
+            # the default backlog of 5 resets connections when a worker pool connects all at once
+            request_queue_size = 128
+
+            def handle_error(self, request, client_address):
+                # clients that reject the certificate or hang up are not errors in the mock
+                if not isinstance(sys.exc_info()[1], (ssl.SSLError, ConnectionError)):
+                    super().handle_error(request, client_address)
+
+        self._server = Server((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        if self.tls:
+            self.server_certificate = os.path.join(self.tempdir, 'mock_server.crt')
+            keyfile = os.path.join(self.tempdir, 'mock_server.key')
+            create_server_certificate(self.server_certificate, keyfile, hostnames = ('localhost', self.host))
+            context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            context.load_cert_chain(self.server_certificate, keyfile)
+            if self.http2:
+                import h2
+                context.set_alpn_protocols(['h2', 'http/1.1'])
+            # the handshake happens in the request thread, so that one slow client does not hold up the others
+            self._server.socket = context.wrap_socket(self._server.socket, server_side = True, do_handshake_on_connect = False)
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target = self._server.serve_forever, name = 'MockJNET', daemon = True)
+        self._thread.start()
+        return(self)
+
+    def stop(self):
+        """ Stop the server and remove any temporary files. """
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if self._tempdir:
+            self._tempdir.cleanup()
+            self._tempdir = None
+
+    def __enter__(self):
+        return(self.start())
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def endpoint(self):
+        """ The endpoint to provide to the client, i.e. 'http://127.0.0.1:8080/' """
+        return(f"{'https' if self.tls else 'http'}://{self.host}:{self.port}/")
+
+    @property
+    def tempdir(self):
+        """ A temporary directory for the generated certificates, removed when the server stops. """
+        if not self._tempdir:
+            self._tempdir = tempfile.TemporaryDirectory(prefix = 'jnet-mock-')
+        return(self._tempdir.name)
+
+    def client(self, cls = None, **kwargs):
+        """ Build a client that sends its requests to this server.
+
+        A throwaway client certificate is generated, and the poll intervals of `fetch_docket_data` are scaled down to the server's turnaround.
+
+        Args:
+            cls: The client class. Default is `jnet.CCE`.
+            **kwargs: Any additional arguments for the client constructor.
+        """
+        if cls is None:
+            from .cce_client import CCE as cls
+
+        client_certificate = os.path.join(self.tempdir, 'mock_webservice.pfx')
+        if not os.path.exists(client_certificate):
+            create_test_certificate(client_certificate, 'jnet-test')
+
+        params = {
+            'config': {},
+            'client_certificate': client_certificate,
+            'client_password': 'jnet-test',
+            'user_id': 'MOCK-USER',
+            'endpoint': self.endpoint,
+            'server_certificate': self.server_certificate if self.tls else False,
+        }
+        params.update(kwargs)
+        client = cls(**params)
+        client.poll_delay = min(client.poll_delay, max(self.turnaround, 0.05))
+        client.poll_interval = min(client.poll_interval, max(self.turnaround / 4, 0.05))
+        return(client)
+
+    #----------------------
+    # Scripting behavior
+    #----------------------
+
+    def fail_next(self, count:int = 1, faultstring:str = 'Internal_Error', detail:str = 'Mock fault', status:int = 500, faultcode:str = None):
+        """ Make the next `count` requests fail with a SOAP Fault.
+
+        Args:
+            count: The number of requests to fail.
+            faultstring: The fault string, i.e. 'Authentication_Error' or 'Validation_Error' to trigger those specific client errors.
+            detail: The `ErrorModuleText` of the fault detail.
+            status: The http status code. Default is 500.
+            faultcode: 'Server' or 'Client'. Default is 'Client' for the request errors in `jnet.concurrency.CLIENT_FAULTS` and 'Server' otherwise.
+        """
+        if faultcode is None:
+            faultcode = 'Client' if faultstring in CLIENT_FAULTS else 'Server'
+        with self._lock:
+            for _ in range(count):
+                self._faults.append((status, faultcode, faultstring, detail))
+
+    def pending(self):
+        """ The files that have not yet been retrieved. """
+        with self._lock:
+            return([f for f in self.files.values() if not f.retrieved])
+
+    def reset(self):
+        """ Clear the request queue and statistics. """
+        with self._lock:
+            self.files.clear()
+            self.counts.clear()
+            self.handshakes.clear()
+            self.protocols.clear()
+            self.request_encodings.clear()
+            self.response_encodings.clear()
+            self._faults.clear()
+            self.peak_in_flight = 0
+
+    #----------------------
+    # Request handling
+    #----------------------
+
+    def _latency_for(self, operation):
+        if callable(self.latency):
+            return(self.latency(operation))
+        if type(self.latency) is dict:
+            return(self.latency.get(operation, 0))
+        return(self.latency)
+
+    def _add_file(self, tracking_id, kind, ready_at, **kwargs):
+        self._next_file_id += 1
+        mockfile = MockFile(str(self._next_file_id), tracking_id, kind, ready_at, **kwargs)
+        self.files[mockfile.file_id] = mockfile
+        return(mockfile)
+
+    def handle(self, body:bytes):
+        """ Process a raw SOAP request body and return a tuple of (http status, response xml). """
+        envelope = lxml.etree.fromstring(body)
+        soap_body = envelope.find(f"{{{SOAP_NS}}}Body")
+        if soap_body is None or not len(soap_body):
+            return(self.fault(500, 'Client', 'Invalid_Request', 'No SOAP Body in request'))
+
+        request = soap_body[0]
+        operation = lxml.etree.QName(request).localname
+        fields = {}
+        for element in request.iter():
+            if type(element.tag) is str and element.text and element.text.strip():
+                fields.setdefault(lxml.etree.QName(element).localname, element.text.strip())
+
+        with self._lock:
+            self.counts[operation] += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            fault = self._faults.popleft() if self._faults else None
+
+        try:
+            delay = self._latency_for(operation)
+            if delay:
+                time.sleep(delay)
+
+            if fault:
+                return(self.fault(*fault))
+            elif self.fault_rate and self._random.random() < self.fault_rate:
+                return(self.fault(500, 'Server', 'Internal_Error', 'Randomly injected mock fault'))
+
+            if operation == 'RequestCourtCaseEvent':
+                return(self.request_court_case_event(fields))
+            elif operation == 'RequestCourtCaseEventInfo':
+                return(self.request_court_case_event_info(fields))
+            elif operation == 'ReceiveCourtCaseEvent':
+                return(self.receive_court_case_event(fields))
+            return(self.fault(500, 'Client', 'Invalid_Request', f"Unknown operation {operation}"))
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def request_court_case_event(self, fields):
+        tracking_id = fields.get('UserDefinedTrackingID')
+        now = time.time()
+        with self._lock:
+            if 'CaseDocketID' in fields:
+                docket_number = fields['CaseDocketID']
+                if docket_number in self.invalid or not DOCKET_RE.fullmatch(docket_number):
+                    self._add_file(tracking_id, 'invalid', now + self.turnaround, docket_number = docket_number)
+                elif docket_number in self.not_found:
+                    self._add_file(tracking_id, 'not_found', now + self.turnaround, docket_number = docket_number)
+                elif docket_number in self.queued:
+                    self._add_file(tracking_id, 'queued', now + self.turnaround, docket_number = docket_number)
+                    self._add_file(tracking_id, 'completed', now + self.queued_turnaround, docket_number = docket_number)
+                else:
+                    self._add_file(tracking_id, 'completed', now + self.turnaround, docket_number = docket_number)
+            elif 'PersonSurName' in fields:
+                participant = {
+                    'FirstName': fields.get('PersonGivenName', ''),
+                    'LastName': fields['PersonSurName'],
+                    'BirthDate': fields.get('Date', ''),
+                }
+                kind = 'not_found' if participant['LastName'] in self.not_found else 'completed'
+                self._add_file(tracking_id, kind, now + self.turnaround, participant = participant)
+            elif 'IdentificationID' in fields:
+                self._add_file(tracking_id, 'completed', now + self.turnaround, otn = fields['IdentificationID'])
+            else:
+                return(self.fault(500, 'Client', 'Invalid_Request', 'No docket number, OTN, or participant in the request'))
+
+        return(200, self.envelope(
+            f"<m:RequestCourtCaseEventResponse>"
+            f"<m:ResponseStatusCode>SUCCESS</m:ResponseStatusCode>"
+            f"<m:ResponseStatusDescriptionText>CCE request queued to AOPC.</m:ResponseStatusDescriptionText>"
+            f"</m:RequestCourtCaseEventResponse>"
+        ))
+
+    def request_court_case_event_info(self, fields):
+        tracking_id = fields.get('UserDefinedTrackingID')
+        pending_only = fields.get('PendingOnly', 'true').lower() == 'true'
+        record_limit = int(fields.get('RecordLimit', 500))
+        now = time.time()
+
+        with self._lock:
+            matches = [
+                f for f in self.files.values()
+                if f.ready_at <= now
+                and (not pending_only or not f.retrieved)
+                and (not tracking_id or f.tracking_id == tracking_id)
+            ][:record_limit]
+
+        return(200, self.envelope(
+            f"<m:RequestCourtCaseEventInfoResponse>"
+            f"<jnet-m:RecordCount>{len(matches)}</jnet-m:RecordCount>"
+            + ''.join(self.info_metadata(f) for f in matches) +
+            f"</m:RequestCourtCaseEventInfoResponse>"
+        ))
+
+    def info_metadata(self, mockfile):
+        """ The `RequestCourtCaseEventInfoMetadata` element for a file. """
+        return(synthetic.info_metadata(mockfile.file_id, escape(mockfile.tracking_id or ''), escape(mockfile.activity_text), mockfile.created))
+
+    def receive_court_case_event(self, fields):
+        file_id = fields.get('FileTrackingID')
+        with self._lock:
+            mockfile = self.files.get(file_id)
+            if mockfile and mockfile.ready_at > time.time():
+                # not yet fulfilled, so it does not exist as far as the client can tell
+                mockfile = None
+            if mockfile:
+                mockfile.retrieved = True
+
+        if not mockfile:
+            return(200, self.envelope(
+                f"<m:ReceiveCourtCaseEventReply>"
+                f"<jnet-m:ResponseMetadata><jnet-m:ResponseActionText>No Record Found.</jnet-m:ResponseActionText></jnet-m:ResponseMetadata>"
+                f"<m:ResponseStatusCode>ERROR</m:ResponseStatusCode>"
+                f"<jnet-m:ResponseActionText>No Record Found.</jnet-m:ResponseActionText>"
+                f"</m:ReceiveCourtCaseEventReply>"
+            ))
+
+        if mockfile.kind in ('completed', 'queued'):
+            return_code = 'SUCCESS'
+            body = self.court_case_event(mockfile)
+        else:
+            return_code = 'FAILURE'
+            if mockfile.kind == 'invalid':
+                reason = f"Invalid Request Object! Docket Number not supported! {mockfile.docket_number}"
+            elif mockfile.participant:
+                reason = "PARTICIPANT NOT FOUND"
+            else:
+                reason = f"DOCKET NOT FOUND: {mockfile.docket_number}"
+            body = f"<m:AOPCFault><m:Code>aopc:error</m:Code><m:Reason>{escape(reason)}</m:Reason></m:AOPCFault>"
+
+        return(200, self.envelope(
+            f"<m:ReceiveCourtCaseEventReply>"
+            f"<jnet-m:ResponseMetadata>"
+            f"<jnet-m:UserDefinedTrackingID>{escape(mockfile.tracking_id or '')}</jnet-m:UserDefinedTrackingID>"
+            f"<jnet-m:BackendSystemReturn>"
+            f"<jnet-m:BackendSystemName>AOPC</jnet-m:BackendSystemName>"
+            f"<jnet-m:BackendSystemReturnCode>{return_code}</jnet-m:BackendSystemReturnCode>"
+            f"<jnet-m:BackendSystemReturnText>{escape(mockfile.activity_text if return_code == 'SUCCESS' else reason)}</jnet-m:BackendSystemReturnText>"
+            f"</jnet-m:BackendSystemReturn>"
+            f"</jnet-m:ResponseMetadata>"
+            f"{body}"
+            f"</m:ReceiveCourtCaseEventReply>"
+        ))
+
+    def court_case_event(self, mockfile):
+        """ A minimal `CourtCaseEvent` element for a completed file. """
+        identifier = mockfile.docket_number or mockfile.otn or mockfile.participant['LastName']
+        return(
+            f"<pac:CourtCaseEvent xmlns:pac=\"{EXTENSION_NS}\" xmlns:nc=\"{NIEM_CORE_NS}\">"
+            f"<pac:CaseDocketID><nc:ID>{escape(identifier)}</nc:ID></pac:CaseDocketID>"
+            f"<pac:CaseStatus><nc:StatusDescriptionText>{'Queued' if mockfile.kind == 'queued' else 'Active'}</nc:StatusDescriptionText></pac:CaseStatus>"
+            f"</pac:CourtCaseEvent>"
+        )
+
+    def envelope(self, body:str):
+        """ Wrap the body xml in a SOAP envelope. """
+        return(synthetic.envelope(body))
+
+    def fault(self, status:int, faultcode:str, faultstring:str, detail:str):
+        """ Return a tuple of (http status, SOAP Fault xml). """
+        return(status, self.envelope(
+            f"<soap:Fault>"
+            f"<faultcode>soap:{faultcode}</faultcode>"
+            f"<faultstring>{escape(faultstring)}</faultstring>"
+            f"<detail><jnet-m:JNETFaultDetail><jnet-m:ErrorModuleText>{escape(detail)}</jnet-m:ErrorModuleText></jnet-m:JNETFaultDetail></detail>"
+            f"</soap:Fault>"
+        ))
+
+
+class MockJNETHandler(http.server.BaseHTTPRequestHandler):
+    """ The http request handler for `MockJNET`. The `server_mock` class attribute is set to the server. """
+
+    server_mock = None
+    protocol_version = 'HTTP/1.1'
+    # the headers and body are written separately, which Nagle's algorithm would hold up by a delayed ACK on kept-alive connections
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        if isinstance(self.request, ssl.SSLSocket):
+            self.request.do_handshake()
+            with self.server_mock._lock:
+                self.server_mock.handshakes['resumed' if self.request.session_reused else 'full'] += 1
+        super().setup()
+
+    def handle(self):
+        protocol = self.request.selected_alpn_protocol() if isinstance(self.request, ssl.SSLSocket) else None
+        with self.server_mock._lock:
+            self.server_mock.protocols[protocol or 'http/1.1'] += 1
+        if protocol == 'h2':
+            self.handle_h2()
+        else:
+            super().handle()
+
+    def reply(self, path:str, body:bytes, headers):
+        """ The reply to a request body posted to `path`, as (status, payload, content encoding).
+
+        The body is decoded according to its `Content-Encoding`, and the reply is gzipped if the server
+        `compress`es and the `Accept-Encoding` allows it, in which case the content encoding is 'gzip'.
+        """
+        mock = self.server_mock
+        encoding = (headers.get('content-encoding') or 'identity').strip().lower()
+        if encoding == 'gzip':
+            body = gzip.decompress(body)
+        elif encoding == 'deflate':
+            body = zlib.decompress(body)
+
+        if path.rstrip('/') != mock.url_path:
+            status, xml = mock.fault(404, 'Client', 'Not_Found', f"No service at {path}")
+        else:
+            status, xml = mock.handle(body)
+
+        payload = xml.encode('utf-8')
+        accepted = {e.split(';')[0].strip().lower() for e in (headers.get('accept-encoding') or '').split(',')}
+        reply_encoding = 'gzip' if mock.compress and 'gzip' in accepted else 'identity'
+        if reply_encoding == 'gzip':
+            payload = gzip.compress(payload, compresslevel = 6)
+        with mock._lock:
+            mock.request_encodings[encoding] += 1
+            mock.response_encodings[reply_encoding] += 1
+        return(status, payload, reply_encoding)
+
+    def handle_h2(self):
+        """ Serve an HTTP/2 connection, answering each stream in its own thread so that requests are handled concurrently.
+
+        All socket I/O stays on this thread, as an SSL socket cannot be read and written from different threads at
+        once; finished replies are queued and the thread is woken through a socket pair.
+        """
+        import h2.config
+        import h2.events
+        import h2.connection
+
+        sock = self.request
+        conn = h2.connection.H2Connection(config = h2.config.H2Configuration(client_side = False, header_encoding = 'utf-8'))
+        conn.initiate_connection()
+        sock.sendall(conn.data_to_send())
+
+        replies = queue.Queue()
+        wake_read, wake_write = socket.socketpair()
+        selector = selectors.DefaultSelector()
+        selector.register(sock, selectors.EVENT_READ)
+        selector.register(wake_read, selectors.EVENT_READ)
+        requests = {}
+        unsent = {}
+
+        def answer(stream_id, headers, body):
+            replies.put((stream_id,) + self.reply(headers.get(':path', '/'), body, headers))
+            wake_write.send(b'.')
+
+        try:
+            while True:
+                # data already decrypted by the ssl layer does not show up in select
+                ready = [sock] if sock.pending() else [key.fileobj for key, mask in selector.select()]
+                if wake_read in ready:
+                    wake_read.recv(4096)
+                if sock in ready:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    for event in conn.receive_data(data):
+                        if isinstance(event, h2.events.RequestReceived):
+                            requests[event.stream_id] = (dict(event.headers), [])
+                        elif isinstance(event, h2.events.DataReceived):
+                            requests[event.stream_id][1].append(event.data)
+                            conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                        elif isinstance(event, h2.events.StreamEnded):
+                            headers, body = requests.pop(event.stream_id)
+                            threading.Thread(target = answer, args = (event.stream_id, headers, b''.join(body)), daemon = True).start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+
+                while not replies.empty():
+                    stream_id, status, payload, encoding = replies.get()
+                    headers = [(':status', str(status)), ('content-type', 'text/xml; charset=utf-8'), ('content-length', str(len(payload)))]
+                    if encoding != 'identity':
+                        headers.append(('content-encoding', encoding))
+                    conn.send_headers(stream_id, headers)
+                    unsent[stream_id] = payload
+
+                # send as much of each reply as the flow control windows allow
+                for stream_id, payload in list(unsent.items()):
+                    while payload:
+                        size = min(conn.local_flow_control_window(stream_id), conn.max_outbound_frame_size, len(payload))
+                        if size <= 0:
+                            break
+                        conn.send_data(stream_id, payload[:size])
+                        payload = payload[size:]
+                    if payload:
+                        unsent[stream_id] = payload
+                    else:
+                        conn.end_stream(stream_id)
+                        del unsent[stream_id]
+
+                outgoing = conn.data_to_send()
+                if outgoing:
+                    sock.sendall(outgoing)
+        finally:
+            selector.close()
+            wake_read.close()
+            wake_write.close()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_xml(*self.reply(self.path, body, self.headers))
+
+    def send_xml(self, status, payload:bytes, encoding:str = 'identity'):
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml; charset=utf-8')
+        if encoding != 'identity':
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # keep test and benchmark output quiet
+        pass
@@ -0,0 +1,307 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Tracing spans for jnet requests.
+
+A client's `tracer` opens a `jnet.fetch_docket_data` span for every docket fetched, with a child span for
+each SOAP call (i.e. `jnet RequestCourtCaseEventInfo`), which in turn has `jnet.sign`, `jnet.network` and
+`jnet.parse` child spans. The default tracer does nothing. Use `RecordingTracer` with a
+`JSONLinesSpanExporter` to write spans to a file for offline analysis, or `OpenTelemetryTracer` to send
+them through an existing OpenTelemetry setup.
+
+Spans use the OpenTelemetry data model - 128-bit trace ids, 64-bit span ids, nanosecond unix timestamps,
+and an OK/ERROR status - so exported files can be converted or loaded alongside other traces.
+
+```python
+tracer = jnet.tracing.RecordingTracer(jnet.tracing.JSONLinesSpanExporter('spans.jsonl'))
+jnetclient = jnet.CCE(tracer = tracer)
+jnetclient.fetch_docket_data('CP-51-CR-0000100-2021')
+tracer.close()
+```
+"""
+
+import time
+import random
+import threading
+import contextlib
+import contextvars
+
+# the active span for the current thread/context, for the tracers in this module
+_current_span = contextvars.ContextVar('jnet_current_span', default = None)
+
+def error_message(error:Exception):
+    """ The first line of an error's message, prefixed with its type, i.e. 'NotFound: Docket not found'.
+
+    This is built from the error's first argument rather than `str(error)`, so that recording an error
+    does not render the details a `jnet.exceptions.JNETError` only adds to its message when it is used.
+    """
+    message = str(error.args[0]) if error.args else ''
+    return(f"{type(error).__name__}: {message}".split("\n")[0])
+
+
+class Span():
+    """ A timed operation in a trace.
+
+    Attributes:
+        name: The span name.
+        trace_id: The 32 character hex id shared by every span in the trace.
+        span_id: The 16 character hex id of this span.
+        parent_id: The span_id of the parent span, or None for a root span.
+        start_time: Start time in nanoseconds since the epoch.
+        end_time: End time in nanoseconds since the epoch, or None if the span has not ended.
+        attributes: dict of span attributes.
+        status: 'OK' or 'ERROR'.
+        status_message: The error description, if the status is 'ERROR'.
+    """
+
+    def __init__(self, tracer, name:str, trace_id:str, parent_id:str = None, attributes:dict = None, start_time:int = None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.attributes = dict(attributes) if attributes else {}
+        self.start_time = start_time if start_time is not None else time.time_ns()
+        self.end_time = None
+        self.status = 'OK'
+        self.status_message = None
+
+    def set_attribute(self, key:str, value):
+        self.attributes[key] = value
+
+    def set_error(self, error:Exception):
+        """ Mark the span as failed because of an exception. """
+        self.status = 'ERROR'
+        self.status_message = error_message(error)
+        self.attributes['exception.type'] = type(error).__name__
+
+    def end(self, end_time:int = None):
+        """ End the span and hand it to the tracer's exporter. Ending a span twice has no effect. """
+        if self.end_time is not None:
+            return
+        self.end_time = end_time if end_time is not None else time.time_ns()
+        self.tracer.export(self)
+
+    @property
+    def duration(self):
+        """ The span duration in seconds, or None if it has not ended. """
+        if self.end_time is None:
+            return(None)
+        return((self.end_time - self.start_time) / 1e9)
+
+    def to_dict(self):
+        return({
+            'name': self.name,
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_span_id': self.parent_id,
+            'start_time_unix_nano': self.start_time,
+            'end_time_unix_nano': self.end_time,
+            'duration_ms': self.duration * 1000 if self.end_time is not None else None,
+            'attributes': self.attributes,
+            'status': {'code': self.status, 'message': self.status_message},
+        })
+
+
+class NoOpSpan():
+    """ The span returned by the no-op tracer, which ignores everything. """
+
+    name = None
+    trace_id = None
+    span_id = None
+
+    def set_attribute(self, key, value):
+        pass
+
+    def set_error(self, error):
+        pass
+
+    def end(self, end_time = None):
+        pass
+
+NOOP_SPAN = NoOpSpan()
+
+
+class Tracer():
+    """ The tracer interface, which is also the default no-op tracer.
+
+    `enabled` is False so that the client can skip building span attributes entirely.
+    """
+
+    enabled = False
+
+    def start_span(self, name:str, attributes:dict = None, start_time:int = None, parent = None):
+        """ Start a span without making it the current span. It must be ended with `span.end()`.
+
+        Args:
+            name: The span name.
+            attributes: dict of initial attributes.
+            start_time: The start time in nanoseconds since the epoch, for spans that are recorded after the fact. Default is now.
+            parent: The parent span. Default is the current span, if there is one.
+        """
+        return(NOOP_SPAN)
+
+    @contextlib.contextmanager
+    def span(self, name:str, attributes:dict = None):
+        """ Context manager that starts a span, makes it the current span (so spans started inside it are its children), and ends it on exit, marking it as failed if an exception is raised. """
+        yield(NOOP_SPAN)
+
+    def close(self):
+        pass
+
+NOOP_TRACER = Tracer()
+
+
+class RecordingTracer(Tracer):
+    """ A tracer that records spans in-process and passes each finished span to an exporter.
+
+    Constructor Args:
+        exporter: A callable that receives each finished `Span`, i.e. a `JSONLinesSpanExporter` or an `InMemorySpanExporter`.
+    """
+
+    enabled = True
+
+    def __init__(self, exporter):
+        self.exporter = exporter
+
+    def start_span(self, name:str, attributes:dict = None, start_time:int = None, parent = None):
+        if parent is None:
+            parent = _current_span.get()
+        if parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = f"{random.getrandbits(128):032x}", None
+        return(Span(self, name, trace_id, parent_id = parent_id, attributes = attributes, start_time = start_time))
+
+    @contextlib.contextmanager
+    def span(self, name:str, attributes:dict = None):
+        span = self.start_span(name, attributes)
+        token = _current_span.set(span)
+        try:
+            yield(span)
+        except BaseException as e:
+            span.set_error(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def export(self, span:Span):
+        self.exporter(span)
+
+    def close(self):
+        if hasattr(self.exporter, 'close'):
+            self.exporter.close()
+
+
+class InMemorySpanExporter():
+    """ Keeps finished spans in a list, i.e. for tests or to analyze a batch in the same process. """
+
+    def __init__(self):
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def __call__(self, span:Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class JSONLinesSpanExporter():
+    """ Writes each finished span as a line of json.
+
+    Constructor Args:
+        path: The output file. Spans are appended if it already exists. A `.gz` or `.zst` suffix compresses the file.
+        flush_every: The number of spans to buffer before writing. Default is 100.
+    """
+
+    def __init__(self, path:str, flush_every:int = 100):
+        from . import output
+        self.path = path
+        self._writer = output.NDJSONWriter(path, flush_every = flush_every, append = True)
+        self._lock = threading.Lock()
+
+    def __call__(self, span:Span):
+        record = span.to_dict()
+        with self._lock:
+            self._writer.write(record)
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+
+
+class OpenTelemetryTracer(Tracer):
+    """ Sends jnet spans through OpenTelemetry, so they join the traces of the application using the client.
+
+    Requires the `opentelemetry-api` package, and an OpenTelemetry SDK configured by the application to actually export anything.
+
+    Constructor Args:
+        tracer: An `opentelemetry.trace.Tracer`. Default is the global tracer provider's tracer for 'jnet'.
+    """
+
+    enabled = True
+
+    def __init__(self, tracer = None):
+        try:
+            from opentelemetry import trace
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError("OpenTelemetryTracer requires the `opentelemetry-api` package: `python3 -m pip install opentelemetry-api`") from None
+        self._trace = trace
+        self.tracer = tracer if tracer is not None else trace.get_tracer('jnet')
+
+    def start_span(self, name:str, attributes:dict = None, start_time:int = None, parent = None):
+        context = self._trace.set_span_in_context(parent._span) if parent is not None else None
+        span = self.tracer.start_span(name, context = context, attributes = attributes, start_time = start_time)
+        return(_OpenTelemetrySpan(span, self._trace))
+
+    @contextlib.contextmanager
+    def span(self, name:str, attributes:dict = None):
+        span = self.start_span(name, attributes)
+        with self._trace.use_span(span._span, end_on_exit = False, record_exception = False, set_status_on_exception = False):
+            try:
+                yield(span)
+            except BaseException as e:
+                span.set_error(e)
+                raise
+            finally:
+                span.end()
+
+
+class _OpenTelemetrySpan():
+    """ Adapts an OpenTelemetry span to the interface of `Span`. """
+
+    def __init__(self, span, trace):
+        self._span = span
+        self._trace = trace
+
+    def set_attribute(self, key:str, value):
+        self._span.set_attribute(key, value)
+
+    def set_error(self, error:Exception):
+        # `record_exception` would call `str(error)`, see `error_message`
+        message = error_message(error)
+        self._span.add_event('exception', {'exception.type': type(error).__name__, 'exception.message': message.split(': ', 1)[1]})
+        self._span.set_status(self._trace.Status(self._trace.StatusCode.ERROR, message))
+
+    def end(self, end_time:int = None):
+        self._span.end(end_time = end_time)
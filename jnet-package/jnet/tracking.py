@@ -0,0 +1,127 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+""" Generating unique tracking ids for requests.
+
+JNET lists and filters requests by their `UserDefinedTrackingID`, so two requests with the same id are
+confused with each other by `check_requests(tracking_id = ...)` and `retrieve_requests`. A date plus a
+random six digit number, as the client used to generate, collides by chance once a day sees thousands of
+requests. A `TrackingIdGenerator` builds each id from the time in UTC, a tag for the worker process,
+and a sequence number:
+
+    2026-10-19-153012-k3x9qa-0000
+
+The worker tag is random per process (and renewed in forked children), or set explicitly, i.e. to the
+index of a worker in a pool, so workers need no coordination; within a worker, the sequence makes every
+id unique. Ids from one worker sort in the order they were generated, and ids from all workers sort by
+time. The time is in UTC, as local time repeats an hour when daylight saving time ends, which would
+break the order. A `prefix` groups a batch's ids together, i.e. to list the batch with
+`check_requests(tracking_id_prefix = ...)`.
+
+```python
+jnetclient = jnet.CCE(tracking_ids = jnet.tracking.TrackingIdGenerator(prefix = 'nightly-'))
+```
+"""
+
+import os
+import time
+import string
+
+from .forksafe import ForkSafe
+
+# the sequence is reset every second, and borrows from the next second if it runs out
+SEQUENCE_DIGITS = 4
+
+_alphabet = string.digits + string.ascii_lowercase
+
+def random_worker_tag(length:int = 6):
+    """ A random base36 tag for a worker, i.e. 'k3x9qa'. Six characters give about two billion tags. """
+    value = int.from_bytes(os.urandom(8), 'big')
+    tag = ''
+    for _ in range(length):
+        value, digit = divmod(value, 36)
+        tag += _alphabet[digit]
+    return(tag)
+
+
+class TrackingIdGenerator(ForkSafe):
+    """ A callable that returns a new tracking id each time it is called. Safe to share between threads.
+
+    Constructor Args:
+        prefix: A string put in front of every id, i.e. the name of a batch. Default is ''.
+        worker: A tag for this worker, which must be unique among the workers generating ids at the same time. Default is a random tag for the process, which is renewed in forked children and when the generator is unpickled in another process.
+
+    Attributes:
+        prefix: The prefix of every id.
+        worker: The worker tag.
+    """
+
+    def __init__(self, prefix:str = '', worker:str = None):
+        if worker is not None and '-' in worker:
+            raise ValueError(f"The worker tag cannot include a '-', as it separates the parts of the id: {worker!r}")
+        self.prefix = prefix
+        self.worker = worker if worker is not None else random_worker_tag()
+        self._random_worker = worker is None
+        self._second = 0
+        self._sequence = 0
+        self._init_fork_safe()
+
+    def __setstate__(self, state):
+        super().__setstate__(state)
+        if self._random_worker:
+            # the copy may be used alongside the original, i.e. in a worker process
+            self.worker = random_worker_tag()
+
+    def after_fork(self):
+        """ Called in a forked child, which must not share a random worker tag with its parent. """
+        super().after_fork()
+        if self._random_worker:
+            self.worker = random_worker_tag()
+
+    def __call__(self):
+        with self._lock:
+            second = int(time.time())
+            if second > self._second:
+                self._second = second
+                self._sequence = 0
+            elif self._sequence >= 10 ** SEQUENCE_DIGITS:
+                # out of sequence numbers for this second, so continue in the next one
+                self._second += 1
+                self._sequence = 0
+            # otherwise the clock is in the same second, or went back, and the sequence keeps the ids in order
+            sequence = self._sequence
+            self._sequence += 1
+            stamp = time.strftime('%Y-%m-%d-%H%M%S', time.gmtime(self._second))
+        return(f"{self.prefix}{stamp}-{self.worker}-{sequence:0{SEQUENCE_DIGITS}d}")
+
+    def batch(self, name:str):
+        """ A generator for a batch, whose ids start with this generator's prefix and then `name`.
+
+        Args:
+            name: The name of the batch, i.e. 'nightly-2026-10-19'.
+        Returns:
+            A `TrackingIdGenerator` with the same worker tag, and the prefix `{prefix}{name}-`.
+        """
+        generator = TrackingIdGenerator(prefix = f"{self.prefix}{name}-", worker = self.worker)
+        generator._random_worker = self._random_worker
+        return(generator)
+
+
+# the generator used by clients that are not given their own
+default_generator = TrackingIdGenerator()
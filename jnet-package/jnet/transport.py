@@ -0,0 +1,564 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+import time
+import gzip
+import datetime
+import threading
+import weakref
+import os
+import ssl
+import collections
+import requests
+import requests.adapters
+import lxml.etree
+
+from .exceptions import JNETError
+from . import output
+from .forksafe import ForkSafe
+
+WSSE_NS = "http://docs.oasis-open.org/wss/2004/01/oasis-200401-wss-wssecurity-secext-1.0.xsd"
+METADATA_NS = "http://www.jnet.state.pa.us/niem/jnet/metadata/1"
+
+REDACTED = 'REDACTED'
+
+def operation_name(body:bytes):
+    """ Returns the name of the SOAP operation in a request, i.e. the first element of the SOAP Body. """
+    envelope = lxml.etree.fromstring(body)
+    for element in envelope:
+        if lxml.etree.QName(element).localname == 'Body' and len(element):
+            return(lxml.etree.QName(element[0]).localname)
+    return(None)
+
+
+class Transport():
+    """ The base class for sending SOAP requests to JNET.
+
+    `Client.make_request` builds and signs the envelope and hands the bytes to its transport, so the
+    transport decides how (and whether) the request actually reaches the network. Subclasses implement
+    `send`, which must return an object with the interface of a `requests.Response` - at least
+    `status_code`, `reason`, `ok`, `headers`, `content` and `text`. The `content` is the decoded body,
+    which the client parses as bytes.
+
+    Request bodies are sent uncompressed unless `compress_requests` is set, as JNET does not advertise
+    that it accepts compressed requests; transports that support it gzip any body of at least
+    `compress_min_size` bytes with `compress_body`.
+    """
+
+    compress_requests = False
+    compress_min_size = 1024
+
+    def compress_body(self, body:bytes, headers:dict):
+        """ Gzip the request body if `compress_requests` is set and the body is large enough to benefit.
+
+        Args:
+            body: The serialized SOAP envelope.
+            headers: The http headers to send, which are not modified.
+
+        Returns:
+            A tuple of the body and the headers to send, with `Content-Encoding: gzip` if the body was compressed.
+        """
+        if not self.compress_requests or len(body) < self.compress_min_size:
+            return(body, headers)
+        return(gzip.compress(body, compresslevel = 6), dict(headers, **{'Content-Encoding': 'gzip'}))
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        """ Send the request body to the url and return the response.
+
+        Args:
+            url: The full endpoint url.
+            body: The serialized, signed SOAP envelope.
+            headers: The http headers to send.
+            verify: The server certificate verification setting, as with `Client.server_certificate`.
+        """
+        raise NotImplementedError("send must be implemented in the subclass")
+
+    def close(self):
+        """ Release any resources held by the transport. """
+        pass
+
+
+class ResumingSSLSocket(ssl.SSLSocket):
+    """ An SSLSocket that hands its session back to its `ResumingSSLContext` when it is closed. """
+
+    def close(self):
+        if isinstance(self.context, ResumingSSLContext) and not self.server_side:
+            self.context.save_session(self.server_hostname, self)
+        super().close()
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """ A client `ssl.SSLContext` that resumes TLS sessions when it opens a new connection to a host it has connected to before.
+
+    urllib3 does not pass sessions between connections, so every new pooled connection would otherwise do
+    a full handshake. The context keeps the session (or TLS 1.3 session ticket) of the connections it has
+    wrapped, taken from the sockets that are still open or saved when they are closed, and offers it to the
+    server when it wraps the next connection to the same host.
+    """
+
+    sslsocket_class = ResumingSSLSocket
+
+    def __init__(self, protocol = ssl.PROTOCOL_TLS_CLIENT):
+        self._sessions = {}
+        self._sockets = {}
+        self._session_lock = threading.Lock()
+
+    def save_session(self, host:str, sock):
+        """ Keep the session of a connection to the host, if it can be resumed. """
+        session = sock.session
+        if session is not None and (session.has_ticket or session.id):
+            with self._session_lock:
+                self._sessions[host] = session
+
+    def session_for(self, host:str):
+        """ The most recent resumable session for the host, or None. """
+        for sock in list(self._sockets.get(host, ())):
+            self.save_session(host, sock)
+        with self._session_lock:
+            return(self._sessions.get(host))
+
+    def wrap_socket(self, sock, server_side = False, do_handshake_on_connect = True, suppress_ragged_eofs = True, server_hostname = None, session = None):
+        if server_side:
+            return(super().wrap_socket(sock, server_side, do_handshake_on_connect, suppress_ragged_eofs, server_hostname, session))
+        if session is None:
+            session = self.session_for(server_hostname)
+        sslsock = super().wrap_socket(sock, server_side, do_handshake_on_connect, suppress_ragged_eofs, server_hostname, session)
+        with self._session_lock:
+            self._sockets.setdefault(server_hostname, weakref.WeakSet()).add(sslsock)
+        return(sslsock)
+
+    def forget_sessions(self):
+        """ Drop every saved session. """
+        self._session_lock = threading.Lock()
+        self._sessions = {}
+        self._sockets = {}
+
+
+def create_ssl_context(verify = True):
+    """ Build a `ResumingSSLContext` with the same verification as `requests` would use for `verify`.
+
+    Args:
+        verify: True to verify against the certifi bundle, False to skip verification, or the path to a CA bundle (i.e. the combined JNET certificate chain) or a directory of certificates.
+    """
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    if verify is False:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return(context)
+    if verify is True:
+        import certifi
+        verify = certifi.where()
+    if os.path.isdir(verify):
+        context.load_verify_locations(capath = verify)
+    else:
+        context.load_verify_locations(cafile = verify)
+    return(context)
+
+
+# requests only lets an adapter give urllib3 its own SSLContext from 2.32 on
+_has_pool_key_hook = hasattr(requests.adapters.HTTPAdapter, 'build_connection_pool_key_attributes')
+
+
+class SSLContextAdapter(requests.adapters.HTTPAdapter):
+    """ A requests adapter that connects with a prebuilt SSLContext for each `verify` setting.
+
+    By default, requests hands the CA bundle path to urllib3 for every https connection, which then loads
+    the bundle again for each new connection. This adapter builds one `ResumingSSLContext` per `verify`
+    value (i.e. per endpoint certificate) with the certificates loaded once, and gives it to urllib3
+    instead, so that new connections also resume earlier TLS sessions. With requests older than 2.32, which
+    has no hook for this, it behaves like the stock adapter.
+
+    Constructor Args:
+        **kwargs: The `requests.adapters.HTTPAdapter` arguments, i.e. `pool_maxsize`.
+    """
+
+    def __init__(self, **kwargs):
+        self._contexts = {}
+        self._contexts_lock = threading.Lock()
+        super().__init__(**kwargs)
+
+    def ssl_context(self, verify = True):
+        """ The SSLContext for a `verify` setting, built on first use. """
+        context = self._contexts.get(verify)
+        if context is None:
+            with self._contexts_lock:
+                context = self._contexts.get(verify)
+                if context is None:
+                    context = self._contexts[verify] = create_ssl_context(verify)
+        return(context)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert = None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if host_params['scheme'] == 'https':
+            # urllib3 takes the verification mode from the context when cert_reqs is not given
+            for key in ('cert_reqs', 'ca_certs', 'ca_cert_dir'):
+                pool_kwargs.pop(key, None)
+            pool_kwargs['ssl_context'] = self.ssl_context(verify)
+        return(host_params, pool_kwargs)
+
+    def cert_verify(self, conn, url, verify, cert):
+        # the context already holds the certificates, so they are not set on each connection pool
+        if not _has_pool_key_hook or not url.lower().startswith('https'):
+            super().cert_verify(conn, url, verify, cert)
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state.pop('_contexts', None)
+        state.pop('_contexts_lock', None)
+        return(state)
+
+    def __setstate__(self, state):
+        self._contexts = {}
+        self._contexts_lock = threading.Lock()
+        super().__setstate__(state)
+
+
+class RequestsTransport(Transport, ForkSafe):
+    """ The default transport, which posts requests with a `requests.Session` so connections are pooled and kept alive between calls.
+
+    The session is shared by every thread using the client, so the connection pool is sized for a
+    worker pool: with fewer connections than threads, requests beyond the pool size would open a new
+    connection and discard it afterwards. Https connections use an `SSLContextAdapter`, which loads the
+    server certificates once per `verify` setting and resumes TLS sessions for new connections.
+
+    Constructor Args:
+        timeout: Seconds to wait for the server, or None to wait indefinitely. Default is None.
+        pool_size: The number of connections to keep open per host. Default is 32.
+        compress_requests: If True, gzip request bodies, for servers that accept a compressed request. Default is False.
+    """
+
+    # the session holds the connections, which belong to the parent after a fork
+    _fork_reset = {'_session': lambda: None}
+
+    def __init__(self, timeout:float = None, pool_size:int = 32, compress_requests:bool = False):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.compress_requests = compress_requests
+        self.adapter = SSLContextAdapter(pool_connections = pool_size, pool_maxsize = pool_size)
+        self._session = None
+        self._init_fork_safe()
+
+    def ssl_context(self, verify = True):
+        """ The SSLContext used for https connections with this `verify` setting - see `SSLContextAdapter`. """
+        return(self.adapter.ssl_context(verify))
+
+    def after_fork(self):
+        """ Called in a forked child to drop the session and connection pools inherited from the parent.
+
+        The SSL contexts are kept, as loading the certificates is the expensive part, but not their saved TLS sessions.
+        """
+        super().after_fork()
+        # the adapter holds the connection pools, so it is replaced as well
+        contexts = self.adapter._contexts
+        self.adapter = SSLContextAdapter(pool_connections = self.pool_size, pool_maxsize = self.pool_size)
+        for verify, context in contexts.items():
+            context.forget_sessions()
+            self.adapter._contexts[verify] = context
+
+    @property
+    def session(self):
+        """ The `requests.Session` used to send requests, created on first use. """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    session.mount('https://', self.adapter)
+                    session.mount('http://', self.adapter)
+                    self._session = session
+        return(self._session)
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        body, headers = self.compress_body(body, headers)
+        return(self.session.post(url, data = body, headers = headers, verify = verify, timeout = self.timeout))
+
+    def close(self):
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+                self._session = None
+
+
+class HTTPXTransport(Transport, ForkSafe):
+    """ Sends requests with `httpx`, which can multiplex many concurrent requests over a few HTTP/2 connections.
+
+    HTTP/2 is negotiated with the server during the TLS handshake (ALPN). If the server does not offer
+    it, or the endpoint is plain http, the same connections fall back to HTTP/1.1, so this transport
+    works against any endpoint. Like `RequestsTransport`, it loads the server certificates into one
+    `ResumingSSLContext` per `verify` setting.
+
+    The requests run on an asyncio event loop in a background thread, which every thread using the client
+    hands its request to, as the synchronous httpx client can interleave HTTP/2 frames incorrectly when it
+    is called from several threads at once.
+
+    Requires the `httpx` and `h2` packages: `python3 -m pip install 'httpx[http2]'`.
+
+    Constructor Args:
+        http2: If True, offer HTTP/2 to the server. Default is True.
+        timeout: Seconds to wait for the server, or None to wait indefinitely. Default is None.
+        max_connections: The most connections to open to a host. With HTTP/2, concurrent requests share a connection and new ones are only opened when the server's stream limit is reached, so this mostly matters for the HTTP/1.1 fallback. Default is 32.
+        compress_requests: If True, gzip request bodies, for servers that accept a compressed request. Default is False.
+
+    Attributes:
+        http_versions: A Counter of the http version of every response, i.e. 'HTTP/2' or 'HTTP/1.1'.
+    """
+
+    # the event loop thread does not survive a fork, and the clients' connections belong to the parent
+    _fork_reset = {'_clients': dict, '_loop': lambda: None, '_thread': lambda: None}
+
+    def __init__(self, http2:bool = True, timeout:float = None, max_connections:int = 32, compress_requests:bool = False):
+        try:
+            import httpx
+        except ModuleNotFoundError:
+            raise ModuleNotFoundError("HTTPXTransport requires the `httpx` package: `python3 -m pip install 'httpx[http2]'`") from None
+        if http2:
+            try:
+                import h2
+            except ModuleNotFoundError:
+                raise ModuleNotFoundError("HTTP/2 requires the `h2` package: `python3 -m pip install 'httpx[http2]'`") from None
+        self.http2 = http2
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.compress_requests = compress_requests
+        self.http_versions = collections.Counter()
+        self._clients = {}
+        self._contexts = {}
+        self._loop = None
+        self._thread = None
+        self._init_fork_safe()
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        state['_contexts'] = {}
+        return(state)
+
+    def after_fork(self):
+        """ Called in a forked child to drop the event loop and connections inherited from the parent, as the loop thread does not survive the fork. """
+        super().after_fork()
+        for context in self._contexts.values():
+            context.forget_sessions()
+
+    def ssl_context(self, verify = True):
+        """ The SSLContext used for https connections with this `verify` setting. """
+        with self._lock:
+            if verify not in self._contexts:
+                self._contexts[verify] = create_ssl_context(verify)
+            return(self._contexts[verify])
+
+    @property
+    def loop(self):
+        """ The event loop that runs the requests, started in a background thread on first use. """
+        if self._loop is None:
+            import asyncio
+            with self._lock:
+                if self._loop is None:
+                    loop = asyncio.new_event_loop()
+                    self._thread = threading.Thread(target = loop.run_forever, name = 'jnet-httpx', daemon = True)
+                    self._thread.start()
+                    self._loop = loop
+        return(self._loop)
+
+    def client(self, verify = True):
+        """ The `httpx.AsyncClient` for a `verify` setting, created on first use. It must only be used on `loop`. """
+        if verify not in self._clients:
+            import httpx
+            self._clients[verify] = httpx.AsyncClient(
+                http2 = self.http2,
+                verify = self.ssl_context(verify),
+                timeout = self.timeout,
+                limits = httpx.Limits(max_connections = self.max_connections, max_keepalive_connections = self.max_connections),
+            )
+        return(self._clients[verify])
+
+    async def _post(self, url:str, body:bytes, headers:dict, verify):
+        # runs on the loop, so the clients are only ever created and used from that thread
+        return(await self.client(verify).post(url, content = body, headers = headers))
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        import asyncio
+        started = time.monotonic()
+        body, headers = self.compress_body(body, headers)
+        response = asyncio.run_coroutine_threadsafe(self._post(url, body, headers, verify), self.loop).result()
+        with self._lock:
+            self.http_versions[response.http_version] += 1
+        return(RecordedResponse(
+            response.status_code,
+            response.reason_phrase,
+            response.headers,
+            response.content,
+            url = url,
+            elapsed = time.monotonic() - started,
+        ))
+
+    def close(self):
+        import asyncio
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+
+        async def close_clients():
+            for client in self._clients.values():
+                await client.aclose()
+            self._clients = {}
+
+        asyncio.run_coroutine_threadsafe(close_clients(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+
+class RecordedResponse():
+    """ A stand-in for a `requests.Response`, built from a recorded exchange. """
+
+    def __init__(self, status_code:int, reason:str, headers:dict, content:bytes, url:str = None, elapsed:float = 0):
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = requests.structures.CaseInsensitiveDict(headers)
+        self.content = content
+        self.url = url
+        self.elapsed = datetime.timedelta(seconds = elapsed)
+        self.encoding = 'utf-8'
+
+    @property
+    def ok(self):
+        return(self.status_code < 400)
+
+    @property
+    def text(self):
+        return(self.content.decode(self.encoding))
+
+
+class RecordingTransport(Transport):
+    """ Records every request/response exchange to a compressed line-delimited json archive, while passing the requests through to another transport.
+
+    Credentials are stripped before anything is written: the WS-Security header (the signature and the
+    client certificate) is emptied and the `RequestAuthenticatedUserID` is replaced with 'REDACTED'. Any
+    other sensitive strings can be provided in `redact` to be scrubbed from both requests and responses.
+    Note that the responses themselves are recorded as received, so archives of real dockets must be
+    handled as confidential data.
+
+    Constructor Args:
+        path: The archive to write, i.e. `session.jsonl.gz`.
+        transport: The transport that actually sends the requests. Default is a new `RequestsTransport`.
+        redact: Additional strings to replace with 'REDACTED' in the recording.
+
+    Call `close()` when done so the final exchanges are written.
+    """
+
+    def __init__(self, path:str, transport:Transport = None, redact = ()):
+        self.path = path
+        self.transport = transport or RequestsTransport()
+        self.redact = [value for value in redact if value]
+        self._writer = output.NDJSONWriter(path, flush_every = 20)
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+
+    def scrub(self, text:str):
+        for value in self.redact:
+            text = text.replace(value, REDACTED)
+        return(text)
+
+    def redact_request(self, body:bytes):
+        """ Returns the request xml with the signature, certificate and user id removed. """
+        envelope = lxml.etree.fromstring(body)
+        for security in envelope.iter(f"{{{WSSE_NS}}}Security"):
+            for child in list(security):
+                security.remove(child)
+        for userid in envelope.iter(f"{{{METADATA_NS}}}RequestAuthenticatedUserID"):
+            userid.text = REDACTED
+        return(self.scrub(lxml.etree.tostring(envelope).decode('utf-8')))
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        started = time.monotonic()
+        response = self.transport.send(url, body, headers, verify = verify)
+        elapsed = time.monotonic() - started
+
+        record = {
+            'operation': operation_name(body),
+            'url': url,
+            'offset': started - self._started,
+            'elapsed': elapsed,
+            'request': self.redact_request(body),
+            'status_code': response.status_code,
+            'reason': response.reason,
+            # the content is recorded decoded, so the transfer headers no longer apply
+            'headers': {k: v for k, v in response.headers.items() if k.lower() not in ('set-cookie', 'authorization', 'content-encoding', 'content-length', 'transfer-encoding')},
+            'response': self.scrub(response.content.decode('utf-8', errors = 'replace')),
+        }
+        with self._lock:
+            self._writer.write(record)
+        return(response)
+
+    def close(self):
+        with self._lock:
+            self._writer.close()
+        self.transport.close()
+
+
+class ReplayTransport(Transport, ForkSafe):
+    """ Serves responses from an archive written by `RecordingTransport` instead of contacting JNET.
+
+    Recorded responses are returned in order for each operation, so a replayed session reproduces the
+    original sequence of status checks and retrievals even if the calls interleave differently.
+
+    Constructor Args:
+        path: The archive written by `RecordingTransport`.
+        timing: 'original' to wait as long as the original request took, or 'zero' to return immediately. Default is 'zero'.
+        loop: If True, start over from the beginning of the recording when an operation runs out of responses, which is useful for benchmarks. Default is False.
+    """
+
+    def __init__(self, path:str, timing:str = 'zero', loop:bool = False):
+        if timing not in ('original', 'zero'):
+            raise ValueError(f"timing must be 'original' or 'zero', not '{timing}'")
+        self.path = path
+        self.timing = timing
+        self.loop = loop
+        self.records = collections.defaultdict(list)
+        for record in output.iter_ndjson(path):
+            self.records[record['operation']].append(record)
+        self._position = collections.Counter()
+        self._init_fork_safe()
+
+    def next_record(self, operation:str):
+        """ Returns the next recorded exchange for the operation. """
+        with self._lock:
+            recorded = self.records.get(operation)
+            if not recorded:
+                raise JNETError(f"No recorded {operation} exchanges in {self.path}")
+            position = self._position[operation]
+            if position >= len(recorded):
+                if not self.loop:
+                    raise JNETError(f"All {len(recorded)} recorded {operation} exchanges in {self.path} have been replayed")
+                position = 0
+            self._position[operation] = position + 1
+        return(recorded[position])
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        record = self.next_record(operation_name(body))
+        if self.timing == 'original':
+            time.sleep(record['elapsed'])
+        return(RecordedResponse(
+            record['status_code'],
+            record['reason'],
+            record['headers'],
+            record['response'].encode('utf-8'),
+            url = url,
+            elapsed = record['elapsed'],
+        ))
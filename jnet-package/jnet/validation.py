@@ -0,0 +1,180 @@
+# This program is part of the jnet package.
+# https://github.com/PhillyDistrictAttorneysOffice/jnet
+
+# Copyright (C) 2022-present
+# Kevin Crouse, The Philadelphia District Attorney's Office, City of Philadelphia, PA.
+
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <https://www.gnu.org/licenses/gpl-3.0.en.html>
+
+
+""" Checking and normalizing docket numbers and OTNs before they are sent to JNET.
+
+JNET accepts any docket number, and an invalid one costs a full request, the AOPC turnaround and a
+poll cycle before it comes back as 'Invalid Request Object! Docket Number not supported!'. These
+functions catch malformed input up front, and put the rest in the canonical form that AOPC returns in
+its replies, so that a docket entered as `cp 51 cr 100 2021` is requested and matched as
+`CP-51-CR-0000100-2021`.
+
+A Pennsylvania docket number has five parts:
+
+    CP-51-CR-0000100-2021    court type, county, case type, sequence, year
+    MJ-02201-CR-0000042-2022 magisterial district dockets have a five digit court office, which starts with the county
+
+Clients made with `validate_identifiers = True` normalize every docket number and OTN they request,
+and raise `jnet.exceptions.InvalidIdentifier` instead of sending one that cannot be valid. For a file
+of docket numbers, `validate_docket_numbers` checks the whole list in one pass.
+"""
+
+import re
+import datetime
+import functools
+
+from .exceptions import InvalidIdentifier
+
+# Pennsylvania's 67 counties are numbered alphabetically, i.e. 02 is Allegheny and 51 is Philadelphia
+COUNTIES = range(1, 68)
+PHILADELPHIA = 51
+
+# the case types that each court type dockets criminal and related matters under
+CASE_TYPES = {
+    'CP': {'CR', 'MD', 'SA', 'JV', 'DP'},
+    'MC': {'CR', 'MD', 'SU'},
+    'MJ': {'CR', 'NT', 'TR', 'MD', 'SU'},
+}
+
+# the earliest docket year that is accepted
+MIN_YEAR = 1960
+
+# the canonical form, which nearly all input already has, so it is checked first
+_canonical = re.compile(r'([A-Z]{2})-(\d{2}|\d{5})-([A-Z]{2})-(\d{7})-(\d{4})')
+
+# anything that can be put in canonical form: any case, and spaces, underscores, dashes or nothing between the parts
+_separator = r'[\s_\-\u2010-\u2015]*'
+_lenient = re.compile(
+    r'\s*([A-Z]{2})' + _separator + r'(\d{1,5})' + _separator + r'([A-Z]{2})' + _separator + r'(\d{1,7})' + _separator + r'(\d{4})\s*',
+    re.IGNORECASE,
+)
+
+_otn_canonical = re.compile(r'[A-Z]\d{7,8}')
+_otn_lenient = re.compile(r'\s*([A-Z])' + _separator + r'(\d{6,7})' + _separator + r'(\d)\s*', re.IGNORECASE)
+
+
+@functools.lru_cache(maxsize = 4096)
+def _check_parts(court:str, county:str, case_type:str, year:str, max_year:int):
+    """ The reason the parts of a docket number are invalid, or None if they are valid.
+
+    Cached, as the dockets in a file share a few courts, counties, case types and years.
+    """
+    if court not in CASE_TYPES:
+        return(f"unknown court type {court}")
+    if court == 'MJ':
+        if len(county) != 5:
+            return(f"a magisterial district court office has five digits, not {county}")
+        county = county[:2]
+    elif len(county) != 2:
+        return(f"a {court} county code has two digits, not {county}")
+    if int(county) not in COUNTIES:
+        return(f"unknown county code {county}")
+    if court == 'MC' and int(county) != PHILADELPHIA:
+        return(f"the Municipal Court only has Philadelphia (51) dockets, not county {county}")
+    if case_type not in CASE_TYPES[court]:
+        return(f"unknown case type {case_type} for a {court} docket")
+    if not MIN_YEAR <= int(year) <= max_year:
+        return(f"year {year} is out of range")
+    return(None)
+
+def _normalize_docket_number(value:str, max_year:int):
+    """ The canonical docket number and None, or None and the reason the value is invalid. """
+    match = _canonical.fullmatch(value)
+    if match:
+        court, county, case_type, sequence, year = match.groups()
+        reason = _check_parts(court, county, case_type, year, max_year)
+        return((None, reason) if reason else (value, None))
+
+    match = _lenient.fullmatch(value)
+    if not match:
+        return(None, "not in the form CP-51-CR-0000100-2021")
+    court, county, case_type, sequence, year = match.groups()
+    court = court.upper()
+    case_type = case_type.upper()
+    # AOPC pads the county and sequence with zeros, which are often left off when typed
+    county = county.zfill(5 if court == 'MJ' else 2)
+    reason = _check_parts(court, county, case_type, year, max_year)
+    if reason:
+        return(None, reason)
+    return(f"{court}-{county}-{case_type}-{sequence.zfill(7)}-{year}", None)
+
+def _max_year():
+    # dockets are sometimes opened for the next year in late December
+    return(datetime.date.today().year + 1)
+
+def normalize_docket_number(docket_number:str):
+    """ Put a docket number in canonical form, i.e. `cp 51 cr 100 2021` becomes `CP-51-CR-0000100-2021`.
+
+    Args:
+        docket_number: The docket number, in any case and with any (or no) separators.
+    Returns:
+        str of the canonical docket number.
+    Raises:
+        jnet.exceptions.InvalidIdentifier if it is not a valid docket number.
+    """
+    normalized, reason = _normalize_docket_number(docket_number, _max_year())
+    if reason:
+        raise InvalidIdentifier(value = docket_number, kind = 'docket number', reason = reason)
+    return(normalized)
+
+def is_valid_docket_number(docket_number:str):
+    """ Returns True if the docket number is valid, in any form that `normalize_docket_number` accepts. """
+    return(_normalize_docket_number(docket_number, _max_year())[1] is None)
+
+def validate_docket_numbers(docket_numbers):
+    """ Check and normalize a list of docket numbers, i.e. a whole input file, in one pass.
+
+    Args:
+        docket_numbers: An iterable of docket numbers.
+    Returns:
+        tuple of (valid, invalid), where `valid` is the list of canonical docket numbers in the order given, and `invalid` is a list of (docket_number, reason) tuples for the rest.
+    """
+    valid = []
+    invalid = []
+    max_year = _max_year()
+    for docket_number in docket_numbers:
+        normalized, reason = _normalize_docket_number(docket_number, max_year)
+        if reason:
+            invalid.append((docket_number, reason))
+        else:
+            valid.append(normalized)
+    return(valid, invalid)
+
+def normalize_otn(otn:str):
+    """ Put an Offense Tracking Number in canonical form, i.e. `n 123456-7` becomes `N1234567`.
+
+    An OTN is a letter, six digits and a check digit, printed as `N 123456-7`. The exact format is not
+    in the JNET documentation, so a letter with seven digits and a check digit is accepted as well,
+    and only input that cannot be either is rejected. The check digit is not verified.
+
+    Args:
+        otn: The OTN, in any case and with any (or no) separators.
+    Returns:
+        str of the canonical OTN.
+    Raises:
+        jnet.exceptions.InvalidIdentifier if it is not a valid OTN.
+    """
+    if _otn_canonical.fullmatch(otn):
+        return(otn)
+    match = _otn_lenient.fullmatch(otn)
+    if not match:
+        raise InvalidIdentifier(value = otn, kind = 'OTN', reason = "not a letter followed by six or seven digits and a check digit, i.e. N 123456-7")
+    letter, digits, check_digit = match.groups()
+    return(f"{letter.upper()}{digits}{check_digit}")
@@ -25,6 +25,14 @@ setuptools.setup(
         "Development Status :: 4 - Beta"
     ],
     install_requires=requirements,
+    extras_require={
+        'http2': ['httpx[http2]'],
+    },
     scripts=[],
+    entry_points={
+        'console_scripts': [
+            'jnet = jnet.cli:main',
+        ],
+    },
     include_package_data=True,
  )
@@ -0,0 +1,184 @@
+import pytest
+import jnet
+import jnet.circuit
+import jnet.concurrency
+import jnet.metrics
+import jnet.testing
+import time
+import pickle
+import concurrent.futures
+
+""" Test the per-endpoint circuit breakers in `jnet.circuit`, on their own and against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_circuit.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+def call(breaker, failure):
+    probe, event = breaker.before_call()
+    return(breaker.after_call(probe, failure))
+
+def test_consecutive_failures_open_the_circuit():
+    breaker = jnet.circuit.CircuitBreaker('beta', failure_threshold = 3, reset_timeout = 60)
+    assert call(breaker, True) is None
+    assert call(breaker, False) is None
+    assert call(breaker, True) is None and call(breaker, True) is None
+    event = call(breaker, True)
+    assert (event['state'], event['previous_state'], event['consecutive_failures']) == ('open', 'closed', 3)
+
+    with pytest.raises(jnet.exceptions.CircuitOpenError) as error:
+        breaker.before_call()
+    assert error.value.endpoint == 'beta'
+    assert 59 < error.value.retry_after <= 60
+    assert breaker.rejected == 1
+
+def test_error_rate_opens_the_circuit():
+    breaker = jnet.circuit.CircuitBreaker(failure_threshold = 100, error_rate = 0.5, window = 10, min_calls = 10)
+    events = [call(breaker, n % 2 == 1) for n in range(9)]
+    # alternating failures never reach the threshold, but half of the last 10 calls failed
+    assert breaker.state == 'closed' and not any(events)
+    assert call(breaker, True)['state'] == 'open'
+    assert breaker.failure_rate() == 0.5
+
+def test_half_open_probes():
+    breaker = jnet.circuit.CircuitBreaker(failure_threshold = 1, reset_timeout = 0.05, probes = 2)
+    call(breaker, True)
+    assert breaker.state == 'open'
+    time.sleep(0.06)
+
+    # the first call after the timeout is a probe, and only `probes` run at once
+    probe, event = breaker.before_call()
+    assert probe and event['state'] == 'half_open'
+    second, event = breaker.before_call()
+    assert second and event is None
+    with pytest.raises(jnet.exceptions.CircuitOpenError, match = 'probe'):
+        breaker.before_call()
+
+    assert breaker.after_call(probe, False) is None
+    assert breaker.after_call(second, False)['state'] == 'closed'
+
+    # a failed probe opens the circuit again
+    call(breaker, True)
+    time.sleep(0.06)
+    probe, event = breaker.before_call()
+    assert breaker.after_call(probe, True)['state'] == 'open'
+    with pytest.raises(jnet.exceptions.CircuitOpenError):
+        breaker.before_call()
+
+def test_reset_forgets_probes():
+    breaker = jnet.circuit.CircuitBreaker(failure_threshold = 1, reset_timeout = 0.05, probes = 2)
+    call(breaker, True)
+    time.sleep(0.06)
+    stale = breaker.before_call()[0]
+    breaker.reset()
+    assert breaker.state == 'closed'
+
+    # the probe from before the reset does not take a place from the next half-open circuit's probes
+    call(breaker, True)
+    time.sleep(0.06)
+    probe, event = breaker.before_call()
+    assert event['state'] == 'half_open'
+    second = breaker.before_call()[0]
+    with pytest.raises(jnet.exceptions.CircuitOpenError, match = 'probe'):
+        breaker.before_call()
+    breaker.after_call(probe, False)
+    assert breaker.after_call(second, False)['state'] == 'closed'
+
+    # and when it returns, the count of probes in flight does not go below zero
+    assert breaker.after_call(stale, False) is None
+    assert breaker._probes_in_flight == 0
+
+def test_calls_from_before_the_circuit_opened_are_ignored():
+    breaker = jnet.circuit.CircuitBreaker(failure_threshold = 1, reset_timeout = 60)
+    late = breaker.before_call()[0]
+    call(breaker, True)
+    assert breaker.after_call(late, False) is None
+    assert breaker.state == 'open'
+
+def test_registry():
+    breakers = jnet.circuit.CircuitBreakers(failure_threshold = 2)
+    assert breakers.breaker('beta') is breakers.breaker('beta')
+    assert breakers.breaker('production') is not breakers.breaker('beta')
+    assert breakers.breaker('beta').failure_threshold == 2
+    call(breakers.breaker('beta'), True)
+    call(breakers.breaker('beta'), True)
+    assert breakers.states() == {'beta': 'open', 'production': 'closed'}
+    copy = pickle.loads(pickle.dumps(breakers))
+    assert copy.states() == breakers.states()
+    with pytest.raises(TypeError):
+        jnet.circuit.CircuitBreakers(threshold = 2)
+
+def test_fails_fast_against_mock_server():
+    breakers = jnet.circuit.CircuitBreakers(failure_threshold = 3, reset_timeout = 1)
+    registry = jnet.metrics.MetricsRegistry()
+    metrics = jnet.metrics.JNETMetrics(registry)
+    events = []
+    with jnet.testing.MockJNET(latency = 0.01) as server:
+        jnetclient = server.client(circuit_breakers = breakers, observers = [events.append, metrics])
+        other = server.client(circuit_breakers = breakers)
+
+        # the service is down
+        server.fail_next(3, 'Service_Unavailable', status = 503)
+        for n in range(3):
+            with pytest.raises(jnet.exceptions.JNETTransportError):
+                jnetclient.request_docket(found_docket)
+        assert breakers.states() == {jnetclient.endpoint: 'open'}
+
+        # every thread, and every client sharing the registry, now fails fast without reaching the server
+        calls = sum(server.counts.values())
+        def attempt(n):
+            with pytest.raises(jnet.exceptions.CircuitOpenError):
+                (jnetclient if n % 2 else other).request_docket(found_docket)
+        with concurrent.futures.ThreadPoolExecutor(max_workers = 8) as pool:
+            list(pool.map(attempt, range(32)))
+        assert sum(server.counts.values()) == calls
+        assert metrics.circuit_state.get(endpoint = jnetclient.endpoint) == 2
+
+        # after the timeout, a probe succeeds and closes the circuit
+        time.sleep(1.05)
+        assert jnetclient.request_docket(found_docket, tracking_id = 'probe').tracking_id == 'probe'
+        assert breakers.states() == {jnetclient.endpoint: 'closed'}
+        assert metrics.circuit_state.get(endpoint = jnetclient.endpoint) == 0
+
+    states = [(e['previous_state'], e['state']) for e in events if e['event'] == 'circuit']
+    assert states == [('closed', 'open'), ('open', 'half_open'), ('half_open', 'closed')]
+    errors = [e['error'] for e in events if e['event'] == 'request']
+    assert errors.count('CircuitOpenError') == 16
+
+def test_request_errors_do_not_open_the_circuit():
+    breakers = jnet.circuit.CircuitBreakers(failure_threshold = 2)
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client(circuit_breakers = breakers)
+        # a fault blaming the request, sent with a 500 like every SOAP fault
+        server.fail_next(3, 'Authentication_Error')
+        for n in range(3):
+            with pytest.raises(jnet.exceptions.JNETError):
+                jnetclient.request_docket(found_docket)
+    assert breakers.states() == {jnetclient.endpoint: 'closed'}
+
+def test_waiting_for_a_slot_does_not_leak_a_probe(monkeypatch):
+    breakers = jnet.circuit.CircuitBreakers(failure_threshold = 1, reset_timeout = 0.05)
+    limiter = jnet.concurrency.AIMDLimiter()
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client(circuit_breakers = breakers, limiter = limiter)
+        server.fail_next(1, 'Service_Unavailable', status = 503)
+        with pytest.raises(jnet.exceptions.JNETError):
+            jnetclient.request_docket(found_docket)
+        time.sleep(0.1)
+
+        # the probe is interrupted while it waits for a slot, before it is sent
+        def interrupted(timeout = None):
+            raise KeyboardInterrupt()
+        monkeypatch.setattr(limiter, 'acquire', interrupted)
+        with pytest.raises(KeyboardInterrupt):
+            jnetclient.request_docket(found_docket)
+        monkeypatch.undo()
+
+        assert breakers.states() == {jnetclient.endpoint: 'half_open'}
+        jnetclient.request_docket(found_docket)
+    assert breakers.states() == {jnetclient.endpoint: 'closed'}
@@ -0,0 +1,115 @@
+import pytest
+import jnet
+import jnet.cli
+import os
+import sys
+import subprocess
+import json
+
+""" Test the `jnet` command line parsing. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_cli.py
+```
+"""
+
+HEAVY_MODULES = ('zeep', 'xmlsec', 'lxml', 'cryptography', 'requests')
+
+def run_python(code):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(jnet.__file__)))
+    proc = subprocess.run([sys.executable, '-c', code], env = env, capture_output = True, text = True, check = True)
+    return(proc.stdout)
+
+@pytest.mark.parametrize('argv', [[], ['--help'], ['fetch', '--help'], ['status', '--help'], ['retrieve', '--help']])
+def test_help_is_lightweight(argv):
+    loaded = run_python(
+        "import sys, contextlib, io\n"
+        "import jnet.cli\n"
+        "with contextlib.redirect_stdout(io.StringIO()):\n"
+        "    try:\n"
+        f"        jnet.cli.main({argv!r})\n"
+        "    except SystemExit:\n"
+        "        pass\n"
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+    assert loaded.strip() == ''
+
+def test_subcommands():
+    parser = jnet.cli.build_parser()
+
+    args = parser.parse_args(['fetch', 'CP-51-CR-0000001-2022', '--concurrency', '4', '--beta'])
+    assert args.func is jnet.cli.cmd_fetch
+    assert args.concurrency == 4
+    assert args.beta
+
+    args = parser.parse_args(['status', '-t', 'abc', 'def'])
+    assert args.func is jnet.cli.cmd_status
+    assert args.tracking_id == ['abc', 'def']
+
+    for command in ('request', 'participant', 'retrieve'):
+        assert command in parser.format_help()
+
+def test_read_docket_numbers(tmp_path):
+    textfile = tmp_path / 'dockets.txt'
+    textfile.write_text("cp-51-cr-0000001-2022\n  CP-51-CR-0000001-2022 \n\nMC-51-CR-0000002-2020\n")
+    assert jnet.cli.read_docket_numbers(['MC-51-CR-0000002-2020'], textfile.as_posix()) == ['MC-51-CR-0000002-2020', 'CP-51-CR-0000001-2022']
+
+    csvfile = tmp_path / 'dockets.csv'
+    csvfile.write_text("name,docket\na,CP-51-CR-0000001-2022\nb,cp-51-cr-0000001-2022\nc,MC-51-CR-0000002-2020\n")
+    assert jnet.cli.read_docket_numbers(input_path = csvfile.as_posix(), column = 'docket') == ['CP-51-CR-0000001-2022', 'MC-51-CR-0000002-2020']
+    assert jnet.cli.read_docket_numbers(input_path = csvfile.as_posix(), column = '1') == ['DOCKET', 'CP-51-CR-0000001-2022', 'MC-51-CR-0000002-2020']
+
+class InterruptedClient():
+    """ Stands in for the client in `fetch`: returns the first docket, fails the second, and is then interrupted. """
+
+    def fetch_dockets(self, docket_numbers, timeout = None, concurrency = 1):
+        yield((docket_numbers[0], [{'docket_number': docket_numbers[0]}], None))
+        yield((docket_numbers[1], None, jnet.exceptions.NoResults()))
+        raise KeyboardInterrupt()
+
+def test_fetch_interrupted_writes_output(tmp_path, monkeypatch):
+    monkeypatch.setattr(jnet.cli, 'make_client', lambda args: InterruptedClient())
+    output_path = tmp_path / 'dockets.ndjson'
+    with pytest.raises(KeyboardInterrupt):
+        jnet.cli.main(['fetch', 'CP-51-CR-0000001-2022', 'CP-51-CR-0000002-2022', 'CP-51-CR-0000003-2022', '-o', output_path.as_posix(), '--retry-file', (tmp_path / 'failed.txt').as_posix()])
+    # the buffered record was written when the batch was interrupted
+    assert output_path.read_text().splitlines() == ['{"docket_number": "CP-51-CR-0000001-2022"}']
+
+def test_fetch_interrupted_writes_retry_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(jnet.cli, 'make_client', lambda args: InterruptedClient())
+    retry_file = tmp_path / 'failed.txt'
+    with pytest.raises(KeyboardInterrupt):
+        jnet.cli.main(['fetch', 'CP-51-CR-0000001-2022', 'CP-51-CR-0000002-2022', 'CP-51-CR-0000003-2022', '--retry-file', retry_file.as_posix()])
+    # the failed docket, and the one that was never fetched
+    assert retry_file.read_text().splitlines() == ['CP-51-CR-0000002-2022', 'CP-51-CR-0000003-2022']
+
+class CompletedClient():
+
+    def fetch_dockets(self, docket_numbers, timeout = None, concurrency = 1):
+        for docket_number in docket_numbers:
+            yield((docket_number, [{'docket_number': docket_number}], None))
+
+def test_fetch_without_failures_removes_retry_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(jnet.cli, 'make_client', lambda args: CompletedClient())
+    retry_file = tmp_path / 'failed.txt'
+    retry_file.write_text("CP-51-CR-0000009-2022\n")
+    assert not jnet.cli.main(['fetch', 'CP-51-CR-0000001-2022', '--retry-file', retry_file.as_posix()])
+    assert not retry_file.exists()
+
+def test_fetch_progress_goes_to_stderr(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(jnet.cli, 'make_client', lambda args: CompletedClient())
+    assert not jnet.cli.main(['fetch', 'CP-51-CR-0000001-2022', '--retry-file', (tmp_path / 'failed.txt').as_posix()])
+    captured = capsys.readouterr()
+    # stdout only has the json, so that it can be piped
+    assert json.loads(captured.out) == [{'docket_number': 'CP-51-CR-0000001-2022'}]
+    assert 'Fetching 1 dockets' in captured.err
+
+def test_fetch_to_directory(tmp_path, monkeypatch):
+    monkeypatch.setattr(jnet.cli, 'make_client', lambda args: CompletedClient())
+    output_dir = tmp_path / 'dockets'
+    assert not jnet.cli.main(['fetch', 'CP-51-CR-0000001-2022', 'MC-51-CR-0000002-2020', '-o', output_dir.as_posix() + '/', '--retry-file', (tmp_path / 'failed.txt').as_posix()])
+    assert sorted(path.name for path in output_dir.iterdir()) == ['CP-51-CR-0000001-2022.json', 'MC-51-CR-0000002-2020.json']
+    assert json.loads((output_dir / 'MC-51-CR-0000002-2020.json').read_text()) == {'docket_number': 'MC-51-CR-0000002-2020'}
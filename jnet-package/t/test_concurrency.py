@@ -0,0 +1,169 @@
+import pytest
+import jnet
+import jnet.concurrency
+import jnet.testing
+import jnet.transport
+import pickle
+import itertools
+
+""" Test the adaptive concurrency limit of `jnet.concurrency.AIMDLimiter`, on its own and against the local mock JNET server with injected slowdowns and faults. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_concurrency.py
+```
+"""
+
+def docket(n):
+    return(f"CP-51-CR-{n:07d}-2021")
+
+def run_round(limiter, latency = 0.01, fault = False):
+    """ Fill the limit, then release every slot with the same outcome. Returns the events. """
+    slots = [limiter.acquire() for n in range(int(limiter.limit))]
+    events = [limiter.release(slot, fault = fault, latency = latency) for slot in slots]
+    return([e for e in events if e])
+
+def test_additive_increase():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 2, maximum = 6)
+    limits = [2]
+    for n in range(12):
+        run_round(limiter)
+        limits.append(int(limiter.limit))
+    # at most one more slot per round of healthy replies, up to the maximum
+    assert all(0 <= later - earlier <= 1 for earlier, later in zip(limits, limits[1:]))
+    assert limits[4] > 3
+    assert limits[-1] == 6
+    assert limiter.decisions == {'increase': 4, 'fault': 0, 'latency': 0}
+    assert limiter.baselines == {None: pytest.approx(0.01)}
+
+def test_unsaturated_limit_does_not_grow():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 8)
+    for n in range(50):
+        limiter.release(limiter.acquire(), latency = 0.01)
+    assert limiter.limit == 8
+
+def test_multiplicative_decrease():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 8, minimum = 2)
+    events = run_round(limiter, fault = True)
+    # the calls in flight saw the same overload, so the limit is cut once for all of them
+    assert [(e['reason'], e['previous_limit'], e['limit']) for e in events] == [('fault', 8, 4)]
+    run_round(limiter, fault = True)
+    run_round(limiter, fault = True)
+    assert limiter.limit == 2
+    assert limiter.decisions['fault'] == 3
+
+def test_latency_spike():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 4)
+    for n in range(5):
+        run_round(limiter, latency = 0.01)
+    limit = int(limiter.limit)
+    events = run_round(limiter, latency = 0.05)
+    assert [e['reason'] for e in events] == ['latency']
+    assert int(limiter.limit) == limit // 2
+    assert events[0]['baseline_seconds'] == pytest.approx(0.01)
+
+    # a lasting slowdown becomes the new baseline, and the limit grows again
+    for n in range(30):
+        run_round(limiter, latency = 0.05)
+    assert limiter.baselines[None] == pytest.approx(0.05, rel = 0.1)
+    assert limiter.limit > limit // 2
+
+def test_latency_per_operation():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 4)
+    for n in range(5):
+        for operation, latency in (('RequestCourtCaseEventInfo', 0.01), ('ReceiveCourtCaseEvent', 0.5)):
+            for slot in [limiter.acquire() for n in range(int(limiter.limit))]:
+                limiter.release(slot, latency = latency, operation = operation)
+    # slow retrievals next to fast status checks are not latency spikes
+    assert limiter.decisions['latency'] == 0
+    assert limiter.baselines == {'RequestCourtCaseEventInfo': pytest.approx(0.01), 'ReceiveCourtCaseEvent': pytest.approx(0.5)}
+
+    # but a slow status check is
+    event = limiter.release(limiter.acquire(), latency = 0.05, operation = 'RequestCourtCaseEventInfo')
+    assert (event['reason'], event['operation']) == ('latency', 'RequestCourtCaseEventInfo')
+
+def test_acquire_waits_for_a_slot():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 1)
+    slot = limiter.acquire()
+    with pytest.raises(TimeoutError):
+        limiter.acquire(timeout = 0.05)
+    limiter.release(slot)
+    limiter.release(limiter.acquire(timeout = 0.05))
+    assert limiter.in_flight == 0
+
+def test_invalid_limits():
+    with pytest.raises(ValueError):
+        jnet.concurrency.AIMDLimiter(initial = 10, maximum = 5)
+    with pytest.raises(ValueError):
+        jnet.concurrency.AIMDLimiter(decrease = 1)
+
+def test_pickle():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 2)
+    run_round(limiter)
+    slot = limiter.acquire()
+    copy = pickle.loads(pickle.dumps(limiter))
+    assert copy.in_flight == 0 and copy.limit == limiter.limit and copy.baselines == limiter.baselines
+    limiter.release(slot)
+
+def test_adapts_to_mock_server():
+    # the server slows down after 150 calls
+    calls = itertools.count()
+    def latency(operation):
+        return(0.01 if next(calls) < 150 else 0.1)
+
+    limiter = jnet.concurrency.AIMDLimiter(initial = 2, maximum = 16)
+    events = []
+    with jnet.testing.MockJNET(latency = latency) as server:
+        jnetclient = server.client(limiter = limiter, observers = [events.append])
+        results = list(jnetclient.fetch_dockets([docket(n) for n in range(80)], concurrency = 2))
+        assert all(error is None for docket_number, data, error in results)
+        assert server.peak_in_flight <= 16
+
+    changes = [e for e in events if e['event'] == 'concurrency']
+    reasons = [e['reason'] for e in changes]
+    # the limit grew past the starting point while replies were fast, and was cut when they slowed down
+    assert max(e['limit'] for e in changes) > 4
+    assert 'latency' in reasons
+    assert reasons.index('latency') > reasons.index('increase')
+    assert limiter.in_flight == 0
+
+def test_faults_cut_the_limit():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 8, maximum = 8)
+    events = []
+    with jnet.testing.MockJNET(fault_rate = 0.5, seed = 45) as server:
+        jnetclient = server.client(limiter = limiter, observers = [events.append])
+        results = list(jnetclient.fetch_dockets([docket(n) for n in range(16)]))
+    assert any(error for docket_number, data, error in results)
+    assert limiter.decisions['fault'] >= 1
+    assert min(e['limit'] for e in events if e['event'] == 'concurrency') < 8
+
+def test_request_errors_do_not_cut_the_limit():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 8, maximum = 8)
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client(limiter = limiter)
+        # client faults come back as http 500 like server faults do
+        server.fail_next(2, 'Authentication_Error')
+        for n in range(2):
+            with pytest.raises(jnet.exceptions.AuthenticationError):
+                jnetclient.request_docket(docket(n))
+        assert limiter.limit == 8
+        assert limiter.decisions['fault'] == 0
+
+        server.fail_next(1, 'Internal_Error')
+        with pytest.raises(jnet.exceptions.JNETTransportError):
+            jnetclient.request_docket(docket(3))
+        assert limiter.limit == 4
+
+def test_is_overload():
+    with jnet.testing.MockJNET() as server:
+        status, xml = server.fault(500, 'Client', 'Invalid_Request', 'Unknown operation')
+        client_fault = jnet.transport.RecordedResponse(status, 'Internal Server Error', {}, xml.encode('utf-8'))
+        status, xml = server.fault(500, 'Server', 'Internal_Error', 'Database down')
+        server_fault = jnet.transport.RecordedResponse(status, 'Internal Server Error', {}, xml.encode('utf-8'))
+    assert not jnet.concurrency.is_overload(client_fault)
+    assert jnet.concurrency.is_overload(server_fault)
+    assert jnet.concurrency.is_overload(None)
+    assert jnet.concurrency.is_overload(jnet.transport.RecordedResponse(503, 'Service Unavailable', {}, b''))
+    assert jnet.concurrency.is_overload(jnet.transport.RecordedResponse(500, 'Internal Server Error', {}, b'<html>proxy error</html>'))
+    assert not jnet.concurrency.is_overload(jnet.transport.RecordedResponse(404, 'Not Found', {}, b''))
@@ -0,0 +1,124 @@
+import pytest
+import jnet
+import jnet.exceptions
+import jnet.testing
+import jnet.transport
+import jnet.circuit
+import jnet.concurrency
+import pickle
+from jnet.response import SOAPResponse
+
+""" Test the classification of SOAP Faults in `jnet.exceptions.error_factory` and the lazily rendered error messages. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_exceptions.py
+```
+"""
+
+mock = jnet.testing.MockJNET()
+
+def fault_response(faultstring, detail = 'Mock detail', status = 500):
+    status, xml = mock.fault(status, 'Server', faultstring, detail)
+    return(jnet.transport.RecordedResponse(status, 'Internal Server Error', {'Content-Type': 'text/xml'}, xml.encode('utf-8')))
+
+def classify(http_response):
+    try:
+        return(jnet.exceptions.error_factory(http_response))
+    except jnet.exceptions.JNETError as e:
+        return(e)
+
+def test_fault_fields():
+    response = SOAPResponse(fault_response('Authentication_Error', 'Certificate not recognized'), allow_failure = True)
+    assert response.fault == {'faultcode': 'soap:Server', 'faultstring': 'Authentication_Error', 'detail': 'Certificate not recognized'}
+    assert response.fault['faultstring'] == response.data['Fault']['faultstring']
+    assert SOAPResponse(xml = '<Envelope><Body><Reply/></Body></Envelope>').fault is None
+
+def test_classification_does_not_convert_the_response():
+    error = classify(fault_response('Authentication_Error', 'Certificate not recognized'))
+    assert type(error) is jnet.exceptions.AuthenticationError
+    assert error.response._data is None
+    assert not error._rendered
+    assert error.args == ('Received Authentication_Error from JNET server, which usually is an issue with your client certificate or key: Certificate not recognized',)
+
+    # the message and data are still available, and are built on first use
+    assert error.message.startswith('Received Authentication_Error from JNET server')
+    assert ': Certificate not recognized' in error.message
+    assert 'Status Code:500' in str(error)
+    assert error.data['Fault']['faultstring'] == 'Authentication_Error'
+    assert error.args == (error.message,)
+
+def test_error_types():
+    assert type(classify(fault_response('Validation_Error'))) is jnet.exceptions.AuthenticationUseridError
+    assert type(classify(fault_response('Internal_Error'))) is jnet.exceptions.JNETTransportError
+    # only a 500 is classified by its fault
+    assert type(classify(fault_response('Authentication_Error', status = 503))) is jnet.exceptions.JNETTransportError
+
+    not_xml = jnet.transport.RecordedResponse(502, 'Bad Gateway', {}, b'<html>Bad Gateway')
+    error = classify(not_xml)
+    assert type(error) is jnet.exceptions.JNETTransportError
+    assert error.response is None and error.data is None
+    assert 'Reason: Bad Gateway' in error.message
+
+def test_lazy_messages():
+    data = [{'tracking_id': '1234', 'docket_number': 'CP-51-CR-0000001-2022'}]
+    error = jnet.exceptions.NotFound("Docket not found", data = data)
+    assert error.data is data
+    assert error.message.startswith("Docket not found\n\nError Data:\n")
+    assert '"tracking_id": "1234"' in str(error)
+    assert repr(error).startswith("NotFound('Docket not found")
+
+    error.message = 'Replaced'
+    assert str(error) == 'Replaced' and error.args == ('Replaced',)
+
+    assert jnet.exceptions.NoResults().message == 'JNET returned no results!'
+    assert str(jnet.exceptions.JNETError()) == 'A generic JNET error occurred (but no more information was provided)'
+    assert 'Data:\n{"a": 1}' in str(jnet.exceptions.JNETError(data = {'a': 1}))
+
+    response = SOAPResponse(xml = mock.envelope('<Reply><Status>ERROR</Status></Reply>'))
+    error = jnet.exceptions.JNETError(soap_response = response)
+    assert response._data is None
+    assert error.data == {'Reply': {'Status': 'ERROR'}}
+    assert 'Response Data:\n{"Reply": {"Status": "ERROR"}}' in error.message
+
+def test_pickle():
+    error = classify(fault_response('Authentication_Error', 'Certificate not recognized'))
+    copy = pickle.loads(pickle.dumps(error))
+    assert type(copy) is jnet.exceptions.AuthenticationError
+    assert copy.args == error.args and not copy._rendered
+    assert copy.message == error.message
+    assert copy.data['Fault']['faultstring'] == 'Authentication_Error'
+
+    data = [{'tracking_id': '1234'}]
+    for error in (
+        jnet.exceptions.NotFound("Docket not found", data = data),
+        jnet.exceptions.JNETError(data = {'a': 1}),
+        jnet.exceptions.InvalidIdentifier(value = 'CP-51', reason = 'too short'),
+        jnet.exceptions.CircuitOpenError(endpoint = 'https://jnet.test', retry_after = 5),
+    ):
+        assert error.args[0]
+        copy = pickle.loads(pickle.dumps(error))
+        assert type(copy) is type(error)
+        assert str(copy) == str(error)
+        assert copy.args == error.args
+    assert copy.endpoint == 'https://jnet.test' and copy.retry_after == 5
+
+def test_raised_from_client():
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client()
+        server.fail_next(1, 'Authentication_Error', 'Unknown certificate')
+        with pytest.raises(jnet.exceptions.AuthenticationError, match = 'Unknown certificate'):
+            jnetclient.request_docket('CP-51-CR-0000100-2021')
+
+def test_fault_parsed_once(monkeypatch):
+    parsed = []
+    from_failure = SOAPResponse.from_failure.__func__
+    monkeypatch.setattr(SOAPResponse, 'from_failure', classmethod(lambda cls, response: parsed.append(response) or from_failure(cls, response)))
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client(limiter = jnet.concurrency.AIMDLimiter(), circuit_breakers = jnet.circuit.CircuitBreakers())
+        server.fail_next(1, 'Authentication_Error', 'Unknown certificate')
+        with pytest.raises(jnet.exceptions.AuthenticationError):
+            jnetclient.request_docket('CP-51-CR-0000100-2021')
+    # the limiter, the circuit breaker and the error all use the same parsed fault
+    assert len(parsed) == 1
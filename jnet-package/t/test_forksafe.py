@@ -0,0 +1,96 @@
+import pytest
+import jnet
+import jnet.circuit
+import jnet.concurrency
+import jnet.forksafe
+import jnet.hedging
+import jnet.negative_cache
+import jnet.tracking
+import jnet.transport
+import os
+import pickle
+import warnings
+import threading
+import multiprocessing
+
+""" Test that `jnet.forksafe.ForkSafe` objects replace their locks and per-process state in a forked child and when pickled. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_forksafe.py
+```
+"""
+
+class Pool(jnet.forksafe.ForkSafe):
+    _fork_locks = {'_lock': threading.Lock, '_condition': threading.Condition}
+    _fork_reset = {'in_flight': int, '_connections': dict}
+
+    def __init__(self):
+        self.name = 'pool'
+        self.in_flight = 0
+        self._connections = {}
+        self._init_fork_safe()
+
+# held by the parent when the child is forked
+held = Pool()
+
+def child_state():
+    return(held._lock.acquire(timeout = 1), held.in_flight, held._connections, held.name)
+
+def test_pickle():
+    pool = Pool()
+    pool.in_flight = 3
+    pool._connections['a'] = 'connection'
+    with pool._lock:
+        copy = pickle.loads(pickle.dumps(pool))
+    assert copy.name == 'pool'
+    assert copy.in_flight == 0 and copy._connections == {}
+    assert copy._lock.acquire(blocking = False)
+    assert type(copy._condition) is threading.Condition
+    # the original is unchanged
+    assert pool.in_flight == 3 and pool._connections == {'a': 'connection'}
+
+def test_after_fork():
+    pool = Pool()
+    pool.in_flight = 3
+    pool._lock.acquire()
+    pool.after_fork()
+    assert pool._lock.acquire(blocking = False)
+    assert pool.in_flight == 0 and pool._connections == {}
+    assert pool in jnet.forksafe._instances
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason = 'fork is not available on this platform')
+def test_fork():
+    held.in_flight = 2
+    held._connections['a'] = 'connection'
+    context = multiprocessing.get_context('fork')
+    with held._lock, warnings.catch_warnings():
+        # other tests may have left threads running, which python warns about when forking
+        warnings.simplefilter('ignore', DeprecationWarning)
+        with context.Pool(1) as pool:
+            assert pool.apply(child_state) == (True, 0, {}, 'pool')
+    assert held.in_flight == 2
+
+def test_jnet_classes():
+    limiter = jnet.concurrency.AIMDLimiter()
+    limiter.acquire()
+    breaker = jnet.circuit.CircuitBreaker()
+    breaker._probes_in_flight = 1
+    cache = jnet.negative_cache.NotFoundCache()
+    generator = jnet.tracking.TrackingIdGenerator()
+    fixed = jnet.tracking.TrackingIdGenerator(worker = 'w1')
+    policy = jnet.hedging.HedgingPolicy()
+    policy._executor = object()
+    transport = jnet.transport.RequestsTransport()
+    transport.session
+
+    worker = generator.worker
+    for instance in (limiter, breaker, cache, generator, fixed, policy, transport):
+        instance.after_fork()
+    assert limiter.in_flight == 0 and limiter._condition.acquire(blocking = False)
+    assert breaker._probes_in_flight == 0 and breaker._lock.acquire(blocking = False)
+    assert cache._connection is None and len(cache) == 0
+    assert generator.worker != worker and fixed.worker == 'w1'
+    assert policy._executor is None
+    assert transport._session is None
@@ -0,0 +1,164 @@
+import pytest
+import jnet
+import jnet.hedging
+import jnet.concurrency
+import jnet.testing
+import jnet.transport
+import time
+import pickle
+import threading
+import itertools
+import concurrent.futures
+
+""" Test hedged status checks with `jnet.hedging.HedgingPolicy`, against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_hedging.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+class SlowTransport(jnet.transport.Transport):
+    """ Answers every request with an empty envelope after `latency` seconds. """
+
+    def __init__(self, latency:float):
+        self.latency = latency
+        self.sent = 0
+        self._lock = threading.Lock()
+
+    def send(self, url:str, body:bytes, headers:dict, verify = True):
+        with self._lock:
+            self.sent += 1
+        time.sleep(self.latency)
+        return(jnet.transport.RecordedResponse(200, 'OK', {}, b'<Envelope/>', url = url))
+
+def test_unsafe_operations():
+    with pytest.raises(ValueError, match = 'RequestCourtCaseEvent'):
+        jnet.hedging.HedgingPolicy(operations = ['RequestCourtCaseEventInfo', 'RequestCourtCaseEvent'])
+    policy = jnet.hedging.HedgingPolicy(operations = ['RequestCourtCaseEventInfo', 'ReceiveCourtCaseEvent'])
+    assert policy.operations == {'RequestCourtCaseEventInfo', 'ReceiveCourtCaseEvent'}
+
+def test_delay_from_observed_latency():
+    policy = jnet.hedging.HedgingPolicy(percentile = 90, min_samples = 10)
+    for n in range(9):
+        policy.record('RequestCourtCaseEventInfo', 0.01)
+    assert policy.delay('RequestCourtCaseEventInfo') is None
+    policy.record('RequestCourtCaseEventInfo', 1.0)
+    assert policy.delay('RequestCourtCaseEventInfo') == pytest.approx(0.109)
+    assert policy.delay('ReceiveCourtCaseEvent') is None
+
+def test_hedges_slow_status_checks():
+    # every tenth status check is slow
+    counter = itertools.count()
+    def latency(operation):
+        if operation != 'RequestCourtCaseEventInfo':
+            return(0)
+        return(0.5 if next(counter) % 10 == 9 else 0.005)
+
+    # the slow tenth is above the percentile hedged at
+    policy = jnet.hedging.HedgingPolicy(percentile = 75, min_samples = 10, budget = 0.3)
+    events = []
+    with jnet.testing.MockJNET(latency = latency) as server:
+        jnetclient = server.client(hedging = policy, observers = [events.append])
+        jnetclient.request_docket(found_docket)
+        durations = []
+        for n in range(60):
+            started = time.monotonic()
+            jnetclient.check_requests(pending_only = False)
+            durations.append(time.monotonic() - started)
+
+        assert policy.calls == 60
+        assert policy.hedges >= 3
+        assert policy.hedge_wins >= 3
+        # once the latency was known, the slow replies were overtaken by their hedges
+        assert max(durations[:10]) >= 0.5
+        assert max(durations[20:]) < 0.25
+        assert server.counts['RequestCourtCaseEventInfo'] == policy.calls + policy.hedges
+        # the docket request is never hedged
+        assert server.counts['RequestCourtCaseEvent'] == 1
+    policy.close()
+
+    requests = [e for e in events if e['event'] == 'request']
+    assert sum(e['hedges'] for e in requests) == policy.hedges
+    assert all(e['hedges'] == 0 for e in requests if e['operation'] == 'RequestCourtCaseEvent')
+
+def test_hedge_budget():
+    policy = jnet.hedging.HedgingPolicy(operations = ['Envelope'], budget = 0.1, burst = 1, window = 1000, min_delay = 0.001)
+    # enough fast samples that the slow calls below do not move the percentile
+    for n in range(1000):
+        policy.record('Envelope', 0.001)
+    transport = SlowTransport(0.01)
+    hedges = [policy.send(transport, 'Envelope', 'http://localhost/', b'<Envelope/>', {})[1] for n in range(40)]
+    policy.close()
+
+    # every call was slower than the observed latency, but only the budget was spent on hedges
+    assert 1 <= sum(hedges) == policy.hedges <= policy.budget * policy.calls
+    assert transport.sent == policy.calls + policy.hedges
+
+def test_failures_are_not_hedged():
+    class FailingTransport(jnet.transport.Transport):
+        def send(self, url, body, headers, verify = True):
+            raise ConnectionError("connection refused")
+
+    policy = jnet.hedging.HedgingPolicy(operations = ['Envelope'], min_samples = 1, budget = 1)
+    policy.record('Envelope', 1.0)
+    with pytest.raises(ConnectionError):
+        policy.send(FailingTransport(), 'Envelope', 'http://localhost/', b'<Envelope/>', {})
+    assert policy.hedges == 0
+    policy.close()
+
+def test_pickle():
+    policy = jnet.hedging.HedgingPolicy(min_samples = 2)
+    policy.record('RequestCourtCaseEventInfo', 0.1)
+    policy.record('RequestCourtCaseEventInfo', 0.2)
+    policy.executor
+    copy = pickle.loads(pickle.dumps(policy))
+    assert copy._executor is None
+    assert copy.delay('RequestCourtCaseEventInfo') == policy.delay('RequestCourtCaseEventInfo')
+    policy.close()
+
+def test_hedges_take_a_limiter_slot():
+    limiter = jnet.concurrency.AIMDLimiter(initial = 1, minimum = 1)
+    policy = jnet.hedging.HedgingPolicy(operations = ['Envelope'], min_samples = 1, budget = 1, min_delay = 0.001)
+    policy.record('Envelope', 0.001)
+    transport = SlowTransport(0.05)
+
+    # the original request holds the only slot, so the hedge is not sent and the budget is kept
+    slot = limiter.acquire()
+    response, hedges = policy.send(transport, 'Envelope', 'http://localhost/', b'<Envelope/>', {}, limiter = limiter)
+    limiter.release(slot)
+    assert hedges == 0 == policy.hedges
+    assert transport.sent == 1
+
+    # with a second slot, the hedge takes it and gives it back once its reply arrives
+    limiter.limit = 2
+    slot = limiter.acquire()
+    response, hedges = policy.send(transport, 'Envelope', 'http://localhost/', b'<Envelope/>', {}, limiter = limiter)
+    limiter.release(slot)
+    assert hedges == 1 == policy.hedges
+    # the request that lost the race gives its slot back once it is done
+    time.sleep(0.1)
+    assert transport.sent == 3
+    assert limiter.in_flight == 0
+    policy.close()
+
+def test_busy_pool_is_not_hedged():
+    policy = jnet.hedging.HedgingPolicy(operations = ['Envelope'], min_samples = 1, budget = 1, min_delay = 0.001, max_workers = 1)
+    policy.record('Envelope', 0.001)
+    transport = SlowTransport(0.1)
+    with concurrent.futures.ThreadPoolExecutor(2) as executor:
+        first = executor.submit(policy.send, transport, 'Envelope', 'http://localhost/', b'<Envelope/>', {})
+        time.sleep(0.02)
+        # the only worker is in use, so this call is sent from this thread rather than waiting for it
+        started = time.monotonic()
+        response, hedges = policy.send(transport, 'Envelope', 'http://localhost/', b'<Envelope/>', {})
+        assert time.monotonic() - started < 0.18
+        assert hedges == 0
+        # nor could the first call's hedge find a worker
+        assert first.result()[1] == 0
+    assert policy.hedges == 0
+    assert transport.sent == 2
+    policy.close()
@@ -0,0 +1,106 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.transport
+import pickle
+import concurrent.futures
+
+""" Test the HTTP/2 transport against the local mock JNET server, which negotiates h2 when started with `http2 = True`. These do not need to connect to JNET, but need the `httpx` and `h2` packages.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_http2.py
+```
+"""
+
+pytest.importorskip('httpx')
+pytest.importorskip('h2')
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+@pytest.fixture(scope = 'module')
+def h2_server():
+    with jnet.testing.MockJNET(tls = True, http2 = True, latency = 0.05) as server:
+        yield(server)
+
+@pytest.fixture(scope = 'module')
+def http1_server():
+    with jnet.testing.MockJNET(tls = True, latency = 0.05) as server:
+        yield(server)
+
+@pytest.fixture
+def transport():
+    transport = jnet.transport.HTTPXTransport(timeout = 10)
+    yield(transport)
+    transport.close()
+
+def docket(n):
+    return(f"CP-51-CR-{n:07d}-2021")
+
+def test_multiplexed(h2_server, transport):
+    h2_server.reset()
+    jnetclient = h2_server.client(transport = transport)
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 16) as pool:
+        results = list(pool.map(lambda n: jnetclient.request_docket(docket(n), tracking_id = f"h2-{n}"), range(48)))
+    assert [r.tracking_id for r in results] == [f"h2-{n}" for n in range(48)]
+
+    # every request went over a single connection, with many in flight at once
+    assert transport.http_versions == {'HTTP/2': 48}
+    assert h2_server.protocols == {'h2': 1}
+    assert h2_server.peak_in_flight > 4
+
+def test_full_cycle(h2_server, transport):
+    h2_server.reset()
+    jnetclient = h2_server.client(transport = transport)
+    dockets = [docket(n) for n in range(200, 208)]
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 8) as pool:
+        results = list(pool.map(lambda d: jnetclient.fetch_docket_data(d, quiet = True), dockets))
+    assert [data[0]['CaseDocketID']['ID'] for data in results] == dockets
+
+    # a large status listing exceeds the default HTTP/2 flow control window
+    h2_server.reset()
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 16) as pool:
+        list(pool.map(lambda n: jnetclient.request_docket(docket(n)), range(300)))
+    assert len(jnetclient.check_requests(pending_only = False, check = False)) == 300
+    assert set(transport.http_versions) == {'HTTP/2'}
+
+def test_errors(h2_server, transport):
+    h2_server.reset()
+    jnetclient = h2_server.client(transport = transport)
+    h2_server.fail_next(1, faultstring = 'Authentication_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.request_docket(found_docket)
+
+def test_fallback_to_http1(http1_server, transport):
+    http1_server.reset()
+    jnetclient = http1_server.client(transport = transport)
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 8) as pool:
+        results = list(pool.map(lambda n: jnetclient.request_docket(docket(n)), range(16)))
+    assert len(results) == 16
+    assert transport.http_versions == {'HTTP/1.1': 16}
+    assert http1_server.protocols == {'http/1.1': http1_server.handshakes['full'] + http1_server.handshakes['resumed']}
+
+def test_plain_http(transport):
+    with jnet.testing.MockJNET() as server:
+        jnetclient = server.client(transport = transport)
+        assert jnetclient.request_docket(found_docket, tracking_id = 'plain').tracking_id == 'plain'
+    assert transport.http_versions == {'HTTP/1.1': 1}
+
+def test_pickle(h2_server, transport):
+    jnetclient = h2_server.client(transport = transport)
+    jnetclient.request_docket(found_docket)
+    copy = pickle.loads(pickle.dumps(jnetclient))
+    assert copy.transport._loop is None and copy.transport._clients == {}
+    assert copy.request_docket(found_docket, tracking_id = 'copy').tracking_id == 'copy'
+    copy.transport.close()
+
+def test_compression(transport):
+    transport.compress_requests = True
+    with jnet.testing.MockJNET(tls = True, http2 = True, compress = True) as server:
+        jnetclient = server.client(transport = transport)
+        data = jnetclient.fetch_docket_data(found_docket, quiet = True)
+        assert data[0]['CaseDocketID']['ID'] == found_docket
+        assert server.response_encodings == {'gzip': sum(server.counts.values())}
+        assert server.request_encodings['gzip'] >= 1
+    assert transport.http_versions['HTTP/2'] >= 1
@@ -0,0 +1,67 @@
+import pytest
+import jnet
+import os
+import sys
+import subprocess
+
+""" Regression tests for the import cost of the jnet package. These do not need to connect to JNET.
+
+`import jnet` should only load the standard library; the SOAP stack (zeep, xmlsec, lxml, requests),
+cryptography, and the response parsing libraries are loaded when they are first used.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_import_time.py
+```
+"""
+
+HEAVY_MODULES = ('zeep', 'xmlsec', 'lxml', 'cryptography', 'requests', 'xmltodict', 'inflection')
+
+# generous ceiling for the cumulative import time of the `jnet` package itself, in microseconds
+IMPORT_BUDGET = 100000
+
+def importtime(statement):
+    """ Run `python -X importtime` and return a dict of top-level module name -> cumulative microseconds. """
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.path.dirname(os.path.dirname(os.path.abspath(jnet.__file__)))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement], env = env, capture_output = True, text = True, check = True)
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        name = name.strip()
+        modules[name] = max(modules.get(name, 0), int(cumulative))
+    return(modules)
+
+def loaded_heavy_modules(modules):
+    return(sorted(name for name in modules if name.split('.')[0] in HEAVY_MODULES))
+
+def test_import_jnet():
+    modules = importtime("import jnet")
+    assert loaded_heavy_modules(modules) == []
+    assert modules['jnet'] < IMPORT_BUDGET
+
+def test_import_exceptions():
+    modules = importtime("import jnet.exceptions; jnet.exceptions.NotFound('missing')")
+    assert loaded_heavy_modules(modules) == []
+
+def test_offline_parsing_skips_soap_stack():
+    # parsing a saved response needs lxml and xmltodict, but not the SOAP client or cryptography
+    modules = importtime("import jnet; jnet.SOAPResponse")
+    heavy = loaded_heavy_modules(modules)
+    assert 'lxml' in heavy and 'xmltodict' in heavy
+    assert not [name for name in heavy if name.split('.')[0] in ('zeep', 'xmlsec', 'cryptography', 'requests')]
+
+def test_client_defers_cryptography():
+    modules = importtime("import jnet; jnet.CCE")
+    assert 'zeep' in modules
+    assert not [name for name in modules if name.startswith('cryptography')]
+
+def test_lazy_attributes():
+    assert 'CCE' in dir(jnet)
+    assert jnet.SOAPResponse is jnet.response.SOAPResponse
+    assert jnet.CCE is jnet.cce_client.CCE
+    with pytest.raises(AttributeError):
+        jnet.not_an_attribute
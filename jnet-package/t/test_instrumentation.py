@@ -0,0 +1,128 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.instrumentation
+import jnet.output
+import time
+
+""" Test the request instrumentation hooks against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_instrumentation.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(turnaround = 0.1) as server:
+        yield(server)
+
+@pytest.fixture
+def events(server):
+    server.reset()
+    return([])
+
+@pytest.fixture
+def jnetclient(server, events):
+    return(server.client(observers = [events.append]))
+
+def test_request_event(jnetclient, events):
+    jnetclient.request_docket(found_docket, tracking_id = 'instrumented')
+    assert len(events) == 1
+    event = events[0]
+    assert event['event'] == 'request'
+    assert event['operation'] == 'RequestCourtCaseEvent'
+    assert event['tracking_id'] == 'instrumented'
+    assert event['status'] == 200
+    assert event['error'] is None
+    assert event['request_bytes'] > 1000 and event['response_bytes'] > 0
+    for phase in ('build', 'sign', 'network', 'parse'):
+        assert event[f"{phase}_seconds"] > 0
+    assert event['total_seconds'] == pytest.approx(sum(event[f"{phase}_seconds"] for phase in ('build', 'sign', 'network', 'parse')))
+
+def test_unsent_requests_are_not_reported(jnetclient, events):
+    jnetclient.request_docket(found_docket, send_request = False)
+    jnetclient.retrieve_file_data('1', send_request = False)
+    assert events == []
+
+def test_error_event(jnetclient, events, server):
+    server.fail_next(1, faultstring = 'Authentication_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.check_requests(tracking_id = 'instrumented')
+    assert len(events) == 1
+    assert events[0]['operation'] == 'RequestCourtCaseEventInfo'
+    assert events[0]['status'] == 500
+    assert events[0]['error'] == 'AuthenticationError'
+    assert events[0]['parse_seconds'] == 0
+
+def test_docket_event(jnetclient, events):
+    data = jnetclient.fetch_docket_data(found_docket, quiet = True)
+    operations = [e['operation'] for e in events if e['event'] == 'request']
+    assert operations[0] == 'RequestCourtCaseEvent'
+    assert 'RequestCourtCaseEventInfo' in operations
+    assert operations[-1] == 'ReceiveCourtCaseEvent'
+    assert next(e for e in events if e.get('operation') == 'ReceiveCourtCaseEvent')['file_id']
+
+    docket = events[-1]
+    assert docket['event'] == 'docket'
+    assert docket['docket_number'] == found_docket
+    assert docket['records'] == len(data) == 1
+    assert docket['polls'] >= 1
+    assert docket['turnaround_seconds'] >= 0.1
+    assert docket['total_seconds'] >= docket['turnaround_seconds'] + docket['retrieve_seconds']
+
+def test_failing_observer_does_not_break_requests(jnetclient, events):
+    def broken(event):
+        raise ValueError("broken observer")
+    jnetclient.add_observer(broken)
+    with pytest.warns(UserWarning, match = 'broken observer'):
+        jnetclient.request_docket(found_docket)
+    jnetclient.remove_observer(broken)
+    assert len(events) == 1
+
+def test_jsonl_logger_and_aggregator(server, tmp_path):
+    server.reset()
+    path = str(tmp_path / 'events.jsonl')
+    logger = jnet.instrumentation.JSONLinesLogger(path)
+    aggregator = jnet.instrumentation.TimingAggregator(percentiles = (50, 95))
+    jnetclient = server.client(observers = [logger, aggregator])
+    for n in range(5):
+        jnetclient.request_docket(found_docket)
+    time.sleep(0.15)
+    jnetclient.check_requests(pending_only = False, check = False)
+    logger.close()
+
+    logged = list(jnet.output.iter_ndjson(path))
+    assert [e['event'] for e in logged] == ['request'] * 6 + ['status']
+    assert [e['operation'] for e in logged[:6]].count('RequestCourtCaseEvent') == 5
+    assert logged[-1]['records'] == 5 and logged[-1]['completed'] == 5
+
+    summary = aggregator.summary()
+    assert summary['RequestCourtCaseEvent']['count'] == 5
+    assert summary['RequestCourtCaseEventInfo']['count'] == 1
+    assert summary['status']['count'] == 1
+    assert set(summary['RequestCourtCaseEvent']['network_seconds']) == {'p50', 'p95'}
+    assert 'status' not in summary['RequestCourtCaseEvent']
+    assert 'RequestCourtCaseEvent: 5 calls, 0 errors' in aggregator.report()
+
+def test_aggregator_window():
+    aggregator = jnet.instrumentation.TimingAggregator(percentiles = (50,), window = 10)
+    for n in range(1000):
+        aggregator({'event': 'docket', 'total_seconds': float(n), 'error': None})
+    # only the most recent values are kept, but every event is counted
+    assert len(aggregator.samples['docket']['total_seconds']) == 10
+    summary = aggregator.summary()
+    assert summary['docket']['count'] == 1000
+    assert summary['docket']['total_seconds']['p50'] == pytest.approx(994.5)
+
+def test_percentile():
+    values = [1, 2, 3, 4, 5]
+    assert jnet.instrumentation.percentile(values, 0) == 1
+    assert jnet.instrumentation.percentile(values, 50) == 3
+    assert jnet.instrumentation.percentile(values, 90) == pytest.approx(4.6)
+    assert jnet.instrumentation.percentile(values, 100) == 5
+    assert jnet.instrumentation.percentile([], 50) is None
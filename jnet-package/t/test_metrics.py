@@ -0,0 +1,123 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.metrics
+import urllib.request
+import time
+
+""" Test the metrics registry and the metrics observer against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_metrics.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+not_found_docket = 'CP-51-CR-0000001-2022'
+queued_docket = 'CP-51-CR-0008127-2022'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(turnaround = 0.1, queued_turnaround = 5, not_found = [not_found_docket], queued = [queued_docket]) as server:
+        yield(server)
+
+@pytest.fixture
+def metrics(server):
+    server.reset()
+    return(jnet.metrics.JNETMetrics(jnet.metrics.MetricsRegistry()))
+
+def test_text_format():
+    registry = jnet.metrics.MetricsRegistry()
+    counter = registry.counter('things_total', "Things.", ('kind',))
+    counter.inc(kind = 'a')
+    counter.inc(2, kind = 'b"quoted"')
+    histogram = registry.histogram('wait_seconds', "Waits.", buckets = (0.1, 1))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    histogram.observe(5)
+    registry.gauge('backlog', "Backlog.").set(3)
+
+    text = registry.render()
+    assert "# TYPE things_total counter\n" in text
+    assert 'things_total{kind="a"} 1\n' in text
+    assert 'things_total{kind="b\\"quoted\\""} 2\n' in text
+    assert 'wait_seconds_bucket{le="0.1"} 1\n' in text
+    assert 'wait_seconds_bucket{le="1"} 2\n' in text
+    assert 'wait_seconds_bucket{le="+Inf"} 3\n' in text
+    assert 'wait_seconds_sum 5.55\n' in text
+    assert 'wait_seconds_count 3\n' in text
+    assert 'backlog 3\n' in text
+
+    # asking for an existing metric returns it, but not as another type
+    assert registry.counter('things_total', "Things.", ('kind',)) is counter
+    with pytest.raises(ValueError):
+        registry.gauge('things_total', "Things.")
+    with pytest.raises(ValueError):
+        counter.inc(color = 'red')
+
+def test_client_metrics(server, metrics):
+    jnetclient = server.client(observers = [metrics])
+    for docket_number in (found_docket, not_found_docket, queued_docket):
+        jnetclient.request_docket(docket_number, tracking_id = 'metrics')
+    server.fail_next(1)
+    with pytest.raises(jnet.exceptions.JNETError):
+        jnetclient.check_requests()
+    assert metrics.requests.get(operation = 'RequestCourtCaseEvent', status = '200') == 3
+    assert metrics.errors.get(operation = 'RequestCourtCaseEventInfo', error = 'JNETTransportError') == 1
+
+    time.sleep(0.15)
+    jnetclient.check_requests(check = False)
+    assert metrics.pending.get() == 3
+    assert metrics.status_records.get(state = 'not_found') == 1
+    assert metrics.status_records.get(state = 'queued') == 1
+    assert metrics.status_records.get(state = 'completed') == 1
+
+    # filtered listings, and ones cut off at the record limit, are not the backlog
+    jnetclient.check_requests(docket_number = found_docket)
+    jnetclient.check_requests(tracking_id_prefix = 'none-of-these')
+    with pytest.warns(UserWarning, match = 'limit of 2 records'):
+        jnetclient.check_requests(record_limit = 2)
+    assert metrics.pending.get() == 3
+
+    jnetclient.retrieve_requests(tracking_id = 'metrics', ignore_queued = False)
+    assert metrics.retrievals.get(result = 'completed') == 1
+    assert metrics.retrievals.get(result = 'not_found') == 1
+    assert metrics.retrievals.get(result = 'queued') == 1
+    assert metrics.duration.get(operation = 'ReceiveCourtCaseEvent')['count'] == 3
+
+def test_docket_metrics(server, metrics):
+    jnetclient = server.client(observers = [metrics])
+    jnetclient.fetch_docket_data(found_docket, quiet = True)
+    assert metrics.dockets.get(result = 'ok') == 1
+    assert metrics.poll_cycles.get() >= 1
+    assert metrics.turnaround.get()['count'] == 1
+    assert metrics.turnaround.get()['sum'] >= 0.1
+
+def test_serve_and_write(server, metrics, tmp_path):
+    jnetclient = server.client(observers = [metrics])
+    jnetclient.request_docket(found_docket)
+
+    http = metrics.registry.serve(0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{http.server_address[1]}/metrics") as resp:
+            assert resp.headers['Content-Type'].startswith('text/plain')
+            text = resp.read().decode('utf-8')
+    finally:
+        http.shutdown()
+        http.server_close()
+    assert 'jnet_requests_total{operation="RequestCourtCaseEvent",status="200"} 1' in text
+
+    path = str(tmp_path / 'jnet.prom')
+    metrics.registry.write(path)
+    with open(path) as fh:
+        assert fh.read() == metrics.registry.render()
+
+    stop = metrics.registry.write_every(str(tmp_path / 'periodic.prom'), 0.05)
+    jnetclient.request_docket(found_docket)
+    time.sleep(0.2)
+    stop.set()
+    time.sleep(0.1)
+    with open(tmp_path / 'periodic.prom') as fh:
+        assert 'jnet_requests_total{operation="RequestCourtCaseEvent",status="200"} 2' in fh.read()
@@ -0,0 +1,147 @@
+import pytest
+import jnet
+import jnet.testing
+import time
+
+""" Test the CCE client against the local mock JNET server in `jnet.testing`. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_mock_server.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+queued_docket = 'CP-51-CR-0008127-2022'
+not_found_docket = 'CP-51-CR-0000001-2022'
+invalid_docket = 'NO-TA-DO-CKETNU-MBER'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(
+        turnaround = 0.2,
+        queued = [queued_docket],
+        not_found = [not_found_docket],
+    ) as server:
+        yield(server)
+
+@pytest.fixture
+def jnetclient(server):
+    server.reset()
+    return(server.client())
+
+def test_single_request_pipeline(jnetclient, server):
+    resp = jnetclient.request_docket(found_docket, tracking_id = 'mock-single')
+    assert resp.tracking_id == 'mock-single'
+    assert resp.data['RequestCourtCaseEventResponse']['ResponseStatusDescriptionText'] == 'CCE request queued to AOPC.'
+
+    # not ready until the turnaround has passed
+    assert jnetclient.check_requests(tracking_id = 'mock-single') == []
+    time.sleep(0.3)
+
+    status = jnetclient.check_requests(tracking_id = 'mock-single', docket_number = found_docket)
+    assert len(status) == 1
+    assert status[0]['found'] is True
+    assert status[0]['queued'] is False
+    assert status[0]['docket_number'] == found_docket
+
+    data = jnetclient.retrieve_requests(tracking_id = 'mock-single')
+    assert len(data) == 1
+    assert data[0]['CaseDocketID']['ID'] == found_docket
+
+    # retrieving takes the file out of the pending queue
+    assert jnetclient.check_requests(tracking_id = 'mock-single') == []
+    assert server.counts['RequestCourtCaseEvent'] == 1
+
+def test_fetch_docket_data(jnetclient):
+    data = jnetclient.fetch_docket_data(found_docket, quiet = True)
+    assert len(data) == 1
+    assert data[0]['CaseDocketID']['ID'] == found_docket
+
+def test_queued_then_completed(jnetclient):
+    resp = jnetclient.request_docket(queued_docket)
+    time.sleep(0.3)
+    status = jnetclient.check_requests(tracking_id = resp.tracking_id)
+    assert [s['queued'] for s in status] == [True]
+
+    time.sleep(0.2)
+    status = jnetclient.check_requests(tracking_id = resp.tracking_id)
+    assert sorted(s['queued'] for s in status) == [False, True]
+
+    # only the completed record is returned, but both are cleared from the queue
+    data = jnetclient.retrieve_requests(tracking_id = resp.tracking_id)
+    assert len(data) == 1
+    assert jnetclient.check_requests(tracking_id = resp.tracking_id) == []
+
+def test_not_found_and_invalid(jnetclient):
+    resp = jnetclient.request_docket(not_found_docket)
+    time.sleep(0.3)
+    with pytest.raises(jnet.exceptions.NotFound):
+        jnetclient.check_requests(tracking_id = resp.tracking_id, docket_number = not_found_docket)
+    status = jnetclient.check_requests(tracking_id = resp.tracking_id, check = False)
+    assert status[0]['found'] is False
+    assert status[0]['docket_number'] == not_found_docket
+    with pytest.raises(jnet.exceptions.NotFound):
+        jnetclient.retrieve_file_data(status[0]['file_id'])
+
+    resp = jnetclient.request_docket(invalid_docket)
+    time.sleep(0.3)
+    status = jnetclient.check_requests(tracking_id = resp.tracking_id)[0]
+    assert status['found'] is False
+    assert status['docket_number'] == invalid_docket
+    with pytest.raises(jnet.exceptions.InvalidRequest):
+        jnetclient.retrieve_file_data(status['file_id'])
+
+    with pytest.raises(jnet.exceptions.NoResults):
+        jnetclient.retrieve_file_data('no-such-file')
+
+def test_faults(jnetclient, server):
+    server.fail_next(1, 'Authentication_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.check_requests()
+
+    server.fail_next(1, 'Validation_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationUseridError):
+        jnetclient.check_requests()
+
+    server.fail_next(1)
+    with pytest.raises(jnet.exceptions.JNETTransportError):
+        jnetclient.check_requests()
+
+    # and back to normal
+    assert jnetclient.check_requests() == []
+
+def test_record_limit(jnetclient):
+    for n in range(5):
+        jnetclient.request_docket(f"CP-51-CR-{n:07d}-2023", tracking_id = 'mock-limit')
+    time.sleep(0.3)
+    with pytest.warns(UserWarning, match = 'limit of 3 records'):
+        status = jnetclient.check_requests(record_limit = 3)
+    assert len(status) == 3
+
+def test_fetch_dockets_concurrently(jnetclient, server):
+    dockets = [f"CP-51-CR-{n:07d}-2024" for n in range(8)] + [not_found_docket]
+    # slow the server down enough that overlapping requests are observable
+    server.latency = 0.05
+    try:
+        results = {docket: (data, error) for docket, data, error in jnetclient.fetch_dockets(dockets, concurrency = 4)}
+    finally:
+        server.latency = 0
+
+    assert set(results) == set(dockets)
+    assert all(results[docket][1] is None for docket in dockets[:-1])
+    assert all(results[docket][0][0]['CaseDocketID']['ID'] == docket for docket in dockets[:-1])
+    assert server.peak_in_flight > 1
+
+def test_fetch_dockets_stops_when_closed(jnetclient, server):
+    dockets = [f"CP-51-CR-{n:07d}-2025" for n in range(20)]
+    results = jnetclient.fetch_dockets(dockets, concurrency = 2)
+    taken = [next(results), next(results)]
+    results.close()
+
+    # only the dockets that were in progress were requested, and the rest never were
+    requested = server.counts['RequestCourtCaseEvent']
+    assert requested <= 4
+    time.sleep(0.1)
+    assert server.counts['RequestCourtCaseEvent'] == requested
@@ -0,0 +1,169 @@
+import pytest
+import jnet
+import jnet.cli
+import jnet.testing
+import jnet.negative_cache
+import time
+import datetime
+import pickle
+from jnet.negative_cache import BloomFilter, NotFoundCache
+
+""" Test the cache of docket numbers and OTNs that AOPC did not find, against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_negative_cache.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+not_found_docket = 'CP-51-CR-0000001-2022'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(turnaround = 0.1, not_found = [not_found_docket]) as server:
+        yield(server)
+
+def test_bloom_filter():
+    bloom = BloomFilter(1000, error_rate = 0.01)
+    for n in range(1000):
+        bloom.add(f"docket:{n}")
+    assert all(f"docket:{n}" in bloom for n in range(1000))
+    false_positives = sum(f"other:{n}" in bloom for n in range(10000))
+    assert false_positives < 300
+
+def test_add_check_and_expire():
+    cache = NotFoundCache(recheck_after = 60)
+    assert cache.checked('docket', not_found_docket) is None
+    cache.check('docket', not_found_docket)
+
+    cache.add('docket', not_found_docket.lower())
+    assert len(cache) == 1
+    assert cache.is_not_found('docket', not_found_docket)
+    assert not cache.is_not_found('otn', not_found_docket)
+    with pytest.raises(jnet.exceptions.NotFound) as excinfo:
+        cache.check('docket', not_found_docket)
+    assert excinfo.value.data['identifier'] == not_found_docket
+
+    # an older result does not move the entry back
+    assert not cache.add('docket', not_found_docket, checked = time.time() - 120)
+    assert cache.is_not_found('docket', not_found_docket)
+
+    # an old entry is requested again, and removed by a purge
+    assert cache.add('otn', 'N12345678', checked = time.time() - 120)
+    assert not cache.is_not_found('otn', 'N12345678')
+    assert cache.purge() == 1
+    assert len(cache) == 1
+
+def test_record_activity():
+    cache = NotFoundCache()
+    assert cache.record_activity(f"DOCKET NOT FOUND: {not_found_docket} aopc:error") == ('docket', not_found_docket)
+    assert cache.record_activity("OTN NOT FOUND: N12345678 aopc:error") == ('otn', 'N12345678')
+    assert cache.record_activity(f"Invalid Request Object! Docket Number not supported!NO-TA-DOCKETaopc:error") is None
+    assert len(cache) == 2
+
+    # a docket that has since been found is removed
+    cache.record_activity(f"Completed DOCKET NUMBER {not_found_docket}")
+    assert not cache.is_not_found('docket', not_found_docket)
+
+def status_record(text, created):
+    return({'HeaderField': [
+        {'HeaderName': 'ActivityTypeText', 'HeaderValueText': text},
+        {'HeaderName': 'CreationDateTime', 'HeaderValueText': created},
+    ]})
+
+def test_record_uses_the_record_time():
+    cache = NotFoundCache(recheck_after = 3600)
+    day_old = time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(time.time() - 86400))
+    an_hour_ago = time.time() - 3000
+    not_found = status_record(f"DOCKET NOT FOUND: {not_found_docket} aopc:error", day_old)
+
+    # a result from yesterday has already expired, however often the listing repeats it
+    for poll in range(2):
+        cache.record([not_found])
+        assert not cache.is_not_found('docket', not_found_docket)
+    assert abs(cache.checked('docket', not_found_docket) - (time.time() - 86400)) < 2
+
+    # a newer result moves the entry forward, and the old record does not move it back
+    cache.add('docket', not_found_docket, checked = an_hour_ago)
+    cache.record([not_found])
+    assert cache.checked('docket', not_found_docket) == an_hour_ago
+
+    # once it is found, the older NOT FOUND records in the listing do not add it back
+    found = status_record(f"Completed DOCKET NUMBER {not_found_docket}", datetime.datetime.now(datetime.timezone.utc).isoformat())
+    assert cache.record([not_found, found]) == []
+    assert cache.checked('docket', not_found_docket) is None
+    assert cache.record([not_found]) == []
+    assert not cache.add('docket', not_found_docket, checked = an_hour_ago)
+    assert cache.checked('docket', not_found_docket) is None
+
+    # but a NOT FOUND after that does
+    assert cache.add('docket', not_found_docket)
+    assert cache.is_not_found('docket', not_found_docket)
+
+def test_persistent(tmp_path):
+    path = (tmp_path / 'not-found.sqlite3').as_posix()
+    cache = NotFoundCache(path)
+    cache.add('docket', not_found_docket)
+    cache.close()
+
+    assert NotFoundCache(path).is_not_found('docket', not_found_docket)
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.is_not_found('docket', not_found_docket)
+
+def test_bloom_filter_grows():
+    cache = NotFoundCache(capacity = 10)
+    for n in range(50):
+        cache.add('docket', f"CP-51-CR-{n:07d}-2022")
+    assert cache._bloom.capacity >= 50
+    assert all(cache.is_not_found('docket', f"CP-51-CR-{n:07d}-2022") for n in range(50))
+
+def test_client_short_circuits(server):
+    cache = NotFoundCache()
+    jnetclient = server.client(negative_cache = cache)
+    jnetclient.poll_delay = 0
+    jnetclient.poll_interval = 0.05
+
+    # the first time, the not found record is retrieved as usual, and cached
+    jnetclient.fetch_docket_data(not_found_docket, quiet = True)
+    assert cache.is_not_found('docket', not_found_docket)
+
+    # the second time, nothing is sent
+    requested = server.counts['RequestCourtCaseEvent']
+    with pytest.raises(jnet.exceptions.NotFound):
+        jnetclient.fetch_docket_data(not_found_docket, quiet = True)
+    with pytest.raises(jnet.exceptions.NotFound):
+        jnetclient.request_docket(not_found_docket)
+    assert server.counts['RequestCourtCaseEvent'] == requested
+
+    # found dockets are not affected
+    assert len(jnetclient.fetch_docket_data(found_docket, quiet = True))
+
+    # building the request without sending it is still allowed
+    assert jnetclient.request_docket(not_found_docket, send_request = False) is not None
+
+def test_fed_by_retrieve(server):
+    jnetclient = server.client()
+    resp = jnetclient.request_docket(not_found_docket)
+    time.sleep(0.2)
+    status = jnetclient.check_requests(tracking_id = resp.tracking_id, check = False)
+
+    jnetclient.negative_cache = NotFoundCache()
+    jnetclient.retrieve_file_data(status[0]['file_id'], check = False)
+    assert jnetclient.negative_cache.is_not_found('docket', not_found_docket)
+
+    # and from cleaned status records
+    cache = NotFoundCache()
+    assert cache.record(status) == [('docket', not_found_docket)]
+
+def test_without_cache_requests_again(server):
+    jnetclient = server.client()
+    assert jnetclient.negative_cache is None
+    requested = server.counts['RequestCourtCaseEvent']
+    jnetclient.request_docket(not_found_docket)
+    assert server.counts['RequestCourtCaseEvent'] == requested + 1
+
+def test_cli_options(tmp_path):
+    args = jnet.cli.build_parser().parse_args(['fetch', found_docket, '--not-found-cache', (tmp_path / 'cache.sqlite3').as_posix(), '--recheck-days', '1'])
+    assert args.recheck_days == 1
@@ -0,0 +1,56 @@
+import pytest
+import jnet
+import gzip
+import json
+
+""" Test the line-delimited json output helpers. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_output.py
+```
+"""
+
+records = [{'CaseDocketID': {'ID': f"CP-51-CR-{n:07d}-2022"}, 'index': n} for n in range(1050)]
+
+@pytest.mark.parametrize('filename', ['out.ndjson', 'out.jsonl.gz', 'out.ndjson.zst'])
+def test_write_and_read(tmp_path, filename):
+    if filename.endswith('.zst'):
+        pytest.importorskip('zstandard')
+
+    path = (tmp_path / filename).as_posix()
+    with jnet.output.NDJSONWriter(path, flush_every = 100) as writer:
+        writer.write_all(records)
+    assert writer.count == len(records)
+
+    assert list(jnet.output.iter_ndjson(path)) == records
+
+    # the file can be split and every chunk loaded independently
+    chunks = jnet.output.ndjson_chunks(path, target_size = 1024)
+    assert len(chunks) > 1
+    loaded = []
+    for offset, length in chunks:
+        loaded.extend(jnet.output.read_ndjson_chunk(path, offset, length))
+    assert loaded == records
+
+def test_gzip_members_are_standard(tmp_path):
+    path = (tmp_path / 'out.ndjson.gz').as_posix()
+    with jnet.output.NDJSONWriter(path, flush_every = 10) as writer:
+        writer.write_all(records[:25])
+
+    # multiple members are still readable by the standard library
+    with gzip.open(path, 'rt') as fh:
+        assert [json.loads(line) for line in fh] == records[:25]
+
+    with open(jnet.output.index_path(path)) as fh:
+        index = [line.split("\t") for line in fh]
+    assert [int(entry[2]) for entry in index] == [10, 10, 5]
+
+def test_ndjson_path():
+    assert jnet.output.is_ndjson_path('dockets.ndjson')
+    assert jnet.output.is_ndjson_path('dockets.jsonl.gz')
+    assert jnet.output.is_ndjson_path('dockets.ndjson.zst')
+    assert not jnet.output.is_ndjson_path('dockets.json')
+    assert not jnet.output.is_ndjson_path('dockets.json.gz')
+    assert not jnet.output.is_ndjson_path(None)
@@ -0,0 +1,85 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.transport
+import os
+import pickle
+import warnings
+import multiprocessing
+import concurrent.futures
+
+""" Test sharing a client with process pools, through pickling and through fork, against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_process_pool.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+# the client inherited by forked workers, and what each worker found when it started
+shared_client = None
+inherited = None
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET() as server:
+        yield(server)
+
+def request_in_worker(client, n):
+    resp = client.request_docket(found_docket, tracking_id = f"worker-{n}")
+    return(os.getpid(), resp.tracking_id)
+
+def inherited_state(n):
+    global inherited
+    if inherited is None:
+        # what the forked worker inherited, before its first request
+        inherited = (shared_client._zeep is not None, shared_client.transport._session is None)
+    resp = shared_client.request_docket(found_docket, tracking_id = f"fork-{n}")
+    return(inherited + (resp.tracking_id,))
+
+def test_pickle_round_trip(server):
+    jnetclient = server.client()
+    jnetclient.request_docket(found_docket)
+    assert jnetclient._zeep is not None and jnetclient.transport._session is not None
+
+    copy = pickle.loads(pickle.dumps(jnetclient))
+    assert type(copy) is type(jnetclient)
+    assert copy._zeep is None
+    assert copy.transport._session is None
+    assert copy.endpoint == jnetclient.endpoint and copy.poll_delay == jnetclient.poll_delay
+
+    # the certificate travels with the client, so the PFX is not needed again
+    copy.client_certificate = '/no/such/certificate.pfx'
+    assert copy.request_docket(found_docket, tracking_id = 'unpickled').tracking_id == 'unpickled'
+    assert copy._zeep is not None
+
+def test_process_pool(server):
+    jnetclient = server.client()
+    context = multiprocessing.get_context('spawn')
+    with concurrent.futures.ProcessPoolExecutor(max_workers = 2, mp_context = context) as pool:
+        results = list(pool.map(request_in_worker, [jnetclient] * 4, range(4)))
+    assert [tracking_id for pid, tracking_id in results] == [f"worker-{n}" for n in range(4)]
+    assert os.getpid() not in {pid for pid, tracking_id in results}
+    assert server.counts['RequestCourtCaseEvent'] >= 4
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason = 'fork is not available on this platform')
+def test_warm_up_before_fork(server):
+    global shared_client
+    shared_client = server.client().warm_up()
+    shared_client.request_docket(found_docket)
+    assert shared_client._zeep is not None and shared_client.transport._session is not None
+
+    context = multiprocessing.get_context('fork')
+    with warnings.catch_warnings():
+        # the mock server thread is running, which python warns about when forking
+        warnings.simplefilter('ignore', DeprecationWarning)
+        with concurrent.futures.ProcessPoolExecutor(max_workers = 2, mp_context = context) as pool:
+            results = list(pool.map(inherited_state, range(4)))
+
+    # the workers inherit the loaded zeep client, but not the parent's connections
+    assert all(has_zeep and no_session for has_zeep, no_session, tracking_id in results)
+    assert [tracking_id for has_zeep, no_session, tracking_id in results] == [f"fork-{n}" for n in range(4)]
+    assert shared_client.transport._session is not None
@@ -0,0 +1,101 @@
+import pytest
+import jnet
+import jnet.synthetic
+from jnet.response import SOAPResponse
+import jnet.output
+import os
+import time
+
+""" Test the synthetic data generator in `jnet.synthetic`. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_synthetic.py
+```
+"""
+
+def test_court_case_event_reply_sizes():
+    generator = jnet.synthetic.SyntheticCCE(seed = 1)
+    resp = SOAPResponse(xml = generator.court_case_event_reply(7, participants = 3, charges = 5, events = 12))
+    data = resp.data['ReceiveCourtCaseEventReply']
+    assert data['ResponseMetadata']['BackendSystemReturn']['BackendSystemReturnCode'] == 'SUCCESS'
+    assert data['CourtCaseEvent']['CaseDocketID']['ID'] == 'CP-51-CR-0000007-2022'
+    assert len(data['CourtCaseEvent']['CaseParticipant']) == 3
+    assert data['CourtCaseEvent']['CaseParticipant'][0]['CaseParticipantRoleText'] == 'Defendant'
+    assert len(data['CourtCaseEvent']['Charge']) == 5
+    assert len(data['CourtCaseEvent']['CaseCalendarEvent']) == 12
+
+def test_size_ranges():
+    generator = jnet.synthetic.SyntheticCCE(seed = 1, participants = 1, charges = (2, 4), events = 0)
+    for index in range(20):
+        data = SOAPResponse(xml = generator.court_case_event_reply(index)).data['ReceiveCourtCaseEventReply']['CourtCaseEvent']
+        assert 2 <= len(data['Charge']) <= 4
+        assert 'CaseCalendarEvent' not in data
+
+def test_reproducible():
+    first = jnet.synthetic.SyntheticCCE(seed = 5)
+    second = jnet.synthetic.SyntheticCCE(seed = 5)
+    # the docket at an index does not depend on what was generated before it
+    second.court_case_event_reply(0)
+    assert first.court_case_event_reply(3) == second.court_case_event_reply(3)
+    assert first.status_listing(50) == second.status_listing(50)
+    assert jnet.synthetic.SyntheticCCE(seed = 6).court_case_event_reply(3) != first.court_case_event_reply(3)
+
+def test_status_listing_kinds():
+    generator = jnet.synthetic.SyntheticCCE(seed = 2)
+    kinds = list(jnet.synthetic.STATUS_KINDS)
+    data = SOAPResponse(xml = generator.status_listing(len(kinds) * 10, kinds = kinds)).data
+    assert data['RequestCourtCaseEventInfoResponse']['RecordCount'] == str(len(kinds) * 10)
+
+    results = jnet.CCE.clean_info_response_data(data)
+    assert len(results) == len(kinds) * 10
+    for kind, result in zip(kinds, results):
+        if kind == 'completed':
+            assert result['found'] is True and result['queued'] is False and result['type'] == 'docket_number'
+        elif kind == 'queued':
+            assert result['queued'] is True and result['docket_number'] == generator.docket_number(int(result['file_id']))
+        elif kind in ('not_found', 'invalid'):
+            assert result['found'] is False and result['type'] == 'docket_number'
+        elif kind == 'participant':
+            assert result['found'] is True and result['type'] == 'participant'
+            assert set(result['participant_details']) == {'first_name', 'last_name', 'birth_date'}
+        elif kind == 'participant_not_found':
+            assert result['found'] is False and result['type'] == 'participant'
+
+def test_status_listing_single_record():
+    data = SOAPResponse(xml = jnet.synthetic.SyntheticCCE().status_listing(1, kinds = ['completed'])).data
+    assert len(jnet.CCE.clean_info_response_data(data)) == 1
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        jnet.synthetic.SyntheticCCE().status_record(0, kind = 'bogus')
+
+def test_write_corpus(tmp_path):
+    generator = jnet.synthetic.SyntheticCCE(seed = 3)
+
+    written = generator.write_corpus(str(tmp_path / 'xml'), 5, start = 10)
+    files = sorted(os.listdir(tmp_path / 'xml'))
+    assert files == [f"CP-51-CR-{n:07d}-2022.xml" for n in range(10, 15)]
+    assert written == sum(os.path.getsize(tmp_path / 'xml' / f) for f in files)
+
+    path = str(tmp_path / 'corpus.jsonl.gz')
+    generator.write_corpus(path, 5, start = 10)
+    records = list(jnet.output.iter_ndjson(path))
+    assert [r['docket_number'] for r in records] == [f"CP-51-CR-{n:07d}-2022" for n in range(10, 15)]
+    assert records[0]['xml'] == generator.court_case_event_reply(10)
+
+def test_generation_speed():
+    generator = jnet.synthetic.SyntheticCCE(seed = 4)
+    started = time.perf_counter()
+    size = sum(len(xml) for docket_number, xml in generator.corpus(200))
+    elapsed = time.perf_counter() - started
+    # several MB/s even on slow machines, so gigabytes take minutes rather than hours
+    assert size / elapsed > 1024 * 1024, f"Generated {size} bytes in {elapsed:.2f}s"
+
+def test_cli(tmp_path):
+    import jnet.cli
+    jnet.cli.main(['synthetic', '-o', str(tmp_path / 'corpus.jsonl'), '-n', '3', '--charges', '1-2', '--seed', '9'])
+    records = list(jnet.output.iter_ndjson(str(tmp_path / 'corpus.jsonl')))
+    assert len(records) == 3
+    assert records[2]['xml'] == jnet.synthetic.SyntheticCCE(seed = 9, charges = (1, 2)).court_case_event_reply(2)
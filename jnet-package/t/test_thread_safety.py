@@ -0,0 +1,96 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.instrumentation
+import jnet.synthetic
+import threading
+import concurrent.futures
+
+""" Hammer a single shared client from many threads against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_thread_safety.py
+```
+"""
+
+workers = 32
+
+def docket(n):
+    return(f"CP-51-CR-{n:07d}-2021")
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(turnaround = 0.05, latency = 0.01) as server:
+        yield(server)
+
+def run_all(func, count):
+    """ Start every call at once on a pool of `workers` threads and return the results in order. """
+    barrier = threading.Barrier(workers)
+
+    def call(n):
+        if n < workers:
+            barrier.wait()
+        return(func(n))
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers = workers) as pool:
+        return(list(pool.map(call, range(count))))
+
+def test_concurrent_cold_start(server, monkeypatch):
+    server.reset()
+    jnetclient = server.client()
+    built = []
+    original = jnetclient.configure_client
+    monkeypatch.setattr(jnetclient, 'configure_client', lambda client: built.append(client) or original(client))
+
+    results = run_all(lambda n: jnetclient.request_docket(docket(n), tracking_id = f"cold-{n}"), workers)
+
+    # every thread raced to initialize the client, but only one zeep client was built
+    assert len(built) == 1
+    assert jnetclient.zeep is built[0]
+    assert [r.tracking_id for r in results] == [f"cold-{n}" for n in range(workers)]
+    assert server.counts['RequestCourtCaseEvent'] == workers
+
+def test_shared_client_full_cycle(server):
+    server.reset()
+    events = []
+    lock = threading.Lock()
+
+    def observer(event):
+        with lock:
+            events.append(event)
+
+    jnetclient = server.client(observers = [observer])
+
+    def fetch(n):
+        return(jnetclient.fetch_docket_data(docket(n), quiet = True))
+
+    count = workers * 3
+    results = run_all(fetch, count)
+
+    for n, data in enumerate(results):
+        assert len(data) == 1
+        assert data[0]['CaseDocketID']['ID'] == docket(n)
+
+    # every call reported its own operation and tracking id, with nothing leaking between threads
+    requests = [e for e in events if e['event'] == 'request']
+    assert len(requests) == sum(server.counts.values())
+    assert all(e['error'] is None for e in requests)
+    sent = {e['tracking_id'] for e in requests if e['operation'] == 'RequestCourtCaseEvent'}
+    assert len(sent) == count
+    dockets = sorted(e['docket_number'] for e in events if e['event'] == 'docket')
+    assert dockets == sorted(docket(n) for n in range(count))
+    assert server.peak_in_flight > 1
+
+def test_shared_response_data():
+    xml = jnet.synthetic.SyntheticCCE(seed = 37).court_case_event_reply(1)
+    response = jnet.response.SOAPResponse(xml = xml)
+    results = run_all(lambda n: response.data, workers)
+    assert all(data is results[0] for data in results)
+
+def test_no_timer_leaks_between_threads(server):
+    server.reset()
+    jnetclient = server.client()
+    run_all(lambda n: jnetclient.request_docket(docket(n)), workers)
+    assert jnet.instrumentation.current_timer() is None
@@ -0,0 +1,138 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.tracing
+import jnet.output
+
+""" Test tracing spans against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_tracing.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(turnaround = 0.1) as server:
+        yield(server)
+
+@pytest.fixture
+def exporter():
+    return(jnet.tracing.InMemorySpanExporter())
+
+@pytest.fixture
+def jnetclient(server, exporter):
+    server.reset()
+    return(server.client(tracer = jnet.tracing.RecordingTracer(exporter)))
+
+def test_default_tracer_is_noop(server):
+    jnetclient = server.client()
+    assert jnetclient.tracer is jnet.tracing.NOOP_TRACER
+    with jnetclient.tracer.span('anything') as span:
+        span.set_attribute('ignored', True)
+    jnetclient.request_docket(found_docket)
+
+def test_request_span(jnetclient, exporter):
+    jnetclient.request_docket(found_docket, tracking_id = 'traced')
+    names = [s.name for s in exporter.spans]
+    assert names == ['jnet.sign', 'jnet.network', 'jnet.parse', 'jnet RequestCourtCaseEvent']
+
+    request = exporter.spans[-1]
+    assert request.parent_id is None
+    assert request.attributes['jnet.tracking_id'] == 'traced'
+    assert request.attributes['http.response.status_code'] == 200
+    assert request.status == 'OK'
+    for child in exporter.spans[:-1]:
+        assert child.trace_id == request.trace_id
+        assert child.parent_id == request.span_id
+        assert request.start_time <= child.start_time <= child.end_time <= request.end_time
+
+def test_fetch_docket_span_tree(jnetclient, exporter):
+    jnetclient.fetch_docket_data(found_docket, quiet = True)
+    spans = {s.span_id: s for s in exporter.spans}
+    root = exporter.spans[-1]
+    assert root.name == 'jnet.fetch_docket_data'
+    assert root.parent_id is None
+    assert root.attributes['jnet.docket_number'] == found_docket
+    assert root.attributes['jnet.records'] == 1
+    assert len({s.trace_id for s in exporter.spans}) == 1
+
+    calls = [s for s in exporter.spans if s.parent_id == root.span_id]
+    operations = [s.attributes['rpc.method'] for s in calls]
+    assert operations[0] == 'RequestCourtCaseEvent'
+    assert operations.count('RequestCourtCaseEventInfo') == root.attributes['jnet.polls'] + 1
+    assert operations[-1] == 'ReceiveCourtCaseEvent'
+
+    # the phases hang off of the SOAP calls
+    for span in exporter.spans:
+        if span.name in ('jnet.sign', 'jnet.network', 'jnet.parse'):
+            assert spans[span.parent_id] in calls
+
+def test_error_status(jnetclient, exporter, server):
+    server.fail_next(1)
+    with pytest.raises(jnet.exceptions.JNETTransportError):
+        jnetclient.fetch_docket_data(found_docket, quiet = True)
+    request, root = exporter.spans[-2:]
+    assert request.name == 'jnet RequestCourtCaseEvent'
+    assert request.status == 'ERROR'
+    assert request.attributes['http.response.status_code'] == 500
+    assert root.name == 'jnet.fetch_docket_data'
+    assert root.status == 'ERROR'
+    assert root.status_message.startswith('JNETTransportError')
+
+def test_jsonl_exporter(server, tmp_path):
+    server.reset()
+    path = str(tmp_path / 'spans.jsonl')
+    tracer = jnet.tracing.RecordingTracer(jnet.tracing.JSONLinesSpanExporter(path))
+    jnetclient = server.client(tracer = tracer)
+    jnetclient.request_docket(found_docket)
+    tracer.close()
+
+    spans = list(jnet.output.iter_ndjson(path))
+    assert [s['name'] for s in spans][-1] == 'jnet RequestCourtCaseEvent'
+    assert len(spans[-1]['trace_id']) == 32 and len(spans[-1]['span_id']) == 16
+    assert spans[0]['parent_span_id'] == spans[-1]['span_id']
+    assert spans[-1]['duration_ms'] > 0
+    assert spans[-1]['status']['code'] == 'OK'
+
+def test_opentelemetry_tracer(server):
+    pytest.importorskip('opentelemetry.sdk')
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    otel_exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(otel_exporter))
+    jnetclient = server.client(tracer = jnet.tracing.OpenTelemetryTracer(provider.get_tracer('jnet')))
+    jnetclient.request_docket(found_docket)
+
+    spans = otel_exporter.get_finished_spans()
+    request = spans[-1]
+    assert request.name == 'jnet RequestCourtCaseEvent'
+    assert {s.name for s in spans[:-1]} == {'jnet.sign', 'jnet.network', 'jnet.parse'}
+    assert all(s.parent.span_id == request.context.span_id for s in spans[:-1])
+
+def test_attributes_without_values(jnetclient, exporter, server):
+    # a status check has no file id, and a failed call has no status
+    jnetclient.check_requests(pending_only = False)
+    server.fail_next(1)
+    with pytest.raises(jnet.exceptions.JNETTransportError):
+        jnetclient.fetch_docket_data(found_docket, quiet = True)
+    for span in exporter.spans:
+        assert None not in span.attributes.values(), span.name
+
+def test_error_is_not_rendered():
+    tracer = jnet.tracing.RecordingTracer(jnet.tracing.InMemorySpanExporter())
+    error = jnet.exceptions.JNETError(data = {'reason': 'details'})
+    with pytest.raises(jnet.exceptions.JNETError):
+        with tracer.span('jnet.test'):
+            raise error
+    span = tracer.exporter.spans[-1]
+    assert span.status_message == 'JNETError: A JNET Exception occurred!'
+    # the message only gets its details once it is used
+    assert not error._rendered
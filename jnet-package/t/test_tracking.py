@@ -0,0 +1,114 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.tracking
+import re
+import pickle
+import concurrent.futures
+
+""" Test the generation of unique tracking ids, and listing a batch of requests by their prefix against the local mock JNET server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_tracking.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+id_format = re.compile(r'^\d{4}-\d\d-\d\d-\d{6}-[0-9a-z]+-\d{4}$')
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET() as server:
+        yield(server)
+
+def test_format_and_order():
+    generator = jnet.tracking.TrackingIdGenerator(worker = 'w1')
+    ids = [generator() for _ in range(100)]
+    assert all(id_format.match(tracking_id) for tracking_id in ids)
+    assert all('-w1-' in tracking_id for tracking_id in ids)
+    assert ids == sorted(ids)
+    assert len(set(ids)) == 100
+
+def test_random_worker_tag():
+    tag = jnet.tracking.random_worker_tag()
+    assert re.match(r'^[0-9a-z]{6}$', tag)
+    assert jnet.tracking.TrackingIdGenerator().worker != jnet.tracking.TrackingIdGenerator().worker
+
+def test_invalid_worker():
+    with pytest.raises(ValueError):
+        jnet.tracking.TrackingIdGenerator(worker = 'a-b')
+
+def test_unique_across_threads():
+    generator = jnet.tracking.TrackingIdGenerator()
+    with concurrent.futures.ThreadPoolExecutor(max_workers = 8) as pool:
+        batches = list(pool.map(lambda n: [generator() for _ in range(500)], range(8)))
+    ids = [tracking_id for batch in batches for tracking_id in batch]
+    assert len(set(ids)) == len(ids) == 4000
+    # each thread's ids are in the order they were generated
+    assert all(batch == sorted(batch) for batch in batches)
+
+def test_sequence_overflow(monkeypatch):
+    monkeypatch.setattr(jnet.tracking.time, 'time', lambda: 1_700_000_000.5)
+    generator = jnet.tracking.TrackingIdGenerator(worker = 'w')
+    ids = [generator() for _ in range(10 ** jnet.tracking.SEQUENCE_DIGITS + 2)]
+    assert len(set(ids)) == len(ids)
+    assert ids == sorted(ids)
+    # the ids that did not fit borrow the next second
+    assert ids[-1].endswith('-w-0001')
+    assert ids[-1][:17] > ids[0][:17]
+
+def test_clock_going_back(monkeypatch):
+    now = [1_700_000_010.0]
+    monkeypatch.setattr(jnet.tracking.time, 'time', lambda: now[0])
+    generator = jnet.tracking.TrackingIdGenerator(worker = 'w')
+    first = generator()
+    now[0] -= 5
+    second = generator()
+    assert second > first
+
+def test_utc_stamps(monkeypatch):
+    # 1:30 and then 1:15 in Philadelphia, as daylight saving time ends in between
+    now = [1_762_061_400.0]
+    monkeypatch.setattr(jnet.tracking.time, 'time', lambda: now[0])
+    first = jnet.tracking.TrackingIdGenerator(worker = 'w')()
+    now[0] += 45 * 60
+    second = jnet.tracking.TrackingIdGenerator(worker = 'w')()
+    assert first.startswith('2025-11-02-053000-w-')
+    assert second.startswith('2025-11-02-061500-w-')
+    assert second > first
+
+def test_batch():
+    generator = jnet.tracking.TrackingIdGenerator(prefix = 'dao-', worker = 'w2')
+    batch = generator.batch('nightly')
+    tracking_id = batch()
+    assert tracking_id.startswith('dao-nightly-')
+    assert id_format.match(tracking_id[len('dao-nightly-'):])
+    assert batch.worker == 'w2'
+
+def test_pickle_renews_random_worker():
+    generator = jnet.tracking.TrackingIdGenerator()
+    copy = pickle.loads(pickle.dumps(generator))
+    assert copy.worker != generator.worker
+    assert copy() != generator()
+
+    fixed = jnet.tracking.TrackingIdGenerator(worker = 'w3')
+    assert pickle.loads(pickle.dumps(fixed)).worker == 'w3'
+
+def test_client_uses_generator(server):
+    jnetclient = server.client()
+    assert jnetclient.tracking_ids is jnet.tracking.default_generator
+
+    resp = jnetclient.request_docket(found_docket)
+    assert id_format.match(resp.tracking_id)
+
+def test_check_batch_by_prefix(server):
+    jnetclient = server.client(tracking_ids = jnet.tracking.TrackingIdGenerator(prefix = 'batch-a-'))
+    requested = {jnetclient.request_docket(found_docket).tracking_id for _ in range(3)}
+    other = server.client().request_docket(found_docket).tracking_id
+
+    listed = jnetclient.check_requests(pending_only = False, tracking_id_prefix = 'batch-a-')
+    assert {req['tracking_id'] for req in listed} == requested
+    assert other not in {req['tracking_id'] for req in listed}
@@ -0,0 +1,185 @@
+import pytest
+import jnet
+import jnet.testing
+import jnet.transport
+import time
+
+""" Test recording and replaying JNET exchanges with the transports in `jnet.transport`, using the local mock server. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_transport.py
+```
+"""
+
+docket_number = 'CP-51-CR-0000100-2021'
+not_found_docket = 'CP-51-CR-0000001-2022'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET(not_found = [not_found_docket], latency = 0.05) as server:
+        yield(server)
+
+@pytest.fixture
+def recording(server, tmp_path):
+    """ Record a session against the mock server and return the archive path. """
+    server.reset()
+    path = (tmp_path / 'session.jsonl.gz').as_posix()
+    recorder = jnet.transport.RecordingTransport(path)
+    jnetclient = server.client(transport = recorder)
+    jnetclient.request_docket(docket_number, tracking_id = 'record-1')
+    jnetclient.request_docket(not_found_docket, tracking_id = 'record-2')
+    jnetclient.check_requests()
+    server.fail_next(1, 'Authentication_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.check_requests()
+    recorder.close()
+    return(path)
+
+def test_recording_is_redacted(recording):
+    records = list(jnet.output.iter_ndjson(recording))
+    assert [r['operation'] for r in records] == ['RequestCourtCaseEvent', 'RequestCourtCaseEvent', 'RequestCourtCaseEventInfo', 'RequestCourtCaseEventInfo']
+    for record in records:
+        assert 'MOCK-USER' not in record['request']
+        assert 'BinarySecurityToken' not in record['request']
+        assert 'SignatureValue' not in record['request']
+    assert records[3]['status_code'] == 500
+    assert records[0]['elapsed'] >= 0.05
+
+def test_replay(recording, server):
+    server.reset()
+    jnetclient = server.client(transport = jnet.transport.ReplayTransport(recording))
+
+    resp = jnetclient.request_docket(docket_number, tracking_id = 'replay-1')
+    assert resp.data['RequestCourtCaseEventResponse']['ResponseStatusCode'] == 'SUCCESS'
+    jnetclient.request_docket(not_found_docket)
+
+    started = time.monotonic()
+    status = jnetclient.check_requests()
+    assert time.monotonic() - started < 0.05
+    assert sorted(s['docket_number'] for s in status) == sorted([docket_number, not_found_docket])
+    assert [s['tracking_id'] for s in status] == ['record-1', 'record-2']
+
+    # errors are replayed too
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.check_requests()
+
+    with pytest.raises(jnet.exceptions.JNETError, match = 'have been replayed'):
+        jnetclient.check_requests()
+
+    # nothing reached the server
+    assert sum(server.counts.values()) == 0
+
+def test_replay_timing(recording, server):
+    jnetclient = server.client(transport = jnet.transport.ReplayTransport(recording, timing = 'original', loop = True))
+    started = time.monotonic()
+    jnetclient.request_docket(docket_number)
+    assert time.monotonic() - started >= 0.05
+
+    with pytest.raises(ValueError):
+        jnet.transport.ReplayTransport(recording, timing = 'fast')
+
+@pytest.fixture(scope = 'module')
+def tls_server():
+    with jnet.testing.MockJNET(tls = True) as server:
+        yield(server)
+
+def test_tls_session_resumption(tls_server):
+    tls_server.reset()
+    jnetclient = tls_server.client()
+    assert jnetclient.endpoint.startswith('https://')
+
+    # pooled requests share one connection, and new connections resume the first session
+    for n in range(3):
+        jnetclient.request_docket(docket_number)
+    assert tls_server.handshakes == {'full': 1}
+    for n in range(3):
+        jnetclient.transport.close()
+        jnetclient.request_docket(docket_number)
+    assert tls_server.handshakes == {'full': 1, 'resumed': 3}
+
+    # the certificate chain was loaded into one context for the endpoint
+    assert list(jnetclient.transport.adapter._contexts) == [tls_server.server_certificate]
+    assert jnetclient.transport.ssl_context(tls_server.server_certificate).verify_mode == jnet.transport.ssl.CERT_REQUIRED
+
+def test_tls_verification(tls_server):
+    import requests
+    import certifi
+    # the mock certificate is not in the certifi bundle
+    jnetclient = tls_server.client(server_certificate = certifi.where())
+    with pytest.raises(requests.exceptions.SSLError):
+        jnetclient.request_docket(docket_number)
+
+    # requests still warns about unverified connections
+    jnetclient = tls_server.client(server_certificate = False)
+    with pytest.warns(requests.packages.urllib3.exceptions.InsecureRequestWarning):
+        assert jnetclient.request_docket(docket_number, tracking_id = 'unverified').tracking_id == 'unverified'
+
+def test_cert_verify_without_pool_key_hook(tls_server, monkeypatch):
+    import types
+    adapter = jnet.transport.SSLContextAdapter()
+    url = f"https://{tls_server.host}:{tls_server.port}/"
+
+    # the adapter's SSLContext holds the certificates, so they are not set on the connection pool
+    pool = types.SimpleNamespace(cert_reqs = None, ca_certs = None, ca_cert_dir = None)
+    adapter.cert_verify(pool, url, tls_server.server_certificate, None)
+    assert pool.ca_certs is None
+
+    # requests before 2.32 never asks the adapter for the SSLContext, so the pool must verify the stock way
+    monkeypatch.setattr(jnet.transport, '_has_pool_key_hook', False)
+    adapter.cert_verify(pool, url, tls_server.server_certificate, None)
+    assert pool.cert_reqs == 'CERT_REQUIRED'
+    assert pool.ca_certs == tls_server.server_certificate
+
+@pytest.fixture(scope = 'module')
+def compressing_server():
+    with jnet.testing.MockJNET(compress = True) as server:
+        yield(server)
+
+def test_compressed_replies(compressing_server):
+    compressing_server.reset()
+    jnetclient = compressing_server.client()
+    data = jnetclient.fetch_docket_data(docket_number, quiet = True)
+    assert data[0]['CaseDocketID']['ID'] == docket_number
+
+    # every reply was gzipped, but requests are only compressed when asked to
+    assert compressing_server.response_encodings == {'gzip': sum(compressing_server.counts.values())}
+    assert compressing_server.request_encodings == {'identity': sum(compressing_server.counts.values())}
+
+    # faults are decompressed before they are classified
+    compressing_server.fail_next(1, 'Authentication_Error')
+    with pytest.raises(jnet.exceptions.AuthenticationError):
+        jnetclient.check_requests()
+
+def test_compressed_requests(compressing_server):
+    compressing_server.reset()
+    jnetclient = compressing_server.client(transport = jnet.transport.RequestsTransport(compress_requests = True))
+    assert jnetclient.request_docket(docket_number, tracking_id = 'compressed').tracking_id == 'compressed'
+    assert compressing_server.request_encodings == {'gzip': 1}
+
+    # small bodies are not worth compressing
+    transport = jnet.transport.RequestsTransport(compress_requests = True)
+    assert transport.compress_body(b'<small/>', {}) == (b'<small/>', {})
+
+def test_recording_compressed_replies(compressing_server, tmp_path):
+    path = (tmp_path / 'session.jsonl.gz').as_posix()
+    recorder = jnet.transport.RecordingTransport(path)
+    compressing_server.reset()
+    jnetclient = compressing_server.client(transport = recorder)
+    jnetclient.request_docket(docket_number, tracking_id = 'record-gzip')
+    jnetclient.check_requests()
+    recorder.close()
+    assert compressing_server.response_encodings == {'gzip': 2}
+
+    # the recording holds the decoded reply, which replays without a content encoding
+    replayer = compressing_server.client(transport = jnet.transport.ReplayTransport(path))
+    replayer.request_docket(docket_number)
+    assert [s['tracking_id'] for s in replayer.check_requests()] == ['record-gzip']
+
+def test_parse_reply_bytes():
+    # the reply is parsed from the bytes, so the encoding declared in the xml is respected
+    xml = '<?xml version="1.0" encoding="ISO-8859-1"?><Envelope><Body><Name>Café</Name></Body></Envelope>'.encode('latin-1')
+    response = jnet.response.SOAPResponse(jnet.transport.RecordedResponse(200, 'OK', {}, xml))
+    assert response.data == {'Body': {'Name': 'Café'}}
+    assert response.xml.find('Body/Name').text == 'Café'
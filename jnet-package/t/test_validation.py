@@ -0,0 +1,107 @@
+import pytest
+import jnet
+import jnet.cli
+import jnet.testing
+import jnet.validation
+from jnet.exceptions import InvalidIdentifier, InvalidRequest
+
+""" Test checking and normalizing docket numbers and OTNs before they are requested. These do not need to connect to JNET.
+
+Run from the commandline in the root of the github checkout like so:
+
+```python
+PYTHONPATH=jnet-package/ pytest jnet-package/t/test_validation.py
+```
+"""
+
+found_docket = 'CP-51-CR-0000100-2021'
+
+@pytest.fixture(scope = 'module')
+def server():
+    with jnet.testing.MockJNET() as server:
+        yield(server)
+
+@pytest.mark.parametrize('docket_number, normalized', [
+    ('CP-51-CR-0000100-2021', 'CP-51-CR-0000100-2021'),
+    ('MC-51-CR-0000002-2020', 'MC-51-CR-0000002-2020'),
+    ('cp-51-cr-0000100-2021', 'CP-51-CR-0000100-2021'),
+    (' CP 51 CR 100 2021\n', 'CP-51-CR-0000100-2021'),
+    ('CP_51_CR_0000100_2021', 'CP-51-CR-0000100-2021'),
+    ('CP–51–CR–0000100–2021', 'CP-51-CR-0000100-2021'),
+    ('CP51CR00001002021', 'CP-51-CR-0000100-2021'),
+    ('CP-2-MD-15-2019', 'CP-02-MD-0000015-2019'),
+    ('MJ-2201-CR-42-2022', 'MJ-02201-CR-0000042-2022'),
+])
+def test_normalize_docket_number(docket_number, normalized):
+    assert jnet.validation.normalize_docket_number(docket_number) == normalized
+    assert jnet.validation.is_valid_docket_number(docket_number)
+
+@pytest.mark.parametrize('docket_number, reason', [
+    ('NO-TA-DO-CKETNU-MBER', 'not in the form'),
+    ('', 'not in the form'),
+    ('XX-51-CR-0000100-2021', 'unknown court type'),
+    ('CP-68-CR-0000100-2021', 'unknown county'),
+    ('CP-00-CR-0000100-2021', 'unknown county'),
+    ('CP-510-CR-0000100-2021', 'two digits'),
+    ('MC-02-CR-0000100-2021', 'Municipal Court'),
+    ('CP-51-ZZ-0000100-2021', 'unknown case type'),
+    ('MJ-51-CR-0000100-2021', 'five digits'),
+    ('CP-51-CR-0000100-1899', 'out of range'),
+    ('CP-51-CR-0000100-2999', 'out of range'),
+])
+def test_invalid_docket_number(docket_number, reason):
+    with pytest.raises(InvalidIdentifier) as excinfo:
+        jnet.validation.normalize_docket_number(docket_number)
+    assert reason in excinfo.value.reason
+    assert excinfo.value.value == docket_number
+    assert isinstance(excinfo.value, InvalidRequest)
+    assert not jnet.validation.is_valid_docket_number(docket_number)
+
+def test_validate_docket_numbers():
+    valid, invalid = jnet.validation.validate_docket_numbers(['cp 51 cr 100 2021', 'bogus', 'MC-51-CR-0000002-2020', 'CP-51-ZZ-0000001-2022'])
+    assert valid == ['CP-51-CR-0000100-2021', 'MC-51-CR-0000002-2020']
+    assert [docket_number for docket_number, reason in invalid] == ['bogus', 'CP-51-ZZ-0000001-2022']
+
+def test_normalize_otn():
+    # as printed on a Pennsylvania criminal complaint
+    assert jnet.validation.normalize_otn('N 123456-7') == 'N1234567'
+    assert jnet.validation.normalize_otn('N1234567') == 'N1234567'
+    assert jnet.validation.normalize_otn(' u 654321 0 ') == 'U6543210'
+    # with seven digits before the check digit
+    assert jnet.validation.normalize_otn('N12345678') == 'N12345678'
+    assert jnet.validation.normalize_otn(' n 1234567-8 ') == 'N12345678'
+    for otn in ('12345678', 'N123456', 'NN1234567', 'N123456789', 'bogus'):
+        with pytest.raises(InvalidIdentifier):
+            jnet.validation.normalize_otn(otn)
+
+def test_client_validates(server):
+    jnetclient = server.client(validate_identifiers = True)
+    requested = server.counts['RequestCourtCaseEvent']
+
+    with pytest.raises(InvalidIdentifier):
+        jnetclient.request_docket('NO-TA-DO-CKETNU-MBER')
+    with pytest.raises(InvalidIdentifier):
+        jnetclient.request_otn('bogus')
+    # nothing was sent
+    assert server.counts['RequestCourtCaseEvent'] == requested
+
+    resp = jnetclient.request_docket('cp 51 cr 100 2021')
+    assert resp.docket_number == found_docket
+    assert jnetclient.request_otn('n 123456-7').otn == 'N1234567'
+
+def test_client_without_validation_sends(server):
+    jnetclient = server.client()
+    assert not jnetclient.validate_identifiers
+    resp = jnetclient.request_docket('NO-TA-DO-CKETNU-MBER')
+    assert resp.docket_number == 'NO-TA-DO-CKETNU-MBER'
+
+def test_fetch_normalized(server):
+    jnetclient = server.client(validate_identifiers = True)
+    jnetclient.poll_delay = 0
+    jnetclient.poll_interval = 0.05
+    data = jnetclient.fetch_docket_data('cp-51-cr-100-2021', quiet = True)
+    assert len(data)
+
+def test_cli_flag():
+    args = jnet.cli.build_parser().parse_args(['fetch', 'cp 51 cr 100 2021', '--validate'])
+    assert args.validate